@@ -0,0 +1,218 @@
+from __future__ import annotations
+from contextlib import redirect_stdout
+from pathlib import Path
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.synthetic import make_promotion_rules, write_catalog
+from cart.binfmt import to_binary
+from cart.cart import ShoppingCart
+from cart.promotions import PromotionEngine
+from cart.storage import STORAGE_BACKENDS, open_storage
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+def _summary(samples: list, peak_bytes: int) -> dict:
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "total_s": round(total, 6),
+        "ops_per_s": round(len(ordered) / total, 1) if total else None,
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 4),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+        "peak_bytes": peak_bytes,
+    }
+
+def measure(setup, op, n: int) -> dict:
+    # one timed pass, then one traced pass for peak memory so tracemalloc overhead never skews latency
+    samples = []
+    state = setup()
+    with redirect_stdout(io.StringIO()):
+        for i in range(n):
+            start = time.perf_counter()
+            op(state, i)
+            samples.append(time.perf_counter() - start)
+    state = setup()
+    tracemalloc.start()
+    with redirect_stdout(io.StringIO()):
+        for i in range(n):
+            op(state, i)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return _summary(samples, peak)
+
+class _StubCursor:
+    def __init__(self, conn):
+        self.connection = conn
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def execute(self, query, args=None):
+        self.connection.statements += 1
+    def mogrify(self, query, args=None):
+        return query.encode()
+    def fetchone(self):
+        return None
+    def fetchall(self):
+        return []
+
+class _StubConnection:
+    # stands in for a psycopg2 connection; counts statements instead of talking to Postgres
+    closed = 0
+    encoding = "UTF8"
+    def __init__(self):
+        self.statements = 0
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def cursor(self, *a, **k):
+        return _StubCursor(self)
+    def close(self):
+        self.closed = 1
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args) -> dict:
+    work = Path(tempfile.mkdtemp(prefix="tungshoop-bench-"))
+    catalog_file = write_catalog(str(work / "catalog.json"), args.products, seed=args.seed)
+    pids = [f"P{i:07d}" for i in range(args.products)]
+    lines = min(args.cart_lines, args.products)
+    counter = iter(range(10**9))
+
+    def fresh_cart(catalog_path=catalog_file, **kw):
+        with redirect_stdout(io.StringIO()):
+            n = next(counter)
+            storage = None
+            if args.storage != "json":
+                storage = open_storage(args.storage, str(work / f"carts-{n}.db"))
+            return ShoppingCart(catalog_path, str(work / f"cart-{n}.json"), storage=storage, **kw)
+
+    def filled_cart(**kw):
+        cart = fresh_cart(**kw)
+        with redirect_stdout(io.StringIO()):
+            for pid in pids[:lines]:
+                cart.catalog[pid]._quantity_available = 10**9
+                cart.add_item(pid, 1)
+        return cart
+
+    results = {}
+    for backend in ("memory", "lazy", "columnar"):
+        fresh_cart(catalog_backend=backend)  # warm the lazy index so the runs measure steady-state startup
+        results[f"construct[{backend}]"] = measure(lambda: None, lambda s, i: fresh_cart(catalog_backend=backend), args.repeat)
+    binary_file = str(work / "catalog.bin")
+    to_binary(catalog_file, binary_file)  # auto-detected on load, whatever the backend
+    results["construct[binary]"] = measure(lambda: None, lambda s, i: fresh_cart(binary_file), args.repeat)
+
+    results["add_item"] = measure(filled_cart, lambda c, i: c.add_item(pids[i % lines], 1), args.ops)
+    results["get_total"] = measure(filled_cart, lambda c, i: c.get_total(), args.ops)
+    if args.promotions:
+        # category rules need categories: a catalog of its own, so the baseline runs keep their catalog
+        promo_catalog = write_catalog(str(work / "catalog-categories.json"), args.products, seed=args.seed, categories=True)
+        engine = PromotionEngine(make_promotion_rules(args.promotions, args.products, args.seed))
+        promo_cart = lambda: filled_cart(catalog_path=promo_catalog, promotions=engine)
+        results[f"add_item[{args.promotions} promotions]"] = measure(promo_cart, lambda c, i: c.add_item(pids[i % lines], 1), args.ops)
+        results[f"get_total[{args.promotions} promotions]"] = measure(promo_cart, lambda c, i: c.get_total(), args.ops)
+    results["update_quantity"] = measure(filled_cart, lambda c, i: c.update_quantity(pids[i % lines], 2 + i % 3), args.ops)
+    results["remove_item"] = measure(filled_cart, lambda c, i: c.remove_item(pids[i % lines]), min(args.ops, lines))
+    results["get_cart_snapshot[cold]"] = measure(filled_cart, lambda c, i: (c._invalidate(), c.get_cart_snapshot()), args.repeat)
+    results["get_cart_snapshot[warm]"] = measure(filled_cart, lambda c, i: c.get_cart_snapshot(), args.ops)
+    results["apply_batch"] = measure(
+        fresh_cart,
+        lambda c, i: c.apply_batch([(pid, 1) for pid in pids[:lines]], mode="set"),
+        args.repeat,
+    )
+
+    if not args.skip_export:
+        try:
+            from uis import save
+        except ImportError as e:
+            results["export"] = {"skipped": str(e)}
+        else:
+            snap_cart = filled_cart()
+            for fmt in ("json", "ndjson", "csv", "excel", "pdf", "docx"):
+                fn = getattr(save, f"save_{fmt}", None)
+                if fn is None:
+                    continue
+                target = str(work / f"export.{fmt}")
+                try:
+                    results[f"export[{fmt}]"] = measure(lambda: snap_cart, lambda c, i: fn(c.stream_snapshot(), target), args.export_repeat)
+                except ImportError as e:
+                    results[f"export[{fmt}]"] = {"skipped": str(e)}
+
+    if not args.skip_db:
+        try:
+            from database.logger import DBLogger
+        except ImportError as e:
+            results["db_log_action"] = {"skipped": str(e)}
+        else:
+            class StubLogger(DBLogger):
+                def _connect(self):
+                    if self.conn is None or self.conn.closed:
+                        self.conn = _StubConnection()
+
+                def _create_table(self):
+                    pass
+
+            def stub_logger():
+                with redirect_stdout(io.StringIO()):
+                    return StubLogger({})
+            try:
+                record = filled_cart().get_cart_snapshot()
+                results["db_log_action[stub]"] = measure(stub_logger, lambda db, i: db.log_action("add_item", "success", record), args.ops)
+            except ImportError as e:
+                results["db_log_action"] = {"skipped": str(e)}
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": {k: v for k, v in vars(args).items() if k != "out"},
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Tungshoop benchmark suite (results as JSON)")
+    parser.add_argument("--products", type=int, default=10_000, help="synthetic catalog size")
+    parser.add_argument("--cart-lines", type=int, default=1_000, help="distinct products in the benchmark cart")
+    parser.add_argument("--ops", type=int, default=2_000, help="operations per mutation benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="runs for construction/snapshot/batch benchmarks")
+    parser.add_argument("--export-repeat", type=int, default=2, help="runs per exporter")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--promotions", type=int, default=1_000, help="active promotion rules for the promotions runs (0 = skip)")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="json", help="cart state backend under test")
+    parser.add_argument("--skip-export", action="store_true")
+    parser.add_argument("--skip-db", action="store_true")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=4)
+    if args.out:
+        Path(args.out).write_text(report, encoding="utf-8")
+    else:
+        sys.stdout.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import argparse
+import gc
+import json
+import tracemalloc
+from benchmarks.synthetic import make_catalog_rows
+from cart.catalog import product_from_dict
+from cart.columnar import ColumnarCatalog
+
+def _measure(build, text: str) -> int:
+    # retained bytes of a store built from freshly parsed JSON, so string storage is counted too
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = json.loads(text)
+    store = build(rows)
+    del rows
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    return after - before
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per product for each in-memory catalog representation")
+    parser.add_argument("--products", type=int, default=100_000)
+    args = parser.parse_args()
+
+    text = json.dumps(make_catalog_rows(args.products))
+    builds = {
+        "objects": lambda rs: {r["product_id"]: product_from_dict(r) for r in rs},
+        "columnar": ColumnarCatalog,
+    }
+    report = {"products": args.products}
+    for name, build in builds.items():
+        total = _measure(build, text)
+        report[name] = {"total_bytes": total, "bytes_per_product": round(total / args.products, 1)}
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    main()
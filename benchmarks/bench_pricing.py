@@ -0,0 +1,63 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import time
+from benchmarks.synthetic import make_catalog_rows
+from cart.cart import CartItem
+from cart.catalog import product_from_dict
+from cart.columnar import ColumnarCatalog
+from cart.pricing import CartBatch, PriceBook, quote
+
+def _carts(pids: list, carts: int, lines: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    return {f"cart-{k}": {pid: rng.randint(1, 5) for pid in rng.sample(pids, lines)} for k in range(carts)}
+
+def per_object(catalog, states: dict) -> dict:
+    # what ShoppingCart does today: one CartItem per line, subtotal_minor() summed per cart
+    totals = {}
+    for cart_id, lines in states.items():
+        totals[cart_id] = sum(CartItem(catalog[pid], qty).subtotal_minor() for pid, qty in lines.items())
+    return totals
+
+def _best(fn, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-object vs vectorized repricing of many carts")
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--carts", type=int, default=10_000)
+    parser.add_argument("--lines", type=int, default=20, help="lines per cart")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = make_catalog_rows(args.products, args.seed)
+    for row in rows:
+        row["price"] += rng.choice((0, 0.5, 0.99, 0.125, 0.005))  # exercise the half-up rounding to kuruş
+    states = _carts([r["product_id"] for r in rows], args.carts, min(args.lines, args.products), args.seed)
+    report = {"products": args.products, "carts": args.carts, "lines_per_cart": args.lines}
+
+    for name, catalog in (("objects", {r["product_id"]: product_from_dict(r) for r in rows}), ("columnar", ColumnarCatalog(rows))):
+        book_s, book = _best(lambda: PriceBook(catalog), args.repeat)
+        load_s, batch = _best(lambda: CartBatch.from_states(book, states), args.repeat)
+        quote_s, q = _best(lambda: quote(book, batch), args.repeat)
+        entry = {"price_book_s": round(book_s, 4), "load_carts_s": round(load_s, 4), "quote_s": round(quote_s, 5)}
+        if name == "objects":
+            obj_s, expected = _best(lambda: per_object(catalog, states), args.repeat)
+            entry["per_object_s"] = round(obj_s, 4)
+            entry["speedup_quote_only"] = round(obj_s / quote_s, 1)
+            entry["speedup_with_load"] = round(obj_s / (load_s + quote_s), 1)
+            entry["totals_match"] = expected == dict(zip(batch.cart_ids, q.total_minor.tolist()))
+        report[name] = entry
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+from __future__ import annotations
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import accumulate
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from benchmarks.bench import _git_commit, _percentile
+from benchmarks.synthetic import write_catalog
+from cart.cart import ShoppingCart
+from cart.catalog import load_catalog
+from cart.inventory import ReservationEngine, SQLiteInventoryStore
+from cart.storage import STORAGE_BACKENDS, open_storage
+from metrics.metrics import configure_events
+
+# Drives ShoppingCart from many workers at once, either replaying the audit log (DBLogger.events_between, or an
+# NDJSON dump of it) or synthesizing traffic, and checks stock conservation afterwards:
+#   stock >= 0 and stock + units held in carts + units checked out == initial stock, for every product.
+# An op is (cart key, action, args, logged offset in seconds); actions: add, update, remove, clear, checkout, batch.
+OPS = ("add", "update", "remove", "clear", "checkout", "batch")
+DEFAULT_MIX = "add=60,update=20,remove=12,clear=2,checkout=3,batch=3"
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise ValueError(f"Unknown operation {name!r} in mix (use {OPS})")
+        mix[name] = float(weight or 1)
+    if sum(mix.values()) <= 0:
+        raise ValueError("The operation mix needs at least one positive weight")
+    return mix
+
+#--------------------------- REPLAY ---------------------------#
+def ops_from_events(events) -> tuple:
+    # audit rows (oldest first) -> ({cart_id: [op, ...]}, skipped count); rows that cannot be re-issued are skipped
+    per_cart, skipped, first = defaultdict(list), 0, None
+    for event in events:
+        state = event["cart_state"]
+        if isinstance(state, str):
+            state = json.loads(state)
+        at = event["logged_at"]
+        at = datetime.fromisoformat(at) if isinstance(at, str) else at
+        first = at if first is None else first
+        offset = (at - first).total_seconds()
+        cart_id = state.get("cart_id") or event.get("computer_name") or "cart"
+        changes, request = state.get("changes") or [], state.get("request") or {}
+        action = event["action"]
+        if action == "add_item" and changes:
+            ch = changes[0]
+            op = ("add", (ch["product_id"], ch["new_qty"] - ch["old_qty"]))
+        elif action == "add_item" and "product_id" in request:
+            op = ("add", (request["product_id"], int(request.get("quantity", 1))))
+        elif action == "update_quantity" and (changes or "product_id" in request):
+            op = ("update", (changes[0]["product_id"], changes[0]["new_qty"]) if changes else (request["product_id"], int(request["quantity"])))
+        elif action == "remove_item" and (changes or "product_id" in request):
+            op = ("remove", (changes[0]["product_id"] if changes else request["product_id"],))
+        elif action == "clear_cart":
+            op = ("clear", ())
+        elif action == "checkout":
+            op = ("checkout", ())
+        elif action == "apply_batch" and changes:
+            op = ("batch", ([(ch["product_id"], ch["new_qty"]) for ch in changes],))
+        else:
+            # expire_reservation / catalog_update are side effects, a failed batch does not log its lines
+            skipped += 1
+            continue
+        per_cart[cart_id].append((cart_id, op[0], op[1], offset))
+    return per_cart, skipped
+
+def fetch_events(start: str, end: str, limit: int) -> list:
+    from shppngCrt import open_db, close_db
+    db = open_db(lazy=False)
+    if db is None:
+        raise RuntimeError("Audit logging is off (TUNGSHOOP_DB=off or no database driver), nothing to replay")
+    try:
+        return db.events_between(datetime.fromisoformat(start), datetime.fromisoformat(end), limit=limit)
+    finally:
+        close_db(db)
+
+def dump_events(events: list, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v)) + "\n")
+
+def read_events(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+#--------------------------- SYNTHETIC ---------------------------#
+def synthetic_ops(carts, pids: list, count: int, mix: dict, cart_lines: int, skew: float, rng: random.Random):
+    # decided against each cart's live contents, so updates/removes hit lines that exist and carts stay near cart_lines
+    names, weights = list(mix), list(accumulate(mix.values()))
+    product_weights = list(accumulate(1.0 / (rank + 1) ** skew for rank in range(len(pids))))
+    keys = list(carts)
+    for _ in range(count):
+        key = rng.choice(keys)
+        lines = carts[key]._items
+        action = rng.choices(names, cum_weights=weights)[0]
+        if action in ("update", "remove") and not lines:
+            action = "add"
+        if action == "add" and len(lines) >= cart_lines:
+            action = "update"
+        if action == "add":
+            yield key, "add", (rng.choices(pids, cum_weights=product_weights)[0], rng.randint(1, 3)), 0.0
+        elif action == "update":
+            yield key, "update", (rng.choice(list(lines)), rng.randint(1, 5)), 0.0
+        elif action == "remove":
+            yield key, "remove", (rng.choice(list(lines)),), 0.0
+        elif action in ("clear", "checkout"):
+            yield key, action, (), 0.0
+        else:
+            picked = rng.choices(pids, cum_weights=product_weights, k=rng.randint(2, 5))
+            yield key, "batch", ([(pid, rng.randint(1, 3)) for pid in picked],), 0.0
+
+#--------------------------- WORKERS ---------------------------#
+def _issue(cart: ShoppingCart, action: str, args: tuple, sold: dict) -> bool:
+    if action == "add":
+        return cart.add_item(*args)
+    if action == "update":
+        return cart.update_quantity(*args)
+    if action == "remove":
+        return cart.remove_item(*args)
+    if action == "batch":
+        return cart.apply_batch(args[0], mode="set")
+    if action == "clear":
+        cart.clear_cart()
+        return True
+    # checkout commits the reservations: those units leave the stock for good
+    with cart._lock:
+        for pid, item in cart._items.items():
+            sold[pid] += item._quantity
+        cart.checkout()
+    return True
+
+def run_worker(job: dict, catalog=None, inventory=None) -> dict:
+    # in a thread: catalog/inventory are the shared objects; in a spawned process they are opened here from the job
+    configure_events("off")
+    if catalog is None:
+        catalog = load_catalog(job["catalog_file"])
+        if job["inventory_db"]:
+            inventory = ReservationEngine(catalog, store=SQLiteInventoryStore(job["inventory_db"]))
+            inventory.refresh()
+    storage = open_storage(job["storage"], job["storage_path"])
+    carts = {
+        key: ShoppingCart(job["catalog_file"], str(Path(job["work"]) / f"{key}.json"), cart_id=key,
+                          catalog=catalog, inventory=inventory, storage=storage)
+        for key in job["carts"]
+    }
+    if job["ops"] is not None:
+        ops = iter(job["ops"])
+    else:
+        rng = random.Random(job["seed"])
+        ops = synthetic_ops(carts, list(catalog), job["count"], job["mix"], job["cart_lines"], job["skew"], rng)
+    latencies, failed, sold = defaultdict(list), defaultdict(int), defaultdict(int)
+    speed = job["speed"]
+    started = time.time()
+    base = time.perf_counter()
+    for key, action, args, offset in ops:
+        if speed > 0:
+            delay = offset / speed - (time.perf_counter() - base)
+            if delay > 0:
+                time.sleep(delay)
+        start = time.perf_counter()
+        ok = _issue(carts[key], action, args, sold)
+        latencies[action].append(time.perf_counter() - start)
+        if not ok:
+            failed[action] += 1
+    finished = time.time()
+    held, drift = defaultdict(int), 0
+    for cart in carts.values():
+        for pid, item in cart._items.items():
+            held[pid] += item._quantity
+        # the running totals must match what the lines add up to
+        if cart._total_minor != sum(item.subtotal_minor() for item in cart._items.values()) \
+                or cart._shipping_minor != sum(item._ship_minor for item in cart._items.values()):
+            drift += 1
+    return {"started": started, "finished": finished, "latencies": dict(latencies), "failed": dict(failed),
+            "held": dict(held), "sold": dict(sold), "drift": drift}
+
+#--------------------------- REPORT ---------------------------#
+def _latency(samples: list, failed: int) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "failed": failed,
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 4),
+        "p90_ms": round(_percentile(ordered, 90) * 1000, 4),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+
+def check_consistency(initial: dict, stock: dict, results: list) -> dict:
+    held, sold = defaultdict(int), defaultdict(int)
+    for r in results:
+        for pid, qty in r["held"].items():
+            held[pid] += qty
+        for pid, qty in r["sold"].items():
+            sold[pid] += qty
+    negative, oversold, unbalanced = [], [], []
+    for pid, start in initial.items():
+        now = stock[pid]
+        if now < 0:
+            negative.append(pid)
+        if held[pid] + sold[pid] > start:
+            oversold.append(pid)
+        if now + held[pid] + sold[pid] != start:
+            unbalanced.append({"product_id": pid, "initial": start, "stock": now, "held": held[pid], "sold": sold[pid]})
+    drift = sum(r["drift"] for r in results)
+    return {
+        "products_checked": len(initial),
+        "units_held": sum(held.values()),
+        "units_sold": sum(sold.values()),
+        "negative_stock": negative[:50],
+        "oversold": oversold[:50],
+        "unbalanced": unbalanced[:50],
+        "cart_total_drift": drift,
+        "violations": len(negative) + len(oversold) + len(unbalanced) + drift,
+    }
+
+def report(results: list, consistency: dict) -> dict:
+    latencies, failed = defaultdict(list), defaultdict(int)
+    for r in results:
+        for action, samples in r["latencies"].items():
+            latencies[action].extend(samples)
+        for action, n in r["failed"].items():
+            failed[action] += n
+    every = [s for samples in latencies.values() for s in samples]
+    wall = max(r["finished"] for r in results) - min(r["started"] for r in results) if results else 0.0
+    return {
+        "ops": len(every),
+        "wall_s": round(wall, 4),
+        "throughput_ops_per_s": round(len(every) / wall, 1) if wall else None,
+        "latency": {"all": _latency(every, sum(failed.values())),
+                    **{action: _latency(latencies[action], failed[action]) for action in sorted(latencies)}},
+        "consistency": consistency,
+    }
+
+#--------------------------- RUN ---------------------------#
+def run(args) -> dict:
+    work = Path(tempfile.mkdtemp(prefix="tungshoop-load-"))
+    replay = None
+    if args.replay_db:
+        events = fetch_events(args.replay_db[0], args.replay_db[1], args.limit)
+        if args.dump_events:
+            dump_events(events, args.dump_events)
+        replay = ops_from_events(events)
+    elif args.replay:
+        replay = ops_from_events(read_events(args.replay))
+    catalog_file = args.catalog or (None if replay is None else "jsons/infoProducts.json")
+    if catalog_file is None:
+        catalog_file = write_catalog(str(work / "catalog.json"), args.products, seed=args.seed)
+
+    catalog = load_catalog(catalog_file)
+    if args.stock is not None:
+        for pid in catalog:
+            catalog[pid]._quantity_available = args.stock
+    initial = {pid: catalog[pid]._quantity_available for pid in catalog}
+
+    # one shared stock for every worker: the ReservationEngine in memory for threads, the SQLite store for processes
+    inventory, inventory_db = None, None
+    if args.mode == "processes":
+        inventory_db = str(work / "inventory.db")
+        store = SQLiteInventoryStore(inventory_db, catalog)
+    elif args.inventory == "engine":
+        inventory = ReservationEngine(catalog)
+
+    jobs = []
+    for w in range(args.workers):
+        job = {"catalog_file": catalog_file, "inventory_db": inventory_db, "work": str(work), "speed": args.speed,
+               "storage": args.storage, "storage_path": str(work / (f"carts-{w}.db" if args.storage == "sqlite" else f"carts-{w}")),
+               "seed": args.seed + w, "mix": args.mix, "cart_lines": args.cart_lines, "skew": args.skew, "ops": None,
+               "count": args.ops // args.workers + (w < args.ops % args.workers), "carts": [f"w{w}-c{k}" for k in range(args.carts)]}
+        jobs.append(job)
+    if replay is not None:
+        # a logged cart always goes to the same worker, so its own ops keep their order
+        per_cart, skipped = replay
+        for job in jobs:
+            job["carts"], job["ops"] = [], []
+        for n, (cart_id, ops) in enumerate(sorted(per_cart.items())):
+            job = jobs[n % len(jobs)]
+            job["carts"].append(cart_id)
+            job["ops"].extend(ops)
+        for job in jobs:
+            job["ops"].sort(key=lambda op: op[3])
+
+    if args.mode == "processes":
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(run_worker, jobs))
+        stock = {pid: store.available(pid) for pid in initial}
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="loadgen") as pool:
+            results = list(pool.map(lambda job: run_worker(job, catalog, inventory), jobs))
+        stock = {pid: catalog[pid]._quantity_available for pid in initial}
+
+    out = report(results, check_consistency(initial, stock, results))
+    if replay is not None:
+        out["replay"] = {"carts": len(replay[0]), "skipped_events": replay[1]}
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "dump_events")}
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": params,
+        },
+        "results": out,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Tungshoop load generator: replays the audit log or synthesizes traffic (report as JSON)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replay-db", nargs=2, metavar=("START", "END"), help="replay the logs table between two ISO timestamps")
+    source.add_argument("--replay", metavar="NDJSON", help="replay events saved earlier with --dump-events")
+    parser.add_argument("--dump-events", metavar="NDJSON", help="with --replay-db: also save the fetched events here")
+    parser.add_argument("--limit", type=int, default=100_000, help="most events fetched by --replay-db")
+    parser.add_argument("--catalog", help="catalog file (default: synthetic, or jsons/infoProducts.json when replaying)")
+    parser.add_argument("--products", type=int, default=10_000, help="synthetic catalog size")
+    parser.add_argument("--stock", type=int, help="set every product's stock to this before the run")
+    parser.add_argument("--ops", type=int, default=20_000, help="synthetic operations, split over the workers")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--cart-lines", type=int, default=20, help="distinct products a synthetic cart grows to")
+    parser.add_argument("--carts", type=int, default=4, help="synthetic carts per worker")
+    parser.add_argument("--skew", type=float, default=0.8, help="zipf exponent of product popularity (0 = uniform)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--mode", choices=("threads", "processes"), default="threads",
+                        help="processes are spawned and share stock through a SQLite inventory store")
+    parser.add_argument("--inventory", choices=("engine", "none"), default="engine",
+                        help="threads: reserve through a shared ReservationEngine, or take stock straight off the products like the CLI")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="memory", help="cart state backend under load")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay at N x the logged pace (0 = as fast as possible)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    if args.mode == "processes" and args.inventory == "none":
+        parser.error("--inventory none needs --mode threads (processes only share stock through the inventory store)")
+    if args.dump_events and not args.replay_db:
+        parser.error("--dump-events needs --replay-db")
+    args.workers = max(1, args.workers)
+
+    result = run(args)
+    text = json.dumps(result, indent=4)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        sys.stdout.write(text + "\n")
+    # a non-zero exit lets CI fail the build on a consistency regression
+    sys.exit(1 if result["results"]["consistency"]["violations"] else 0)
+
+if __name__ == "__main__":
+    main()
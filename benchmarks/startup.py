@@ -0,0 +1,58 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+# modules the CLI must not pull in at startup; each one belongs to a path that imports it on first use
+FORBIDDEN = ("tkinter", "ttkbootstrap", "gui.gui", "psycopg2", "database.logger", "openpyxl", "reportlab", "docx")
+
+def import_profile(module: str) -> dict:
+    # one fresh interpreter per run: -X importtime reports (self us, cumulative us, name) for every import
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr.strip()}")
+    rows = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            rows[name] = (int(self_us), int(cumulative_us))
+    return rows
+
+def run(args) -> dict:
+    profiles = [import_profile(args.module) for _ in range(args.repeat)]
+    totals = [p.get(args.module, (0, 0))[1] / 1000 for p in profiles]
+    last = profiles[-1]
+    heaviest = sorted(last.items(), key=lambda kv: kv[1][0], reverse=True)[:args.top]
+    loaded = sorted(set(FORBIDDEN) & set(last))
+    return {
+        "module": args.module,
+        "budget_ms": args.budget_ms,
+        "import_ms": {"median": round(statistics.median(totals), 2), "min": round(min(totals), 2), "max": round(max(totals), 2)},
+        "within_budget": statistics.median(totals) <= args.budget_ms and not loaded,
+        "heavy_modules_loaded": loaded,
+        "top_self_ms": {name: round(self_us / 1000, 2) for name, (self_us, _) in heaviest},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Tungshoop import-time budget (exit 1 when over budget)")
+    parser.add_argument("--module", default="shppngCrt", help="module whose cold import is measured")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="allowed median cumulative import time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="how many of the slowest imports to list")
+    args = parser.parse_args()
+
+    report = run(args)
+    sys.stdout.write(json.dumps(report, indent=4) + "\n")
+    sys.exit(0 if report["within_budget"] else 1)
+
+if __name__ == "__main__":
+    main()
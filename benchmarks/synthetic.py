@@ -0,0 +1,55 @@
+from __future__ import annotations
+from pathlib import Path
+import json
+import random
+
+_WORDS = ["Gaming", "Wireless", "Mechanical", "Ultra", "Pro", "Mini", "Smart", "Portable", "Digital", "Classic",
+          "Laptop", "Keyboard", "Mouse", "Monitor", "Headphones", "Speaker", "Camera", "Course", "E-Book", "License"]
+
+def make_catalog_rows(n: int, seed: int = 42, categories: bool = False) -> list:
+    # categories=True adds the 50 "Cnn" categories the promotion rules target; off by default so the catalog
+    # (and every benchmark series measured on it) stays what it was before categories existed
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        name = f"{rng.choice(_WORDS)} {rng.choice(_WORDS)} {i}"
+        row = {"product_id": f"P{i:07d}", "name": name, "price": rng.randint(50, 50000), "quantity_available": rng.randint(0, 500)}
+        if categories:
+            row["category"] = f"C{i % 50:02d}"
+        if i % 3 == 2:
+            row.update({"type": "digital", "download_link": f"https://downloads.tungshoop.example/{i}"})
+        else:
+            row.update({"type": "physical", "weight": round(rng.uniform(0.1, 20), 2), "shipping_cost": 999})
+        rows.append(row)
+    return rows
+
+def make_promotion_rules(n: int, products: int, seed: int = 42) -> list:
+    # a mix of every rule type over random products and the 50 synthetic categories
+    rng = random.Random(seed)
+    rules = []
+    for i in range(n):
+        kind = ("percent", "fixed", "bxgy", "threshold")[i % 4]
+        rule = {"id": f"PROMO{i}", "type": kind}
+        if kind == "threshold":
+            # i % 4 == 3 here, so i % 8 is 3 or 7: every other threshold rule grants free shipping
+            rule.update({"min_total": rng.randint(1, 50) * 1000, "free_shipping": True} if i % 8 == 7 else
+                        {"min_total": rng.randint(1, 200) * 1000, "percent": rng.randint(1, 10)})
+        else:
+            if kind == "percent":
+                rule["percent"] = rng.randint(5, 50)
+            elif kind == "fixed":
+                rule["amount"] = rng.randint(10, 500)
+            else:
+                rule.update({"buy": rng.randint(1, 4), "get": 1})
+            if i % 5 == 0:
+                rule["category"] = f"C{rng.randint(0, 49):02d}"
+            else:
+                rule["products"] = [f"P{rng.randrange(products):07d}" for _ in range(rng.randint(1, 20))]
+        rules.append(rule)
+    return rules
+
+def write_catalog(path: str, n: int, seed: int = 42, categories: bool = False) -> str:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_catalog_rows(n, seed, categories), f, indent=4, ensure_ascii=False)
+    return path
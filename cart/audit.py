@@ -0,0 +1,66 @@
+from __future__ import annotations
+from typing import Iterable
+from cart.product import Product, PhysicalProduct
+from cart.money import to_minor, from_minor
+
+def change_record(product: Product, old_qty: int, new_qty: int) -> dict:
+    return {
+        "product_id": product._product_id,
+        "name": product._name,
+        "old_qty": int(old_qty),
+        "new_qty": int(new_qty),
+        "price": product._price,
+        "shipping": product._shipping_cost if isinstance(product, PhysicalProduct) else 0,
+    }
+
+def apply_changes(items: dict, changes: Iterable[dict]) -> dict:
+    for ch in changes:
+        pid = ch["product_id"]
+        if ch["new_qty"] <= 0:
+            items.pop(pid, None)
+        else:
+            items[pid] = {
+                "product_id": pid,
+                "name": ch.get("name"),
+                "quantity": ch["new_qty"],
+                "price": ch["price"],
+                "shipping": ch["shipping"],
+            }
+    return items
+
+def rebuild_state(records: Iterable[dict]) -> dict:
+    # records: audit payloads in logged order (logged_at, seq), the first one carrying a checkpoint.
+    # Adds up like the cart does (integer minor units, shipping only on physical lines, promotion discounts
+    # as recorded) so the rebuilt total is the get_total() the cart reported at that point
+    items: dict = {}
+    discount = None
+    line_discounts: dict = {}
+    for rec in records:
+        if "checkpoint" in rec:
+            snap = rec["checkpoint"]
+            items = {
+                it["product_id"]: {k: it[k] for k in ("product_id", "name", "quantity", "price", "shipping")}
+                for it in snap.get("items", [])
+            }
+            line_discounts = {it["product_id"]: it["discount"] for it in snap.get("items", []) if "discount" in it}
+            discount = snap.get("discount")
+        elif "items" in rec and "changes" not in rec:
+            # legacy full-snapshot record
+            items = {it["product_id"]: dict(it) for it in rec["items"]}
+        else:
+            apply_changes(items, rec.get("changes", []))
+        if "discount" in rec:
+            discount = rec["discount"]
+            line_discounts = dict(rec.get("line_discounts", {}))
+    out, total_minor = [], 0
+    for it in items.values():
+        it = dict(it)
+        subtotal_minor = it["quantity"] * to_minor(it["price"]) + to_minor(it["shipping"])
+        total_minor += subtotal_minor
+        it["subtotal"] = from_minor(subtotal_minor)
+        if line_discounts.get(it["product_id"]):
+            it["discount"] = line_discounts[it["product_id"]]
+        out.append(it)
+    if discount is None:
+        return {"items": out, "total": from_minor(total_minor)}
+    return {"items": out, "total": from_minor(total_minor - to_minor(discount)), "discount": discount}
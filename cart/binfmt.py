@@ -0,0 +1,299 @@
+from __future__ import annotations
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, Optional
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+from cart.product import Product, PhysicalProduct, DigitalProduct
+from cart.columnar import GENERIC, PHYSICAL, DIGITAL
+
+# Catalog snapshot, little-endian, read through mmap without parsing the whole file:
+#   header   magic(8) count(u32) pad(4)
+#   records  count x 72 bytes, in catalog order: (offset, length) of id/name/link/category in the string table,
+#            price f64, stock i64, shipping f64, weight f64, kind u8
+#   index    count x u32 record numbers sorted by product id bytes (binary search, no dict to build)
+#   strings  utf-8 blob
+# Cart snapshot: magic(8) count(u32) pad(4), then per line qty(u32) id_len(u16) id bytes.
+CATALOG_MAGIC = b"TSCAT\x00\x02\x00"
+CART_MAGIC = b"TSCRT\x00\x01\x00"
+_HEADER = struct.Struct("<8sI4x")
+_RECORD = struct.Struct("<IIIIIIIIdqddB7x")
+_INDEX = struct.Struct("<I")
+_LINE = struct.Struct("<IH")
+
+def sniff(path: str) -> Optional[bytes]:
+    # the magic of a binary snapshot, None for anything else (JSON, missing, empty)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(CATALOG_MAGIC))
+    except FileNotFoundError:
+        return None
+    return head if head in (CATALOG_MAGIC, CART_MAGIC) else None
+
+def _kind(product: Product) -> int:
+    if isinstance(product, PhysicalProduct):
+        return PHYSICAL
+    if isinstance(product, DigitalProduct):
+        return DIGITAL
+    return GENERIC
+
+def _replace(path: str, payload: bytes, fsync: bool = True) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp, path)  # readers keep their old mapping; the next open sees the new file
+
+#--------------------------- CATALOG ---------------------------#
+def encode_catalog(products: Iterable[Product]) -> bytes:
+    strings = bytearray()
+    offsets: Dict[bytes, tuple] = {}  # names and links repeat a lot
+    def put(text: str) -> tuple:
+        raw = text.encode("utf-8")
+        span = offsets.get(raw)
+        if span is None:
+            span = offsets[raw] = (len(strings), len(raw))
+            strings.extend(raw)
+        return span
+    records, ids = [], []
+    for p in products:
+        kind = _kind(p)
+        pid = put(p._product_id)
+        ids.append(p._product_id.encode("utf-8"))
+        records.append(_RECORD.pack(
+            *pid, *put(p._name), *(put(p._download_link) if kind == DIGITAL else (0, 0)), *put(p._category or ""),
+            p._price, p._quantity_available, p._shipping_cost, getattr(p, "_weight", 0.0), kind,
+        ))
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    return b"".join((_HEADER.pack(CATALOG_MAGIC, len(records)), *records, struct.pack(f"<{len(order)}I", *order), bytes(strings)))
+
+def write_catalog(catalog, path: str, fsync: bool = True) -> None:
+    _replace(path, encode_catalog(catalog[pid] for pid in catalog), fsync)
+
+class BinaryCatalog(Mapping):
+    # the same read-mostly Mapping as ColumnarCatalog, over an mmap of the snapshot; touched products become live
+    # objects, kept like LazyCatalog keeps them (bounded LRU of clean ones, modified ones for as long as they differ).
+    # Shared by the server's threads: one lock covers the objects and the mapping, so an id never gets two objects
+    def __init__(self, catalog_file: str, cache_size: int = 1024):
+        self._path = catalog_file
+        self._cache_size = max(1, int(cache_size))
+        self._cache: "OrderedDict[str, Product]" = OrderedDict()
+        self._dirty: Dict[str, Product] = {}
+        self._lock = threading.RLock()
+        self._file = self._mm = None
+        self._open()
+
+    def _open(self) -> None:
+        self._file = open(self._path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != CATALOG_MAGIC:
+            raise ValueError(f"{self._path} is not a binary catalog snapshot")
+        self._index_at = _HEADER.size + self._count * _RECORD.size
+        self._strings_at = self._index_at + self._count * _INDEX.size
+
+    def rebuild_index(self) -> None:
+        # the file was replaced: map the new one, products already handed out stay the same objects
+        with self._lock:
+            old_file, old_mm = self._file, self._mm
+            self._open()
+            old_mm.close()
+            old_file.close()
+            for held in (self._cache, self._dirty):
+                for pid in [pid for pid in held if self._find(pid) is None]:
+                    del held[pid]
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.close()
+            self._file.close()
+
+    def _text(self, offset: int, length: int) -> str:
+        start = self._strings_at + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _record(self, i: int) -> tuple:
+        return _RECORD.unpack_from(self._mm, _HEADER.size + i * _RECORD.size)
+
+    def _id_bytes(self, i: int) -> bytes:
+        id_off, id_len = _RECORD.unpack_from(self._mm, _HEADER.size + i * _RECORD.size)[:2]
+        start = self._strings_at + id_off
+        return self._mm[start:start + id_len]
+
+    def _slot(self, k: int) -> int:
+        return _INDEX.unpack_from(self._mm, self._index_at + k * _INDEX.size)[0]
+
+    def _find(self, product_id: str) -> Optional[int]:
+        # binary search straight over the mapped index
+        key = product_id.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_bytes(self._slot(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._id_bytes(self._slot(lo)) == key:
+            return self._slot(lo)
+        return None
+
+    def _build(self, i: int) -> Product:
+        id_off, id_len, name_off, name_len, link_off, link_len, cat_off, cat_len, price, stock, shipping, weight, kind = self._record(i)
+        pid, name = self._text(id_off, id_len), self._text(name_off, name_len)
+        category = self._text(cat_off, cat_len) if cat_len else None
+        if kind == PHYSICAL:
+            return PhysicalProduct(pid, name, price, stock, weight, shipping, category)
+        if kind == DIGITAL:
+            return DigitalProduct(pid, name, price, stock, self._text(link_off, link_len), category)
+        return Product(pid, name, price, stock, shipping, category)
+
+    def _matches(self, product: Product) -> bool:
+        i = self._find(product._product_id)
+        if i is None:
+            return False
+        record = self._record(i)
+        return (product._quantity_available == record[9] and product._price == record[8]
+                and product._shipping_cost == record[10] and _kind(product) == record[12]
+                and product._name == self._text(record[2], record[3]))
+
+    def _evict(self) -> None:
+        while len(self._cache) > self._cache_size:
+            pid, product = self._cache.popitem(last=False)
+            if not self._matches(product):
+                self._dirty[pid] = product  # its values only exist in memory
+
+    def __getitem__(self, product_id: str) -> Product:
+        with self._lock:
+            product = self._dirty.get(product_id)
+            if product is not None:
+                return product
+            product = self._cache.get(product_id)
+            if product is not None:
+                self._cache.move_to_end(product_id)
+                return product
+            i = self._find(product_id)
+            if i is None:
+                raise KeyError(product_id)
+            product = self._cache[product_id] = self._build(i)
+            self._evict()
+            return product
+
+    def __contains__(self, product_id) -> bool:
+        with self._lock:
+            return (product_id in self._dirty or product_id in self._cache
+                    or (isinstance(product_id, str) and self._find(product_id) is not None))
+
+    def __iter__(self) -> Iterator[str]:
+        i = 0
+        while True:
+            with self._lock:
+                if i >= self._count:  # the file may have been replaced while iterating
+                    return
+                pid = self._id_bytes(i).decode("utf-8")
+            yield pid
+            i += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def price(self, product_id: str) -> float:
+        with self._lock:
+            product = self.resident(product_id)
+            return product._price if product is not None else self._record(self._find(product_id))[8]
+
+    def stock(self, product_id: str) -> int:
+        with self._lock:
+            product = self.resident(product_id)
+            return product._quantity_available if product is not None else self._record(self._find(product_id))[9]
+
+    # CatalogWatcher hooks, same contract as LazyCatalog: the file is the store
+    def resident(self, product_id: str):
+        with self._lock:
+            return self._dirty.get(product_id) or self._cache.get(product_id)
+
+    def store(self, product: Product) -> None:
+        pass
+
+    def install(self, product: Product) -> None:
+        with self._lock:
+            self._cache.pop(product._product_id, None)
+            self._dirty[product._product_id] = product
+
+    def discard(self, product_id: str) -> None:
+        with self._lock:
+            self._cache.pop(product_id, None)
+            self._dirty.pop(product_id, None)
+
+def iter_catalog_rows(path: str) -> Iterator[dict]:
+    # a binary catalog as the rows of the JSON file (what product_from_dict reads)
+    catalog = BinaryCatalog(path)
+    try:
+        for i in range(len(catalog)):
+            row = catalog._build(i).to_dict()
+            row.pop("license_key", None)  # generated on demand, not catalog data
+            yield row
+    finally:
+        catalog.close()
+
+#--------------------------- CART STATE ---------------------------#
+def encode_cart(state: Dict[str, int]) -> bytes:
+    parts = [_HEADER.pack(CART_MAGIC, len(state))]
+    for pid, qty in state.items():
+        raw = pid.encode("utf-8")
+        parts.append(_LINE.pack(int(qty), len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+def decode_cart(data: bytes) -> Dict[str, int]:
+    magic, count = _HEADER.unpack_from(data, 0)
+    if magic != CART_MAGIC:
+        raise ValueError("not a binary cart snapshot")
+    state, pos = {}, _HEADER.size
+    for _ in range(count):
+        qty, length = _LINE.unpack_from(data, pos)
+        pos += _LINE.size
+        state[bytes(data[pos:pos + length]).decode("utf-8")] = qty
+        pos += length
+    return state
+
+#--------------------------- CONVERTERS ---------------------------#
+def to_binary(src: str, dst: str) -> str:
+    with open(src, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data and "quantity" in data[0] and "name" not in data[0]:
+        _replace(dst, encode_cart({item["product_id"]: int(item["quantity"]) for item in data}))
+        return "cart"
+    from cart.catalog import product_from_dict
+    _replace(dst, encode_catalog(product_from_dict(item) for item in data))
+    return "catalog"
+
+def to_json(src: str, dst: str) -> str:
+    magic = sniff(src)
+    if magic == CATALOG_MAGIC:
+        rows, kind = list(iter_catalog_rows(src)), "catalog"
+    elif magic == CART_MAGIC:
+        with open(src, "rb") as f:
+            rows, kind = [{"product_id": pid, "quantity": qty} for pid, qty in decode_cart(f.read()).items()], "cart"
+    else:
+        raise ValueError(f"{src} is not a binary snapshot")
+    with open(dst, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=4, ensure_ascii=False)
+    return kind
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert catalog / cart snapshots between JSON and the binary format")
+    parser.add_argument("direction", choices=("to-binary", "to-json"))
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    args = parser.parse_args()
+    kind = (to_binary if args.direction == "to-binary" else to_json)(args.src, args.dst)
+    print(f"✅ {kind} snapshot written to '{args.dst}'.")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,53 @@
 from __future__ import annotations
 from typing import Dict
 from pathlib import Path
-import json
-from cart.product import Product, PhysicalProduct, DigitalProduct
+from functools import wraps
+import logging
+import threading
+from cart.product import Product, PhysicalProduct
+from cart.catalog import load_catalog
+from cart.audit import change_record
+from cart.money import to_minor, from_minor
+from cart.storage import JSONStorage
+from cart.importer import read_cart_lines
+from cart.search import CatalogIndex
+from metrics.metrics import METRICS, emit
+
+def _synchronized(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _batch_line(n: int, line) -> tuple:
+    # a malformed line is the caller's input error, reported as ValueError like read_cart_lines does
+    try:
+        pid, qty = (line["product_id"], line["quantity"]) if isinstance(line, dict) else line
+        if isinstance(qty, bool) or not isinstance(qty, (int, str)):
+            raise TypeError
+        return pid, int(qty)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Batch line {n} needs a product_id and an integer quantity, got {line!r}") from None
 
 class CartItem:
+    __slots__ = ("_product", "_quantity", "_unit_minor", "_ship_minor", "_discount_minor")
+
     def __init__(self, product: Product, quantity: int):
         self._product = product
         self._quantity = int(quantity)
+        self._discount_minor = 0
+        self.reprice()
+
+    def reprice(self) -> None:
+        self._unit_minor = to_minor(self._product._price)
+        self._ship_minor = to_minor(self._product._shipping_cost) if isinstance(self._product, PhysicalProduct) else 0
+
+    def subtotal_minor(self) -> int:
+        return self._quantity * self._unit_minor + self._ship_minor
 
     def calculate_subtotal(self) -> float:
-        return (self._quantity * self._product._price) + (
-            self._product._shipping_cost if isinstance(self._product, PhysicalProduct) else 0
-        )
+        return from_minor(self.subtotal_minor())
 
     def __str__(self) -> str:
         return (
@@ -22,149 +57,448 @@ class CartItem:
         )
 
 class ShoppingCart:
-    def __init__(self, catalog_file="jsons/infoProducts.json", cart_file="jsons/cart.json", db_logger=None):
+    def __init__(self, catalog_file="jsons/infoProducts.json", cart_file="jsons/cart.json", db_logger=None,
+                 cart_id=None, checkpoint_every: int = 50, catalog_backend: str = "memory", catalog_cache_size: int = 1024,
+                 inventory=None, catalog=None, search_index=None, storage=None, promotions=None,
+                 claim_stock: bool = True):
         self._product_catalog_file = catalog_file
-        self._cart_state_file = cart_file
-        Path(self._cart_state_file).parent.mkdir(parents=True, exist_ok=True)
+        self._catalog_backend = catalog_backend
+        self._catalog_cache_size = catalog_cache_size
         self._items: Dict[str, CartItem] = {}
-        self.catalog = self._load_catalog()
+        self._lock = threading.RLock()
+        self._total_minor = 0
+        self._shipping_minor = 0
+        self._discount_minor = 0  # sum of the lines' promotion discounts; cart-level ones are applied in _net_minor()
+        self.promotions = promotions
+        self._promotions_version = promotions.version if promotions is not None else None
+        self._snapshot = None
+        self.version = 0
         self.db = db_logger
+        self.cart_id = cart_id or Path(cart_file).stem
+        if storage is None:
+            # default: the original JSON files, with this cart's state at cart_file
+            storage = JSONStorage(str(Path(cart_file).parent), catalog_file=catalog_file)
+            storage.bind(self.cart_id, cart_file)
+        self._storage = storage
+        if catalog is None:
+            catalog = self._load_catalog()
+            for pid, qty in self._storage.load_stock().items():
+                if pid in catalog:
+                    catalog[pid]._quantity_available = qty
+        self.catalog = catalog
+        self._checkpoint_every = max(1, int(checkpoint_every))
+        self._log_seq = 0
         self._load_cart_state()
+        self._search_index = search_index
+        self.inventory = inventory
+        if self.inventory is not None:
+            self.inventory.subscribe(self.cart_id, self._on_reservations_expired)
+            if claim_stock:  # False: the caller is about to apply an expiry of these very lines
+                self._claim_restored()
+
+    def _claim_restored(self) -> None:
+        # lines read back from storage hold no stock unless the store still has their reservation (SQLite survives a
+        # restart, an evicted server session keeps its hold); take what is missing, or shrink the line to what is held
+        changes = []
+        for pid, item in list(self._items.items()):
+            held = self.inventory.held(self.cart_id, pid)
+            missing = item._quantity - held
+            if missing > 0 and not self.inventory.reserve(self.cart_id, pid, missing):
+                changes.append(change_record(item._product, self._set_quantity(item._product, held), held))
+        if changes:
+            self._persist(*(ch["product_id"] for ch in changes))
+            emit("reservation_lost", "⚠️ Stock ran out while the cart was away, {lines} cart line(s) reduced.",
+                 logging.WARNING, cart_id=self.cart_id, lines=len(changes))
+            self._log("expire_reservation", "success", changes)
+
+    # stock always moves on the catalog's object for the id: a lazy or columnar catalog may have evicted the one a
+    # cart line still holds (it was clean then) and built a new one since
+    def _take_stock(self, product: Product, qty: int) -> bool:
+        pid = product._product_id
+        if self.inventory is None:
+            ok = pid in self.catalog and self.catalog[pid].decrease_quantity(qty)
+        else:
+            ok = self.inventory.reserve(self.cart_id, pid, qty)
+        if ok:
+            self._stock_changed(pid)
+        return ok
+
+    def _return_stock(self, product: Product, qty: int) -> None:
+        pid = product._product_id
+        if self.inventory is None:
+            if pid not in self.catalog:
+                return  # the product left the catalog, there is no stock to credit
+            self.catalog[pid].increase_quantity(qty)
+        elif not self.inventory.release(self.cart_id, pid, qty):
+            return  # nothing was held any more (the reservation expired), so no stock came back
+        self._stock_changed(pid)
+
+    def _stock_changed(self, product_id: str) -> None:
+        if self.inventory is None:
+            # with a ReservationEngine the stock belongs to its store, not to the cart storage
+            self._storage.write_stock([(product_id, self.catalog[product_id]._quantity_available)])
+        if self._search_index is not None:
+            self._search_index.update_stock(product_id)
 
-    def _log(self, action: str, status: str):
+    @property
+    def search_index(self) -> CatalogIndex:
+        if self._search_index is None:
+            self._search_index = CatalogIndex(self.catalog)
+        return self._search_index
+
+    def search(self, text=None, min_price=None, max_price=None, ptype=None, in_stock=None, limit=50) -> list:
+        pids = self.search_index.search(text, min_price, max_price, ptype, in_stock, limit)
+        return [self.catalog[pid] for pid in pids]
+
+    @_synchronized
+    def _on_reservations_expired(self, lines) -> None:
+        changes = []
+        for pid, qty in lines:
+            item = self._items.get(pid)
+            self._stock_changed(pid)
+            if item is not None:
+                new_qty = max(item._quantity - qty, 0)
+                changes.append(change_record(item._product, self._set_quantity(item._product, new_qty), new_qty))
+        if changes:
+            self._persist(*(ch["product_id"] for ch in changes))
+            emit("reservation_expired", "⌛ Reservation expired, {lines} cart line(s) released back to stock.",
+                 logging.WARNING, cart_id=self.cart_id, lines=len(changes))
+            self._log("expire_reservation", "success", changes)
+
+    @_synchronized
+    def apply_catalog_changes(self, changed=(), removed=()) -> None:
+        # CatalogWatcher already updated the products in place; only the lines holding them are repriced
+        changes = []
+        for pid in changed:
+            item = self._items.get(pid)
+            if item is not None:
+                self._account(item, -1)
+                item._product = self.catalog[pid]  # same object unless the product changed type
+                item.reprice()
+                self._discount(item)
+                self._account(item, 1)
+        for pid in removed:
+            item = self._items.pop(pid, None)
+            if item is not None:
+                self._account(item, -1)
+                if self.inventory is not None:
+                    self.inventory.release(self.cart_id, pid, item._quantity)  # drop the hold on a product that is gone
+                changes.append(change_record(item._product, item._quantity, 0))
+        self._invalidate()
+        if changes:
+            self._persist(*(ch["product_id"] for ch in changes))
+            emit("catalog_lines_removed", "⚠️ {lines} cart line(s) removed, the product(s) left the catalog.",
+                 logging.WARNING, cart_id=self.cart_id, lines=len(changes))
+            self._log("catalog_update", "success", changes)
+        if self.inventory is None:
+            self._storage.write_stock([(pid, self.catalog[pid]._quantity_available) for pid in changed if pid in self.catalog])
+        if self._search_index is not None:
+            for pid in (*changed, *removed):
+                self._search_index.update(pid)
+
+    def _log(self, action: str, status: str, changes=(), **request):
+        METRICS.inc("cart_ops_total", action=action, status=status)
         if not self.db:
             return
-        self.db.log_action(action=action, status=status, cart_state=self.get_cart_snapshot())
+        # seq orders records that share a logged_at; rows replayed from the spill keep their logged_at but get later ids
+        record = {"cart_id": self.cart_id, "seq": self._log_seq, "changes": list(changes)}
+        if self.promotions is not None:
+            # a change can move the discount of lines it did not touch (bundles, thresholds): record all of them
+            record["discount"] = self.get_discount()
+            record["line_discounts"] = {pid: from_minor(item._discount_minor)
+                                        for pid, item in self._items.items() if item._discount_minor}
+        if request:
+            record["request"] = request
+        if self._log_seq % self._checkpoint_every == 0:
+            record["checkpoint"] = self.get_cart_snapshot()
+        self._log_seq += 1
+        self.db.log_action(action=action, status=status, cart_state=record)
+
+    def _set_quantity(self, product: Product, new_qty: int) -> int:
+        pid = product._product_id
+        item = self._items.get(pid)
+        old_qty = 0
+        if item is not None:
+            old_qty = item._quantity
+            self._account(item, -1)
+        if new_qty <= 0:
+            self._items.pop(pid, None)
+        else:
+            if item is None:
+                item = self._items[pid] = CartItem(product, new_qty)
+            else:
+                item._quantity = int(new_qty)
+            self._discount(item)
+            self._account(item, 1)
+        self._invalidate()
+        return old_qty
+
+    def _account(self, item: CartItem, sign: int) -> None:
+        self._total_minor += sign * item.subtotal_minor()
+        self._shipping_minor += sign * item._ship_minor
+        self._discount_minor += sign * item._discount_minor
+
+    def _discount(self, item: CartItem) -> None:
+        # one compiled-table lookup for this line only; the other lines keep their discount
+        if self.promotions is not None:
+            item._discount_minor = self.promotions.line_discount(item._product, item._quantity, item._unit_minor)
+        else:
+            item._discount_minor = 0
+
+    @_synchronized
+    def set_promotions(self, promotions) -> None:
+        self.promotions = promotions
+        self._rediscount()
+
+    def _rediscount(self) -> None:
+        self._promotions_version = self.promotions.version if self.promotions is not None else None
+        for item in self._items.values():
+            self._account(item, -1)
+            self._discount(item)
+            self._account(item, 1)
+        self._invalidate()
+
+    def _sync_promotions(self) -> None:
+        # the engine was recompiled at runtime (new rules): the cached line discounts are from the old rules
+        if self.promotions is not None and self._promotions_version != self.promotions.version:
+            with self._lock:
+                if self._promotions_version != self.promotions.version:
+                    self._rediscount()
+
+    def _net_minor(self) -> int:
+        self._sync_promotions()
+        if self.promotions is None:
+            return self._total_minor
+        goods = self._total_minor - self._shipping_minor - self._discount_minor
+        return self._total_minor - self._discount_minor - self.promotions.cart_discount(goods, self._shipping_minor)
+
+    def _invalidate(self) -> None:
+        self._snapshot = None
+        self.version += 1
 
     def get_cart_snapshot(self) -> dict:
-        return {
-            "items": [
-                {
-                    "product_id": prdctID,
-                    "name": item._product._name,
-                    "quantity": item._quantity,
-                    "price": item._product._price,
-                    "shipping": item._product._shipping_cost,
-                    "subtotal": item.calculate_subtotal(),
-                }
-                for prdctID, item in self._items.items()
-            ],
-            "total": self.get_total(),
-        }
+        # cached until the next mutation; treat the returned dict as read-only
+        self._sync_promotions()
+        if self._snapshot is None:
+            self._snapshot = self._build_snapshot()
+        return self._snapshot
+
+    def _build_snapshot(self) -> dict:
+        return self._with_discount({"items": list(self.iter_items()), "total": self.get_total()})
+
+    def _with_discount(self, snapshot: dict) -> dict:
+        # carts without promotions keep the original snapshot shape
+        if self.promotions is not None:
+            snapshot["discount"] = self.get_discount()
+        return snapshot
+
+    def iter_items(self):
+        for prdctID, item in list(self._items.items()):
+            row = {
+                "product_id": prdctID,
+                "name": item._product._name,
+                "quantity": item._quantity,
+                "price": item._product._price,
+                "shipping": from_minor(item._ship_minor),  # 0 for non-physical products, like change_record
+                "subtotal": item.calculate_subtotal(),
+            }
+            if item._discount_minor:
+                row["discount"] = from_minor(item._discount_minor)
+            yield row
+
+    def stream_snapshot(self) -> dict:
+        # same shape as get_cart_snapshot() but items are produced lazily, for the streaming exporters
+        self._sync_promotions()
+        return self._with_discount({"items": self.iter_items(), "total": self.get_total()})
 
     def _load_catalog(self) -> dict:
-        catalog = {}
-        try:
-            with open(self._product_catalog_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for item in data:
-                    if item.get("type") == "physical":
-                        p = PhysicalProduct(
-                            item["product_id"], item["name"], item["price"], item["quantity_available"], item.get("weight", 1), item.get("shipping_cost", 999)
-                        )
-                    elif item.get("type") == "digital":
-                        p = DigitalProduct(
-                            item["product_id"], item["name"], item["price"], item["quantity_available"], item["download_link"]
-                        )
-                    else:
-                        p = Product(item["product_id"], item["name"], item["price"], item["quantity_available"], item.get("shipping_cost", 0))
-                    catalog[p._product_id] = p
-        except FileNotFoundError:
-            print("⚠️ Product catalog not found. Please, ensure catalog file (.json file) exists!")
-        return catalog
+        return load_catalog(self._product_catalog_file, self._catalog_backend, self._catalog_cache_size)
 
     def _save_catalog(self) -> None:
-        with open(self._product_catalog_file, "w", encoding="utf-8") as f:
-            data = [p.to_dict() for p in self.catalog.values()]
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        self._storage.save_catalog(self.catalog)
 
     def _load_cart_state(self) -> None:
-        try:
-            if not Path(self._cart_state_file).exists() or Path(self._cart_state_file).stat().st_size == 0:
-                with open(self._cart_state_file, "w", encoding="utf-8") as f:
-                    json.dump([], f)
-            with open(self._cart_state_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for item in data:
-                    pid = item["product_id"]
-                    qty = item["quantity"]
-                    if pid in self.catalog:
-                        self._items[pid] = CartItem(self.catalog[pid], qty)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self._items = {}
+        state = self._storage.load_cart(self.cart_id)
+        for pid, qty in state.items():
+            if pid in self.catalog:
+                self._set_quantity(self.catalog[pid], qty)
+        if len(self._items) != len(state):
+            self._save_cart_state()  # drop lines for products that left the catalog
 
+    @METRICS.timed("file_write_seconds", target="cart_state")
     def _save_cart_state(self) -> None:
-        with open(self._cart_state_file, "w", encoding="utf-8") as f:
-            data = [{"product_id": prdctID, "quantity": item._quantity} for prdctID, item in self._items.items()]
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        self._storage.save_cart(self.cart_id, {prdctID: item._quantity for prdctID, item in self._items.items()})
 
+    def _persist(self, *product_ids: str) -> None:
+        self._storage.write_lines(self.cart_id, [(pid, self._items[pid]._quantity if pid in self._items else 0) for pid in product_ids])
+
+    @METRICS.timed("cart_op_seconds", op="add_item")
+    @_synchronized
     def add_item(self, product_id: str, quantity: int) -> bool:
         try:
             if product_id in self.catalog:
                 product = self.catalog[product_id]
-                if product._quantity_available >= quantity > 0:
-                    if product_id in self._items:
-                        self._items[product_id]._quantity += quantity
-                    else:
-                        self._items[product_id] = CartItem(product, quantity)
-                    product.decrease_quantity(quantity)
-                    self._save_cart_state()
-                    print(f"✅ {quantity}x '{product._name}' successfully added to cart.")
-                    self._log("add_item", "success")
+                if quantity > 0 and self._take_stock(product, quantity):
+                    old_qty = self._items[product_id]._quantity if product_id in self._items else 0
+                    self._set_quantity(product, old_qty + quantity)
+                    self._persist(product_id)
+                    emit("item_added", "✅ {quantity}x '{name}' successfully added to cart.",
+                         cart_id=self.cart_id, product_id=product_id, name=product._name, quantity=quantity)
+                    self._log("add_item", "success", [change_record(product, old_qty, old_qty + quantity)])
                     return True
                 else:
-                    print("⚠️ Not enough stock available, for now!")
-                    self._log("add_item", "failed")
+                    emit("out_of_stock", "⚠️ Not enough stock available, for now!", logging.WARNING,
+                         cart_id=self.cart_id, product_id=product_id, quantity=quantity)
+                    self._log("add_item", "failed", product_id=product_id, quantity=quantity)
             else:
-                print("⚠️ Invalid product ID, Please try again!")
-                self._log("add_item", "failed")
+                emit("invalid_product", "⚠️ Invalid product ID, Please try again!", logging.WARNING,
+                     cart_id=self.cart_id, product_id=product_id)
+                self._log("add_item", "failed", product_id=product_id, quantity=quantity)
         except Exception as e:
-            print(f"❌ Error: {e}")
-            self._log("add_item", "error")
+            emit("cart_error", "❌ Error: {error}", logging.ERROR, cart_id=self.cart_id, action="add_item", error=str(e))
+            self._log("add_item", "error", product_id=product_id, quantity=quantity)
         return False
 
+    @METRICS.timed("cart_op_seconds", op="update_quantity")
+    @_synchronized
     def update_quantity(self, product_id: str, new_quantity: int) -> bool:
+        if int(new_quantity) < 0:
+            emit("invalid_quantity", "⚠️ Quantity cannot be negative, Please try again!", logging.WARNING,
+                 cart_id=self.cart_id, product_id=product_id, quantity=new_quantity)
+            self._log("update_quantity", "failed", product_id=product_id, quantity=new_quantity)
+            return False
         if product_id in self._items:
             cart_item = self._items[product_id]
             current_state = cart_item._quantity
             product = cart_item._product
             diff = int(new_quantity) - current_state
-            if diff > 0 and product._quantity_available >= diff:
-                product.decrease_quantity(diff)
-                cart_item._quantity = int(new_quantity)
+            new_state = current_state
+            if diff > 0 and self._take_stock(product, diff):
+                new_state = int(new_quantity)
             elif diff < 0:
-                product.increase_quantity(-diff)
-                cart_item._quantity = int(new_quantity)
-            if new_quantity == 0:
-                del self._items[product_id]
-            self._save_cart_state()
-            print("✅ Quantity successfully updated.")
-            self._log("update_quantity", "success")
+                self._return_stock(product, -diff)
+                new_state = int(new_quantity)
+            self._set_quantity(product, new_state)
+            self._persist(product_id)
+            emit("quantity_updated", "✅ Quantity successfully updated.",
+                 cart_id=self.cart_id, product_id=product_id, old_quantity=current_state, quantity=new_state)
+            self._log("update_quantity", "success", [change_record(product, current_state, max(new_state, 0))])
             return True
-        print("⚠️ Item not found in cart, Please check again!")
-        self._log("update_quantity", "failed")
+        emit("item_not_in_cart", "⚠️ Item not found in cart, Please check again!", logging.WARNING,
+             cart_id=self.cart_id, product_id=product_id)
+        self._log("update_quantity", "failed", product_id=product_id, quantity=new_quantity)
         return False
 
+    @METRICS.timed("cart_op_seconds", op="remove_item")
+    @_synchronized
     def remove_item(self, product_id: str) -> bool:
         if product_id in self._items:
-            item = self._items.pop(product_id)
-            item._product.increase_quantity(item._quantity)
-            self._save_cart_state()
-            print("✅ Item successfully removed from cart.")
-            self._log("remove_item", "success")
+            item = self._items[product_id]
+            self._set_quantity(item._product, 0)
+            self._return_stock(item._product, item._quantity)
+            self._persist(product_id)
+            emit("item_removed", "✅ Item successfully removed from cart.", cart_id=self.cart_id, product_id=product_id)
+            self._log("remove_item", "success", [change_record(item._product, item._quantity, 0)])
             return True
-        print("⚠️ Item not found in cart, Please check again!")
-        self._log("remove_item", "failed")
+        emit("item_not_in_cart", "⚠️ Item not found in cart, Please check again!", logging.WARNING,
+             cart_id=self.cart_id, product_id=product_id)
+        self._log("remove_item", "failed", product_id=product_id)
         return False
 
-    def clear_cart(self) -> None:
+    @METRICS.timed("cart_op_seconds", op="apply_batch")
+    @_synchronized
+    def apply_batch(self, lines, mode: str = "add") -> bool:
+        # all-or-nothing: every line is validated against stock before anything changes
+        if mode not in ("add", "set"):
+            raise ValueError(f"Unknown batch mode: {mode!r}")
+        targets: Dict[str, int] = {}
+        errors = []
+        for n, line in enumerate(lines, start=1):
+            pid, qty = _batch_line(n, line)
+            if pid not in self.catalog:
+                errors.append(f"{pid}: invalid product ID")
+                continue
+            if qty < 0 or (mode == "add" and qty == 0):
+                errors.append(f"{pid}: invalid quantity {qty}")
+                continue
+            current = targets.get(pid, self._items[pid]._quantity if pid in self._items else 0)
+            targets[pid] = current + qty if mode == "add" else qty
+        for pid, target in targets.items():
+            held = self._items[pid]._quantity if pid in self._items else 0
+            if target - held > self.catalog[pid]._quantity_available:
+                errors.append(f"{pid}: not enough stock for {target}")
+        if errors:
+            emit("batch_rejected", "⚠️ Batch rejected, {problems} problem(s): {details}", logging.WARNING,
+                 cart_id=self.cart_id, problems=len(errors), details="; ".join(errors[:5]))
+            self._log("apply_batch", "failed", lines=len(targets) + len(errors), errors=errors[:20])
+            return False
+        taken = []
+        for pid, target in targets.items():
+            held = self._items[pid]._quantity if pid in self._items else 0
+            if target > held:
+                if not self._take_stock(self.catalog[pid], target - held):
+                    for product, qty in taken:
+                        self._return_stock(product, qty)
+                    emit("batch_rejected", "⚠️ Batch rejected, stock for {product_id} was taken by another cart.",
+                         logging.WARNING, cart_id=self.cart_id, product_id=pid)
+                    self._log("apply_batch", "failed", lines=len(targets), errors=[f"{pid}: stock changed during batch"])
+                    return False
+                taken.append((self.catalog[pid], target - held))
+        changes = []
+        for pid, target in targets.items():
+            product = self.catalog[pid]
+            old_qty = self._set_quantity(product, target)
+            if target < old_qty:
+                self._return_stock(product, old_qty - target)
+            if target != old_qty:
+                changes.append(change_record(product, old_qty, target))
+        self._persist(*(ch["product_id"] for ch in changes))
+        emit("batch_applied", "✅ Batch applied, {lines} cart line(s) changed.", cart_id=self.cart_id, lines=len(changes))
+        self._log("apply_batch", "success", changes)
+        return True
+
+    def add_items(self, lines) -> bool:
+        return self.apply_batch(lines, mode="add")
+
+    def import_file(self, path: str, mode: str = "add") -> bool:
+        return self.apply_batch(read_cart_lines(path), mode=mode)
+
+    def _empty(self) -> list:
+        changes = [change_record(item._product, item._quantity, 0) for item in self._items.values()]
         self._items.clear()
-        self._save_cart_state()
-        print("🗑️ All Cart cleared.")
-        self._log("clear_cart", "success")
+        self._total_minor = self._shipping_minor = self._discount_minor = 0
+        self._invalidate()
+        self._storage.clear_cart(self.cart_id)
+        return changes
+
+    @METRICS.timed("cart_op_seconds", op="clear_cart")
+    @_synchronized
+    def clear_cart(self) -> None:
+        # the lines go back on the shelf; only checkout() keeps the stock they took
+        for item in list(self._items.values()):
+            self._return_stock(item._product, item._quantity)
+        changes = self._empty()
+        emit("cart_cleared", "🗑️ All Cart cleared.", cart_id=self.cart_id, lines=len(changes))
+        self._log("clear_cart", "success", changes)
+
+    @METRICS.timed("cart_op_seconds", op="checkout")
+    @_synchronized
+    def checkout(self) -> dict:
+        # the held units are sold: the reservations are committed and the cart starts over; returns the receipt
+        receipt = self.get_cart_snapshot()
+        changes = self._empty()
+        if self.inventory is not None:
+            self.inventory.commit(self.cart_id)
+        emit("cart_checked_out", "💳 Checkout complete. Thank you for shopping with us!", cart_id=self.cart_id,
+             lines=len(changes), total=receipt["total"])
+        self._log("checkout", "success", changes)
+        return receipt
 
     def get_total(self) -> float:
-        return sum(item.calculate_subtotal() for item in self._items.values())
+        return from_minor(self._net_minor())
+
+    def get_discount(self) -> float:
+        return from_minor(self._total_minor - self._net_minor())
 
     def display_cart(self) -> None:
         if not self._items:
@@ -173,6 +507,8 @@ class ShoppingCart:
         print("\n-=*=--=*=--=*=--=*=--=*=- FINAL CART CONTENTS -=*=--=*=--=*=--=*=--=*=-")
         for item in self._items.values():
             print(item)
+        if self.promotions is not None and self._net_minor() != self._total_minor:
+            print(f"Discount: -₺{self.get_discount()}")
         print(f"Total Amount: ₺{self.get_total()}\n")
 
     def display_products(self) -> None:
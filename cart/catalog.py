@@ -0,0 +1,167 @@
+from __future__ import annotations
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+import json
+import os
+import re
+import threading
+from cart.product import Product, PhysicalProduct, DigitalProduct
+from cart.columnar import ColumnarCatalog
+from cart.binfmt import CATALOG_MAGIC, BinaryCatalog, sniff
+
+_SEPARATOR = re.compile(r"[\s,]*")
+
+def product_from_dict(item: dict) -> Product:
+    if item.get("type") == "physical":
+        return PhysicalProduct(
+            item["product_id"], item["name"], item["price"], item["quantity_available"], item.get("weight", 1), item.get("shipping_cost", 999),
+            item.get("category"),
+        )
+    if item.get("type") == "digital":
+        return DigitalProduct(
+            item["product_id"], item["name"], item["price"], item["quantity_available"], item["download_link"], item.get("category")
+        )
+    return Product(item["product_id"], item["name"], item["price"], item["quantity_available"], item.get("shipping_cost", 0), item.get("category"))
+
+def scan_records(text: str):
+    # yields (start, end, record) for every object of a top-level JSON array, in character offsets
+    decoder = json.JSONDecoder()
+    i = text.index("[") + 1
+    while True:
+        i = _SEPARATOR.match(text, i).end()
+        if i >= len(text) or text[i] == "]":
+            return
+        record, end = decoder.raw_decode(text, i)
+        yield i, end, record
+        i = end
+
+class LazyCatalog(Mapping):
+    def __init__(self, catalog_file: str, index_file: str = None, cache_size: int = 1024):
+        self._catalog_file = Path(catalog_file)
+        self._index_file = index_file or str(self._catalog_file.with_name(self._catalog_file.name + ".idx"))
+        self._cache_size = max(1, int(cache_size))
+        self._cache: "OrderedDict[str, Product]" = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.RLock()
+        import sqlite3  # only the lazy backend needs it
+        self._db = sqlite3.connect(self._index_file, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records (product_id TEXT PRIMARY KEY, offset INTEGER, length INTEGER, stock INTEGER)"
+        )
+        if not self._index_is_fresh():
+            self.rebuild_index()
+
+    def _source_signature(self) -> str:
+        st = os.stat(self._catalog_file)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _index_is_fresh(self) -> bool:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row is not None and row[0] == self._source_signature()
+
+    def rebuild_index(self) -> None:
+        with self._lock:
+            signature = self._source_signature()
+            with open(self._catalog_file, "r", encoding="utf-8") as f:
+                text = f.read()
+            rows = []
+            byte_pos, char_pos = 0, 0
+            for start, end, record in scan_records(text):
+                byte_pos += len(text[char_pos:start].encode("utf-8"))
+                length = len(text[start:end].encode("utf-8"))
+                rows.append((record["product_id"], byte_pos, length, int(record["quantity_available"])))
+                byte_pos += length
+                char_pos = end
+            with self._db:
+                self._db.execute("DELETE FROM records")
+                self._db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", rows)
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (signature,))
+            # products already handed out stay the same objects (carts hold them); only vanished ids are dropped
+            present = {row[0] for row in rows}
+            for held in (self._cache, self._dirty):
+                for pid in [pid for pid in held if pid not in present]:
+                    del held[pid]
+
+    def _load(self, product_id: str) -> Product:
+        row = self._db.execute("SELECT offset, length FROM records WHERE product_id = ?", (product_id,)).fetchone()
+        if row is None:
+            raise KeyError(product_id)
+        with open(self._catalog_file, "rb") as f:
+            f.seek(row[0])
+            return product_from_dict(json.loads(f.read(row[1])))
+
+    def _evict(self) -> None:
+        while len(self._cache) > self._cache_size:
+            pid, product = self._cache.popitem(last=False)
+            row = self._db.execute("SELECT stock FROM records WHERE product_id = ?", (pid,)).fetchone()
+            if row is None or row[0] != product._quantity_available:
+                self._dirty[pid] = product  # keep modified stock alive, it only exists in memory
+
+    def resident(self, product_id: str):
+        # the in-memory object for product_id, or None when the next lookup would read it from the file
+        with self._lock:
+            return self._dirty.get(product_id) or self._cache.get(product_id)
+
+    def store(self, product: Product) -> None:
+        pass  # the file is the store; rebuild_index() already points at the new record
+
+    def install(self, product: Product) -> None:
+        with self._lock:
+            self._cache.pop(product._product_id, None)
+            self._dirty[product._product_id] = product
+
+    def discard(self, product_id: str) -> None:
+        with self._lock:
+            self._cache.pop(product_id, None)
+            self._dirty.pop(product_id, None)
+
+    def __getitem__(self, product_id: str) -> Product:
+        with self._lock:
+            if product_id in self._dirty:
+                return self._dirty[product_id]
+            product = self._cache.get(product_id)
+            if product is not None:
+                self._cache.move_to_end(product_id)
+                return product
+            product = self._load(product_id)
+            self._cache[product_id] = product
+            self._evict()
+            return product
+
+    def __contains__(self, product_id) -> bool:
+        with self._lock:
+            if product_id in self._cache or product_id in self._dirty:
+                return True
+            return self._db.execute("SELECT 1 FROM records WHERE product_id = ?", (product_id,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            ids = [r[0] for r in self._db.execute("SELECT product_id FROM records ORDER BY offset")]
+        return iter(ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+def load_catalog(catalog_file: str, backend: str = "memory", cache_size: int = 1024):
+    catalog = {}
+    try:
+        if sniff(catalog_file) == CATALOG_MAGIC:
+            return BinaryCatalog(catalog_file, cache_size)  # a binary snapshot is already indexed and mapped, whatever the backend
+        if backend == "lazy":
+            return LazyCatalog(catalog_file, cache_size=cache_size)
+        if backend == "columnar":
+            return ColumnarCatalog.from_file(catalog_file, cache_size)
+        with open(catalog_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            for item in data:
+                p = product_from_dict(item)
+                catalog[p._product_id] = p
+    except FileNotFoundError:
+        print("⚠️ Product catalog not found. Please, ensure catalog file (.json file) exists!")
+    return catalog
@@ -0,0 +1,172 @@
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Iterable, Iterator
+import json
+import threading
+from cart.product import Product, PhysicalProduct, DigitalProduct
+
+GENERIC, PHYSICAL, DIGITAL = 0, 1, 2
+_KINDS = {"physical": PHYSICAL, "digital": DIGITAL}
+
+def _kind_of(product: Product) -> int:
+    if isinstance(product, PhysicalProduct):
+        return PHYSICAL
+    if isinstance(product, DigitalProduct):
+        return DIGITAL
+    return GENERIC
+
+class ColumnarCatalog(Mapping):
+    # parallel arrays, one slot per product; Product objects are only built for ids that are touched and kept like
+    # LazyCatalog keeps them: a bounded LRU of clean objects, plus the ones whose values no longer match their slot
+    # (stock taken by carts, a watcher edit) for as long as they differ
+    def __init__(self, rows: Iterable[dict] = (), cache_size: int = 1024):
+        self._ids = []
+        self._index = {}
+        self._names = []
+        self._price = array("d")
+        self._stock = array("q")
+        self._shipping = array("d")
+        self._weight = array("d")
+        self._kind = array("B")
+        self._links = []
+        self._categories = []
+        self._cache_size = max(1, int(cache_size))
+        self._cache: "OrderedDict[str, Product]" = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.RLock()
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_file(cls, catalog_file: str, cache_size: int = 1024) -> "ColumnarCatalog":
+        with open(catalog_file, "r", encoding="utf-8") as f:
+            return cls(json.load(f), cache_size)
+
+    def append(self, row: dict) -> None:
+        pid = row["product_id"]
+        kind = _KINDS.get(row.get("type"), GENERIC)
+        self._index[pid] = len(self._ids)
+        self._ids.append(pid)
+        self._names.append(row["name"])
+        self._price.append(float(row["price"]))
+        self._stock.append(int(row["quantity_available"]))
+        if kind == PHYSICAL:
+            self._shipping.append(float(row.get("shipping_cost", 999)))
+            self._weight.append(float(row.get("weight", 1)))
+        else:
+            self._shipping.append(0.0 if kind == DIGITAL else float(row.get("shipping_cost", 0)))
+            self._weight.append(0.0)
+        self._kind.append(kind)
+        self._links.append(row["download_link"] if kind == DIGITAL else None)
+        self._categories.append(row.get("category"))
+
+    def store(self, product: Product) -> None:
+        # writes a product's current values into its slot, appending one for a new id
+        pid = product._product_id
+        if pid not in self._index:
+            self.append({"product_id": pid, "name": product._name, "price": 0, "quantity_available": 0})
+        i = self._index[pid]
+        kind = _kind_of(product)
+        weight = product._weight if kind == PHYSICAL else 0.0
+        self._names[i] = product._name
+        self._price[i] = product._price
+        self._stock[i] = product._quantity_available
+        self._shipping[i] = product._shipping_cost
+        self._weight[i] = weight
+        self._kind[i] = kind
+        self._links[i] = product._download_link if kind == DIGITAL else None
+        self._categories[i] = product._category
+
+    def install(self, product: Product) -> None:
+        with self._lock:
+            self.store(product)
+            self._cache.pop(product._product_id, None)
+            self._dirty[product._product_id] = product
+
+    def resident(self, product_id: str):
+        # the in-memory object for product_id, or None when the next lookup builds it from the columns
+        with self._lock:
+            return self._dirty.get(product_id) or self._cache.get(product_id)
+
+    def resident_ids(self) -> list:
+        with self._lock:
+            return [*self._dirty, *self._cache]
+
+    def discard(self, product_id: str) -> None:
+        with self._lock:
+            i = self._index.pop(product_id, None)
+            if i is None:
+                return
+            self._cache.pop(product_id, None)
+            self._dirty.pop(product_id, None)
+            for column in (self._ids, self._names, self._price, self._stock, self._shipping, self._weight, self._kind, self._links, self._categories):
+                del column[i]
+            for j in range(i, len(self._ids)):
+                self._index[self._ids[j]] = j
+
+    def _build(self, i: int) -> Product:
+        kind = self._kind[i]
+        if kind == PHYSICAL:
+            return PhysicalProduct(self._ids[i], self._names[i], self._price[i], self._stock[i], self._weight[i], self._shipping[i], self._categories[i])
+        if kind == DIGITAL:
+            return DigitalProduct(self._ids[i], self._names[i], self._price[i], self._stock[i], self._links[i], self._categories[i])
+        return Product(self._ids[i], self._names[i], self._price[i], self._stock[i], self._shipping[i], self._categories[i])
+
+    def _matches(self, product: Product) -> bool:
+        i = self._index[product._product_id]
+        return (product._quantity_available == self._stock[i] and product._price == self._price[i]
+                and product._name == self._names[i] and product._shipping_cost == self._shipping[i]
+                and _kind_of(product) == self._kind[i])
+
+    def _evict(self) -> None:
+        while len(self._cache) > self._cache_size:
+            pid, product = self._cache.popitem(last=False)
+            if not self._matches(product):
+                self._dirty[pid] = product  # its values only exist in memory, and carts may hold the object
+
+    def __getitem__(self, product_id: str) -> Product:
+        with self._lock:
+            product = self._dirty.get(product_id)
+            if product is not None:
+                return product
+            product = self._cache.get(product_id)
+            if product is not None:
+                self._cache.move_to_end(product_id)
+                return product
+            product = self._cache[product_id] = self._build(self._index[product_id])
+            self._evict()
+            return product
+
+    def values(self) -> Iterator[Product]:
+        # full scans (display, saving) get throwaway objects for products that are not in memory instead of
+        # churning the LRU; treat them as read-only
+        for i, pid in enumerate(self._ids):
+            yield self.resident(pid) or self._build(i)
+
+    def rows(self) -> Iterator[tuple]:
+        # (product_id, name, price, stock, kind) for every product, straight from the columns unless in memory
+        for i, pid in enumerate(self._ids):
+            product = self.resident(pid)
+            if product is None:
+                yield pid, self._names[i], self._price[i], self._stock[i], self._kind[i]
+            else:
+                yield pid, product._name, product._price, product._quantity_available, _kind_of(product)
+
+    def __contains__(self, product_id) -> bool:
+        return product_id in self._index
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def price(self, product_id: str) -> float:
+        product = self.resident(product_id)
+        return product._price if product is not None else self._price[self._index[product_id]]
+
+    def stock(self, product_id: str) -> int:
+        product = self.resident(product_id)
+        return product._quantity_available if product is not None else self._stock[self._index[product_id]]
@@ -0,0 +1,25 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import List, Tuple
+import csv
+import json
+
+def _key(name: str) -> str:
+    return name.strip().lower().replace(" ", "_")
+
+def read_cart_lines(path: str) -> List[Tuple[str, int]]:
+    # accepts [{"product_id", "quantity"}, ...], a saved cart snapshot ({"items": [...]}) or a CSV with those columns
+    if Path(path).suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = [{_key(k): v for k, v in row.items() if k} for row in csv.DictReader(f)]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        rows = data.get("items", []) if isinstance(data, dict) else data
+    lines = []
+    for n, row in enumerate(rows, start=1):
+        try:
+            lines.append((str(row["product_id"]).strip(), int(row["quantity"])))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Line {n} of '{path}' needs a product_id and an integer quantity") from None
+    return lines
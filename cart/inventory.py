@@ -0,0 +1,277 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import sqlite3
+import threading
+import time
+from metrics.metrics import emit
+
+class MemoryInventoryStore:
+    # stock lives on the Product objects; striped locks make reserve/release atomic per product
+    def __init__(self, catalog, stripes: int = 64):
+        self.catalog = catalog
+        self._locks = [threading.Lock() for _ in range(max(1, int(stripes)))]
+        self._held: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._expires: Dict[str, float] = {}
+        self._meta = threading.Lock()
+
+    def _lock(self, product_id: str) -> threading.Lock:
+        return self._locks[hash(product_id) % len(self._locks)]
+
+    def available(self, product_id: str) -> int:
+        return self.catalog[product_id]._quantity_available
+
+    def reserve(self, cart_id: str, product_id: str, qty: int, expires_at: float) -> Optional[int]:
+        product = self.catalog[product_id]
+        with self._lock(product_id):
+            if not product.decrease_quantity(qty):
+                return None
+            remaining = product._quantity_available
+        with self._meta:
+            self._held[cart_id][product_id] += qty
+            self._expires[cart_id] = expires_at
+        return remaining
+
+    def held(self, cart_id: str, product_id: str) -> int:
+        with self._meta:
+            return self._held.get(cart_id, {}).get(product_id, 0)
+
+    def release(self, cart_id: str, product_id: str, qty: int, expires_at: float) -> Tuple[int, int]:
+        # only what this cart still holds goes back (an expired reservation was already returned by expire());
+        # the hold is taken off under _meta first, so expire() and release() never both credit the same units
+        with self._meta:
+            held = self._held.get(cart_id)
+            released = min(qty, held.get(product_id, 0)) if held is not None else 0
+            if released:
+                held[product_id] -= released
+                if held[product_id] <= 0:
+                    del held[product_id]
+            if cart_id in self._held:
+                self._expires[cart_id] = expires_at
+        if product_id not in self.catalog:
+            return released, 0  # the product left the catalog: the hold is dropped, there is no stock to credit
+        product = self.catalog[product_id]
+        with self._lock(product_id):
+            if released:
+                product.increase_quantity(released)
+            remaining = product._quantity_available
+        return released, remaining
+
+    def adjust(self, product_id: str, delta: int) -> int:
+        # a restock (delta > 0) or cut of the free stock; never below zero, units already held stay held
+        product = self.catalog[product_id]
+        with self._lock(product_id):
+            product._quantity_available = max(product._quantity_available + delta, 0)
+            return product._quantity_available
+
+    def touch(self, cart_id: str, expires_at: float) -> None:
+        with self._meta:
+            if cart_id in self._held:
+                self._expires[cart_id] = expires_at
+
+    def commit(self, cart_id: str) -> None:
+        with self._meta:
+            self._held.pop(cart_id, None)
+            self._expires.pop(cart_id, None)
+
+    def expire(self, now: float) -> Dict[str, List[Tuple[str, int]]]:
+        with self._meta:
+            stale = [cid for cid, exp in self._expires.items() if exp <= now]
+            taken = {cid: list(self._held.pop(cid, {}).items()) for cid in stale}
+            for cid in stale:
+                del self._expires[cid]
+        for cart_id, lines in taken.items():
+            for pid, qty in lines:
+                if pid not in self.catalog:
+                    emit("reservation_orphaned", "⚠️ Expired reservation for '{product_id}' dropped, the product left the catalog.",
+                         logging.WARNING, cart_id=cart_id, product_id=pid, quantity=qty)
+                    continue
+                with self._lock(pid):
+                    self.catalog[pid].increase_quantity(qty)
+        return taken
+
+class SQLiteInventoryStore:
+    # durable stock shared by every process that opens the same file
+    def __init__(self, path: str, catalog=None):
+        self._path = path
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS stock (product_id TEXT PRIMARY KEY, available INTEGER NOT NULL CHECK (available >= 0))")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS reservations (cart_id TEXT, product_id TEXT, qty INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (cart_id, product_id))"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS reservations_expiry ON reservations (expires_at)")
+        if catalog is not None:
+            self.seed(catalog)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+        return db
+
+    def _tx(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def seed(self, catalog) -> None:
+        # first writer wins, so restarts never reset stock that other processes already reserved
+        rows = [(pid, catalog[pid]._quantity_available) for pid in catalog]
+        self._tx(lambda db: db.executemany("INSERT OR IGNORE INTO stock VALUES (?, ?)", rows))
+
+    def available(self, product_id: str) -> int:
+        row = self._db().execute("SELECT available FROM stock WHERE product_id = ?", (product_id,)).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, cart_id: str, product_id: str, qty: int, expires_at: float) -> Optional[int]:
+        def run(db):
+            cur = db.execute(
+                "UPDATE stock SET available = available - ? WHERE product_id = ? AND available >= ?",
+                (qty, product_id, qty),
+            )
+            if cur.rowcount == 0:
+                return None
+            db.execute(
+                "INSERT INTO reservations VALUES (?, ?, ?, ?) ON CONFLICT (cart_id, product_id) "
+                "DO UPDATE SET qty = qty + excluded.qty, expires_at = excluded.expires_at",
+                (cart_id, product_id, qty, expires_at),
+            )
+            db.execute("UPDATE reservations SET expires_at = ? WHERE cart_id = ?", (expires_at, cart_id))
+            return db.execute("SELECT available FROM stock WHERE product_id = ?", (product_id,)).fetchone()[0]
+        return self._tx(run)
+
+    def held(self, cart_id: str, product_id: str) -> int:
+        row = self._db().execute("SELECT qty FROM reservations WHERE cart_id = ? AND product_id = ?", (cart_id, product_id)).fetchone()
+        return row[0] if row else 0
+
+    def release(self, cart_id: str, product_id: str, qty: int, expires_at: float) -> Tuple[int, int]:
+        def run(db):
+            row = db.execute("SELECT qty FROM reservations WHERE cart_id = ? AND product_id = ?", (cart_id, product_id)).fetchone()
+            released = min(qty, row[0]) if row else 0
+            if released:
+                db.execute("UPDATE stock SET available = available + ? WHERE product_id = ?", (released, product_id))
+                db.execute("UPDATE reservations SET qty = qty - ? WHERE cart_id = ? AND product_id = ?", (released, cart_id, product_id))
+                db.execute("DELETE FROM reservations WHERE qty <= 0 AND cart_id = ?", (cart_id,))
+            db.execute("UPDATE reservations SET expires_at = ? WHERE cart_id = ?", (expires_at, cart_id))
+            row = db.execute("SELECT available FROM stock WHERE product_id = ?", (product_id,)).fetchone()
+            return released, row[0] if row else 0
+        return self._tx(run)
+
+    def adjust(self, product_id: str, delta: int) -> int:
+        def run(db):
+            db.execute("UPDATE stock SET available = MAX(available + ?, 0) WHERE product_id = ?", (delta, product_id))
+            row = db.execute("SELECT available FROM stock WHERE product_id = ?", (product_id,)).fetchone()
+            return row[0] if row else 0
+        return self._tx(run)
+
+    def touch(self, cart_id: str, expires_at: float) -> None:
+        self._tx(lambda db: db.execute("UPDATE reservations SET expires_at = ? WHERE cart_id = ?", (expires_at, cart_id)))
+
+    def commit(self, cart_id: str) -> None:
+        self._tx(lambda db: db.execute("DELETE FROM reservations WHERE cart_id = ?", (cart_id,)))
+
+    def expire(self, now: float) -> Dict[str, List[Tuple[str, int]]]:
+        def run(db):
+            rows = db.execute("SELECT cart_id, product_id, qty FROM reservations WHERE expires_at <= ?", (now,)).fetchall()
+            db.executemany("UPDATE stock SET available = available + ? WHERE product_id = ?", [(q, p) for _, p, q in rows])
+            db.execute("DELETE FROM reservations WHERE expires_at <= ?", (now,))
+            return rows
+        taken: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        for cid, pid, qty in self._tx(run):
+            taken[cid].append((pid, qty))
+        return dict(taken)
+
+class ReservationEngine:
+    def __init__(self, catalog, store=None, ttl: float = 900.0):
+        self.catalog = catalog
+        self.store = store if store is not None else MemoryInventoryStore(catalog)
+        self._mirror = not isinstance(self.store, MemoryInventoryStore)
+        self._ttl = float(ttl)
+        self._listeners: Dict[str, Callable[[List[Tuple[str, int]]], None]] = {}
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def _sync(self, product_id: str, remaining: int) -> None:
+        if self._mirror and product_id in self.catalog:
+            self.catalog[product_id]._quantity_available = remaining
+
+    def reserve(self, cart_id: str, product_id: str, qty: int) -> bool:
+        if qty <= 0:
+            return False
+        remaining = self.store.reserve(cart_id, product_id, qty, time.time() + self._ttl)
+        if remaining is None:
+            if self._mirror:
+                self._sync(product_id, self.store.available(product_id))
+            return False
+        self._sync(product_id, remaining)
+        return True
+
+    def release(self, cart_id: str, product_id: str, qty: int) -> int:
+        # the units actually returned to stock: never more than this cart holds
+        if qty <= 0:
+            return 0
+        released, remaining = self.store.release(cart_id, product_id, qty, time.time() + self._ttl)
+        self._sync(product_id, remaining)
+        return released
+
+    def held(self, cart_id: str, product_id: str) -> int:
+        return self.store.held(cart_id, product_id)
+
+    def adjust(self, product_id: str, delta: int) -> None:
+        self._sync(product_id, self.store.adjust(product_id, delta))
+
+    def touch(self, cart_id: str) -> None:
+        self.store.touch(cart_id, time.time() + self._ttl)
+
+    def commit(self, cart_id: str) -> None:
+        self.store.commit(cart_id)
+
+    def refresh(self, product_ids=None) -> None:
+        if self._mirror:
+            for pid in (product_ids if product_ids is not None else list(self.catalog)):
+                self._sync(pid, self.store.available(pid))
+
+    def subscribe(self, cart_id: str, on_expire: Callable[[List[Tuple[str, int]]], None]) -> None:
+        self._listeners[cart_id] = on_expire
+
+    def unsubscribe(self, cart_id: str) -> None:
+        self._listeners.pop(cart_id, None)
+
+    def expire(self, now: float = None) -> Dict[str, List[Tuple[str, int]]]:
+        taken = self.store.expire(time.time() if now is None else now)
+        for cart_id, lines in taken.items():
+            self.refresh([pid for pid, _ in lines])
+            listener = self._listeners.get(cart_id)
+            if listener is not None:
+                listener(lines)
+        return taken
+
+    def start_reaper(self, interval: float = 30.0) -> None:
+        if self._reaper is not None:
+            return
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.expire()
+                except Exception as e:
+                    # one bad pass must not end reaping for the life of the process
+                    emit("reservation_reap_failed", "❌ Reservation reaper failed: {error}", logging.ERROR, error=str(e))
+        self._reaper = threading.Thread(target=loop, name="ReservationEngine-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        if self._reaper is not None:
+            self._stop.set()
+            self._reaper.join()
+            self._reaper = None
+            self._stop.clear()
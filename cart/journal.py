@@ -0,0 +1,113 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Tuple
+from pathlib import Path
+from datetime import datetime
+import json
+import logging
+import os
+import struct
+from cart.binfmt import CART_MAGIC, decode_cart, encode_cart
+from metrics.metrics import METRICS, emit
+
+class CartJournal:
+    def __init__(self, snapshot_file: str, journal_file: str = None, compact_every: int = 200, fsync: bool = True, binary: bool = False):
+        self._snapshot = Path(snapshot_file)
+        self._journal = Path(journal_file) if journal_file else self._snapshot.with_name(self._snapshot.name + ".journal")
+        self._compact_every = max(1, int(compact_every))
+        self._fsync = fsync
+        self._binary = binary  # which format compact() writes; load() reads either
+        self._entries = 0
+        self._snapshot.parent.mkdir(parents=True, exist_ok=True)
+
+    def exists(self) -> bool:
+        return self._snapshot.exists()
+
+    def load(self) -> Dict[str, int]:
+        state = self._read_snapshot()
+        self._replay(state)
+        if self._journal.exists() and self._journal.stat().st_size > 0:
+            # fold the journal in even when nothing in it was readable: a torn last line left in place would have
+            # the next append written onto it, and that entry would be lost on the next load
+            self.compact(state)
+        return state
+
+    def _read_snapshot(self) -> Dict[str, int]:
+        if not self._snapshot.exists() or self._snapshot.stat().st_size == 0:
+            return {}
+        try:
+            with open(self._snapshot, "rb") as f:
+                raw = f.read()
+            if raw.startswith(CART_MAGIC):
+                return decode_cart(raw)
+            data = json.loads(raw.decode("utf-8"))
+            return {item["product_id"]: int(item["quantity"]) for item in data}
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, struct.error):
+            aside = self._snapshot.with_name(f"{self._snapshot.name}.corrupt-{datetime.now():%Y%m%d%H%M%S}")
+            self._snapshot.replace(aside)
+            emit("cart_state_corrupt", "⚠️ Cart state file is corrupt, moved aside to '{aside}'. Recovering from journal only.",
+                 logging.WARNING, aside=str(aside))
+            return {}
+
+    def _replay(self, state: Dict[str, int]) -> int:
+        if not self._journal.exists():
+            return 0
+        with open(self._journal, "r", encoding="utf-8", errors="replace") as f:  # a write torn inside a character
+            lines = f.readlines()
+        applied = 0
+        for n, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+                if entry.get("clear"):
+                    state.clear()
+                elif int(entry["quantity"]) > 0:
+                    state[entry["product_id"]] = int(entry["quantity"])
+                else:
+                    state.pop(entry["product_id"], None)
+            except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError):
+                if n != len(lines) - 1:
+                    emit("journal_entry_skipped", "⚠️ Skipping unreadable cart journal entry at line {line}.",
+                         logging.WARNING, line=n + 1)
+                continue  # a torn final line is an interrupted write
+            applied += 1
+        return applied
+
+    def _write(self, entries: Iterable[dict]) -> None:
+        payload = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        if not payload:
+            return
+        with open(self._journal, "a", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            if self._fsync:
+                os.fsync(f.fileno())
+
+    @METRICS.timed("file_write_seconds", target="cart_journal")
+    def append(self, lines: Iterable[Tuple[str, int]]) -> None:
+        entries = [{"product_id": pid, "quantity": int(qty)} for pid, qty in lines]
+        self._write(entries)
+        self._entries += len(entries)
+
+    def clear(self) -> None:
+        self._write([{"clear": True}])
+        self._entries += 1
+
+    def needs_compaction(self, pending: int = 0) -> bool:
+        return self._entries + pending >= self._compact_every
+
+    @METRICS.timed("file_write_seconds", target="cart_compact")
+    def compact(self, state: Dict[str, int]) -> None:
+        tmp = self._snapshot.with_name(self._snapshot.name + ".tmp")
+        if self._binary:
+            payload = encode_cart(state)
+        else:
+            payload = json.dumps([{"product_id": pid, "quantity": qty} for pid, qty in state.items()], indent=4, ensure_ascii=False).encode("utf-8")
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            if self._fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self._snapshot)
+        # journal entries are absolute quantities, so a crash before this truncate replays harmlessly
+        with open(self._journal, "w", encoding="utf-8"):
+            pass
+        self._entries = 0
@@ -0,0 +1,9 @@
+from __future__ import annotations
+from decimal import Decimal, ROUND_HALF_UP
+
+# carts add up prices in integer minor units (kuruş) so totals never drift; the audit rebuild uses the same rounding
+def to_minor(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value(ROUND_HALF_UP))
+
+def from_minor(amount: int) -> float:
+    return amount / 100
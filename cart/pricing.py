@@ -0,0 +1,218 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+import numpy as np
+from cart.money import to_minor, from_minor
+from cart.columnar import ColumnarCatalog, GENERIC, PHYSICAL, DIGITAL
+from cart.product import PhysicalProduct, DigitalProduct
+from cart.promotions import PromotionEngine
+
+# Prices are turned into integer kuruş once per distinct catalog price (with the same Decimal rounding as
+# CartItem), after that every cart line is int64 arithmetic: qty * unit_minor + ship_minor, summed per cart.
+
+def _kind(product) -> int:
+    if isinstance(product, PhysicalProduct):
+        return PHYSICAL
+    if isinstance(product, DigitalProduct):
+        return DIGITAL
+    return GENERIC
+
+def _minor(values: np.ndarray) -> np.ndarray:
+    # exact to_minor() on every distinct value only; catalogs repeat prices a lot
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([to_minor(float(v)) for v in unique], dtype=np.int64)[inverse.reshape(-1)]
+
+class PriceBook:
+    # one row per catalog product: raw price/shipping for snapshots, minor units for arithmetic, type flag for shipping
+    def __init__(self, catalog):
+        self.catalog = catalog
+        if isinstance(catalog, ColumnarCatalog):
+            self.ids: List[str] = list(catalog._ids)
+            self.names: List[str] = list(catalog._names)
+            self.price = np.array(catalog._price, dtype=np.float64)
+            self.shipping = np.array(catalog._shipping, dtype=np.float64)
+            self.kind = np.array(catalog._kind, dtype=np.uint8)
+            self.categories: List[Optional[str]] = list(catalog._categories)
+            self._index: Dict[str, int] = dict(catalog._index)
+            live = catalog.resident_ids()  # products handed out as objects may have been edited since loading
+        else:
+            products = [catalog[pid] for pid in catalog]
+            self.ids = [p._product_id for p in products]
+            self.names = [p._name for p in products]
+            self.price = np.array([p._price for p in products], dtype=np.float64)
+            self.shipping = np.array([p._shipping_cost for p in products], dtype=np.float64)
+            self.kind = np.array([_kind(p) for p in products], dtype=np.uint8)
+            self.categories = [p._category for p in products]
+            self._index = {pid: i for i, pid in enumerate(self.ids)}
+            live = ()
+        for pid in live:
+            self._copy(pid)
+        self._reprice()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _copy(self, pid: str) -> None:
+        p = self.catalog[pid]
+        i = self._index[pid]
+        self.names[i], self.price[i], self.shipping[i], self.kind[i] = p._name, p._price, p._shipping_cost, _kind(p)
+        self.categories[i] = p._category
+
+    def _reprice(self) -> None:
+        self.unit_minor = _minor(self.price)
+        self.ship_minor = np.where(self.kind == PHYSICAL, _minor(self.shipping), 0).astype(np.int64)
+
+    def update(self, product_ids: Iterable[str]) -> None:
+        # after catalog price changes: copy those products' current values and recompute minor units
+        for pid in product_ids:
+            if pid in self._index:
+                self._copy(pid)
+        self._reprice()
+
+    def index_of(self, product_ids: Sequence[str]) -> np.ndarray:
+        # -1 for products that are not in the catalog
+        get = self._index.get
+        return np.fromiter((get(pid, -1) for pid in product_ids), dtype=np.int64, count=len(product_ids))
+
+class CartBatch:
+    # N carts as flat arrays (CSR layout): lines of cart k are product[offsets[k]:offsets[k+1]]
+    def __init__(self, cart_ids: List[str], offsets: np.ndarray, product: np.ndarray, quantity: np.ndarray,
+                 dropped: Optional[Dict[str, List[str]]] = None):
+        self.cart_ids = cart_ids
+        self.offsets = offsets
+        self.product = product
+        self.quantity = quantity
+        self.dropped = dropped or {}
+
+    def __len__(self) -> int:
+        return len(self.cart_ids)
+
+    @classmethod
+    def from_states(cls, book: PriceBook, states: Mapping[str, Mapping[str, int]]) -> "CartBatch":
+        # states: {cart_id: {product_id: quantity}}, e.g. what a storage backend's load_cart() returns
+        cart_ids, pids, qtys, counts = [], [], [], []
+        for cart_id, lines in states.items():
+            cart_ids.append(cart_id)
+            counts.append(len(lines))
+            pids.extend(lines.keys())
+            qtys.extend(lines.values())
+        offsets = np.zeros(len(cart_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        product = book.index_of(pids)
+        quantity = np.array(qtys, dtype=np.int64)
+        dropped = {}
+        missing = np.flatnonzero((product < 0) | (quantity <= 0))
+        if missing.size:
+            # lines for unknown products are skipped, as ShoppingCart does when loading state
+            owner = np.searchsorted(offsets, missing, side="right") - 1
+            for line, k in zip(missing.tolist(), owner.tolist()):
+                dropped.setdefault(cart_ids[k], []).append(pids[line])
+            keep = np.ones(len(pids), dtype=bool)
+            keep[missing] = False
+            kept_before = np.concatenate(([0], np.cumsum(keep)))
+            offsets = kept_before[offsets]
+            product, quantity = product[keep], quantity[keep]
+        return cls(cart_ids, offsets, product, quantity, dropped)
+
+    @classmethod
+    def from_storage(cls, book: PriceBook, storage, cart_ids: Iterable[str]) -> "CartBatch":
+        return cls.from_states(book, {cid: storage.load_cart(cid) for cid in cart_ids})
+
+class Quote:
+    def __init__(self, book: PriceBook, batch: CartBatch, line_minor: np.ndarray, total_minor: np.ndarray,
+                 line_discount: Optional[np.ndarray] = None, discount_minor: Optional[np.ndarray] = None):
+        self.book = book
+        self.batch = batch
+        self.line_minor = line_minor
+        self.total_minor = total_minor
+        # only set when quoted with promotions; then snapshots carry the same discount fields as a promoted cart
+        self.line_discount = line_discount
+        self.discount_minor = discount_minor
+
+    def totals(self) -> Dict[str, float]:
+        return dict(zip(self.batch.cart_ids, (from_minor(t) for t in self.total_minor.tolist())))
+
+    def snapshot(self, k: int) -> dict:
+        # same shape and values as ShoppingCart.get_cart_snapshot() for cart k
+        book, batch = self.book, self.batch
+        lo, hi = int(batch.offsets[k]), int(batch.offsets[k + 1])
+        discounts = self.line_discount[lo:hi].tolist() if self.line_discount is not None else [0] * (hi - lo)
+        items = []
+        for i, qty, sub, off in zip(batch.product[lo:hi].tolist(), batch.quantity[lo:hi].tolist(), self.line_minor[lo:hi].tolist(), discounts):
+            row = {
+                "product_id": book.ids[i],
+                "name": book.names[i],
+                "quantity": qty,
+                "price": float(book.price[i]),
+                "shipping": from_minor(int(book.ship_minor[i])),
+                "subtotal": from_minor(sub),
+            }
+            if off:
+                row["discount"] = from_minor(off)
+            items.append(row)
+        snapshot = {"items": items, "total": from_minor(int(self.total_minor[k]))}
+        if self.discount_minor is not None:
+            snapshot["discount"] = from_minor(int(self.discount_minor[k]))
+        return snapshot
+
+    def snapshots(self) -> Dict[str, dict]:
+        return {cid: self.snapshot(k) for k, cid in enumerate(self.batch.cart_ids)}
+
+def _per_cart(batch: CartBatch, values: np.ndarray) -> np.ndarray:
+    running = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    return running[batch.offsets[1:]] - running[batch.offsets[:-1]]
+
+def _line_discounts(book: PriceBook, batch: CartBatch, promotions: PromotionEngine) -> np.ndarray:
+    # PromotionEngine.line_discount() for every line: deals are looked up once per distinct product in the batch,
+    # percent/fixed are array arithmetic, only bxgy lines fall back to a Python loop
+    used, inverse = np.unique(batch.product, return_inverse=True)
+    percent = np.zeros(len(used), dtype=np.int64)
+    fixed = np.zeros(len(used), dtype=np.int64)
+    bxgy = {}
+    for j, i in enumerate(used.tolist()):
+        percent[j], fixed[j], deals = promotions.deal_for(book.ids[i], book.categories[i])
+        if deals:
+            bxgy[j] = deals
+    inverse = inverse.reshape(-1)
+    unit = book.unit_minor[batch.product]
+    goods = batch.quantity * unit
+    best = np.maximum((goods * percent[inverse] + 5000) // 10000, np.minimum(fixed[inverse], unit) * batch.quantity)
+    if bxgy:
+        for n in np.flatnonzero(np.isin(inverse, list(bxgy))).tolist():
+            qty, u = int(batch.quantity[n]), int(unit[n])
+            for buy, get in bxgy[int(inverse[n])]:
+                best[n] = max(int(best[n]), qty // (buy + get) * get * u)
+    return np.minimum(best, goods)
+
+def _cart_discounts(promotions: PromotionEngine, goods: np.ndarray, shipping: np.ndarray) -> np.ndarray:
+    # PromotionEngine.cart_discount() for every cart: one searchsorted over the prefix-max threshold tables
+    if not promotions._mins:
+        return np.zeros(len(goods), dtype=np.int64)
+    k = np.searchsorted(np.array(promotions._mins, dtype=np.int64), goods, side="right")
+    reached = k > 0
+    at = np.maximum(k - 1, 0)
+    percent = np.array(promotions._best_percent, dtype=np.int64)[at]
+    amount = np.array(promotions._best_amount, dtype=np.int64)[at]
+    money = np.where(reached, np.minimum(np.maximum((goods * percent + 5000) // 10000, amount), goods), 0)
+    free_from = promotions._free_shipping_from
+    if free_from is None:
+        return money
+    return money + np.where(reached & (goods >= free_from), shipping, 0)
+
+def quote(book: PriceBook, batch: CartBatch, promotions: Optional[PromotionEngine] = None) -> Quote:
+    ship = book.ship_minor[batch.product]
+    line_minor = batch.quantity * book.unit_minor[batch.product] + ship
+    total = _per_cart(batch, line_minor)
+    if promotions is None:
+        return Quote(book, batch, line_minor, total)
+    # same order as ShoppingCart._net_minor(): line discounts first, thresholds measured on the goods left after them
+    line_discount = _line_discounts(book, batch, promotions)
+    shipping = _per_cart(batch, ship)
+    lines_off = _per_cart(batch, line_discount)
+    goods = total - shipping - lines_off
+    discount = lines_off + _cart_discounts(promotions, goods, shipping)
+    return Quote(book, batch, line_minor, total - discount, line_discount, discount)
+
+def price_carts(catalog, states: Mapping[str, Mapping[str, int]], book: Optional[PriceBook] = None,
+                promotions: Optional[PromotionEngine] = None) -> Dict[str, float]:
+    book = book or PriceBook(catalog)
+    return quote(book, CartBatch.from_states(book, states), promotions).totals()
@@ -4,12 +4,15 @@ import string
 import json
 
 class Product:
-    def __init__(self, product_id, name, price, quantity_available, shipping_cost=0):
+    __slots__ = ("_product_id", "_name", "_price", "_quantity_available", "_shipping_cost", "_category")
+
+    def __init__(self, product_id, name, price, quantity_available, shipping_cost=0, category=None):
         self._product_id = product_id
         self._name = name
         self._price = float(price)
         self._quantity_available = int(quantity_available)
         self._shipping_cost = float(shipping_cost)
+        self._category = category  # optional, only promotions look at it
 
     def decrease_quantity(self, amount: int) -> bool:
         if 0 < amount <= self._quantity_available:
@@ -25,17 +28,22 @@ class Product:
         return f"[{self._product_id}] {self._name} | Price: ₺{self._price} | Stock: {self._quantity_available}"
 
     def to_dict(self) -> dict:
-        return {
+        d = {
             "product_id": self._product_id,
             "name": self._name,
             "price": self._price,
             "quantity_available": self._quantity_available,
             "shipping_cost": self._shipping_cost,
         }
+        if self._category is not None:
+            d["category"] = self._category
+        return d
 
 class PhysicalProduct(Product):
-    def __init__(self, product_id, name, price, quantity_available, weight, shipping_cost=999):
-        super().__init__(product_id, name, price, quantity_available, shipping_cost)
+    __slots__ = ("_weight",)
+
+    def __init__(self, product_id, name, price, quantity_available, weight, shipping_cost=999, category=None):
+        super().__init__(product_id, name, price, quantity_available, shipping_cost, category)
         self._weight = float(weight)
 
     def display_details(self) -> str:
@@ -50,10 +58,18 @@ class PhysicalProduct(Product):
         return d
 
 class DigitalProduct(Product):
-    def __init__(self, product_id, name, price, quantity_available, download_link):
-        super().__init__(product_id, name, price, quantity_available, shipping_cost=0)
+    __slots__ = ("_download_link", "_license_key_value")
+
+    def __init__(self, product_id, name, price, quantity_available, download_link, category=None):
+        super().__init__(product_id, name, price, quantity_available, shipping_cost=0, category=category)
         self._download_link = download_link
-        self._license_key = self._generate_license_key()
+        self._license_key_value = None
+
+    @property
+    def _license_key(self) -> str:
+        if self._license_key_value is None:
+            self._license_key_value = self._generate_license_key()
+        return self._license_key_value
 
     def _generate_license_key(self) -> str:
         chars = string.ascii_uppercase + string.digits
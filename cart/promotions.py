@@ -0,0 +1,135 @@
+from __future__ import annotations
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+from cart.money import to_minor
+from cart.product import Product
+
+PROMOTION_TYPES = ("percent", "fixed", "bxgy", "threshold")
+
+# Rules, e.g. in jsons/promotions.json:
+#   {"id": "TECH10", "type": "percent", "percent": 10, "products": ["P001", "P002"]}   line: % off
+#   {"id": "KB50", "type": "fixed", "amount": 50, "category": "keyboards"}             line: amount off every unit
+#   {"id": "3FOR2", "type": "bxgy", "buy": 2, "get": 1, "category": ["e-books"]}       line: of every buy+get units, get are free
+#   {"id": "BIG5", "type": "threshold", "min_total": 5000, "percent": 5}               cart: once the goods reach min_total
+#   {"id": "SHIP", "type": "threshold", "min_total": 1000, "free_shipping": true}
+# A line rule without "products"/"category" covers every product. A line gets the best of its rules (no stacking);
+# the cart gets its best money-off threshold plus free shipping when a reached threshold grants it.
+
+# compiled deal for one product / category: (percent in basis points, fixed kuruş off per unit, ((buy, get), ...))
+_NO_DEAL = (0, 0, ())
+
+def _merge(a: tuple, b: tuple) -> tuple:
+    return max(a[0], b[0]), max(a[1], b[1]), tuple(dict.fromkeys(a[2] + b[2]))
+
+def _targets(rule: dict, key: str) -> List[str]:
+    value = rule.get(key) or []
+    return [value] if isinstance(value, str) else list(value)
+
+class PromotionEngine:
+    # rules are compiled once into dict lookups (product id, category) and prefix-max threshold arrays,
+    # so a cart line costs a few dict gets and the cart-level rules one bisect, however many rules are active
+    def __init__(self, rules: Iterable[dict] = ()):
+        self.rules: List[dict] = []
+        self._by_product: Dict[str, tuple] = {}
+        self._by_category: Dict[str, tuple] = {}
+        self._everything = _NO_DEAL
+        self._mins: List[int] = []
+        self._best_percent: List[int] = []
+        self._best_amount: List[int] = []
+        self._free_shipping_from: Optional[int] = None
+        self.version = 0  # bumped by every compile(); carts re-discount their lines when it moves
+        self.compile(rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def compile(self, rules: Iterable[dict]) -> None:
+        by_product, by_category, everything = {}, {}, _NO_DEAL
+        thresholds: List[Tuple[int, int, int]] = []
+        free_from = None
+        compiled = []
+        for rule in rules:
+            rid = rule.get("id", "?")
+            kind = rule.get("type")
+            if kind not in PROMOTION_TYPES:
+                raise ValueError(f"Promotion {rid!r}: unknown type {kind!r} (use one of {PROMOTION_TYPES})")
+            if not rule.get("active", True):
+                continue
+            compiled.append(rule)
+            if kind == "threshold":
+                min_minor = to_minor(rule.get("min_total", 0))
+                percent = int(round(float(rule.get("percent", 0)) * 100))
+                amount = to_minor(rule.get("amount", 0))
+                if not 0 <= percent <= 10000 or amount < 0:
+                    raise ValueError(f"Promotion {rid!r}: percent must be 0-100 and amount >= 0")
+                thresholds.append((min_minor, percent, amount))
+                if rule.get("free_shipping"):
+                    free_from = min_minor if free_from is None else min(free_from, min_minor)
+                continue
+            if kind == "percent":
+                percent = int(round(float(rule["percent"]) * 100))
+                if not 0 < percent <= 10000:
+                    raise ValueError(f"Promotion {rid!r}: percent must be in (0, 100]")
+                deal = (percent, 0, ())
+            elif kind == "fixed":
+                amount = to_minor(rule["amount"])
+                if amount <= 0:
+                    raise ValueError(f"Promotion {rid!r}: amount must be positive")
+                deal = (0, amount, ())
+            else:
+                buy, get = int(rule["buy"]), int(rule["get"])
+                if buy < 1 or get < 1:
+                    raise ValueError(f"Promotion {rid!r}: buy and get must be at least 1")
+                deal = (0, 0, ((buy, get),))
+            products, categories = _targets(rule, "products"), _targets(rule, "category")
+            if not products and not categories:
+                everything = _merge(everything, deal)
+            for pid in products:
+                by_product[pid] = _merge(by_product.get(pid, _NO_DEAL), deal)
+            for category in categories:
+                by_category[category] = _merge(by_category.get(category, _NO_DEAL), deal)
+        thresholds.sort()
+        best_percent, best_amount = [], []
+        for _, percent, amount in thresholds:
+            best_percent.append(max(percent, best_percent[-1] if best_percent else 0))
+            best_amount.append(max(amount, best_amount[-1] if best_amount else 0))
+        # swap everything in at once; a cart reading mid-compile sees either the old or the new tables
+        self.rules = compiled
+        self._by_product, self._by_category, self._everything = by_product, by_category, everything
+        self._mins, self._best_percent, self._best_amount = [t[0] for t in thresholds], best_percent, best_amount
+        self._free_shipping_from = free_from
+        self.version += 1
+
+    def deal(self, product: Product) -> tuple:
+        return self.deal_for(product._product_id, product._category)
+
+    def deal_for(self, product_id: str, category: Optional[str]) -> tuple:
+        deal = self._by_product.get(product_id, _NO_DEAL)
+        if category is not None:
+            deal = _merge(deal, self._by_category.get(category, _NO_DEAL))
+        return _merge(deal, self._everything) if self._everything is not _NO_DEAL else deal
+
+    def line_discount(self, product: Product, quantity: int, unit_minor: int) -> int:
+        # kuruş off one cart line (shipping is never discounted here, see cart_discount)
+        percent, fixed, bxgy = self.deal(product)
+        goods = quantity * unit_minor
+        best = (goods * percent + 5000) // 10000 if percent else 0
+        if fixed:
+            best = max(best, min(fixed, unit_minor) * quantity)
+        for buy, get in bxgy:
+            best = max(best, quantity // (buy + get) * get * unit_minor)
+        return min(best, goods)
+
+    def cart_discount(self, goods_minor: int, shipping_minor: int) -> int:
+        # goods_minor: the cart's goods after line discounts, which is what thresholds are measured against
+        k = bisect_right(self._mins, goods_minor)
+        if k == 0:
+            return 0
+        money = max((goods_minor * self._best_percent[k - 1] + 5000) // 10000, self._best_amount[k - 1])
+        shipping = shipping_minor if self._free_shipping_from is not None and goods_minor >= self._free_shipping_from else 0
+        return min(money, goods_minor) + shipping
+
+def load_promotions(path: str) -> PromotionEngine:
+    with open(path, "r", encoding="utf-8") as f:
+        return PromotionEngine(json.load(f))
@@ -0,0 +1,171 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+import re
+from cart.product import Product, PhysicalProduct, DigitalProduct
+from cart.columnar import GENERIC, PHYSICAL, DIGITAL
+
+_TOKEN = re.compile(r"\w+")
+PRODUCT_TYPES = ("physical", "digital", "generic")
+_KIND_NAMES = {PHYSICAL: "physical", DIGITAL: "digital", GENERIC: "generic"}
+
+def product_type(product: Product) -> str:
+    if isinstance(product, DigitalProduct):
+        return "digital"
+    if isinstance(product, PhysicalProduct):
+        return "physical"
+    return "generic"
+
+def _rows(catalog):
+    # ColumnarCatalog hands out its columns, so indexing a large catalog does not build a Product per row
+    rows = getattr(catalog, "rows", None)
+    if rows is not None:
+        for pid, name, price, stock, kind in rows():
+            yield pid, name, price, stock, _KIND_NAMES[kind]
+        return
+    for pid in catalog:
+        p = catalog[pid]
+        yield pid, p._name, p._price, p._quantity_available, product_type(p)
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(_TOKEN.findall(text.lower())))
+
+class CatalogIndex:
+    # sorted (token, pid) and (price, pid) lists answer prefix and range queries with bisect;
+    # the smallest candidate range drives the scan and the other filters are O(1) checks per hit
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._tokens_of: Dict[str, Tuple[str, ...]] = {}
+        self._price_of: Dict[str, float] = {}
+        self._types: Dict[str, Set[str]] = {t: set() for t in PRODUCT_TYPES}
+        self._in_stock: Set[str] = set()
+        token_rows, price_rows = [], []
+        for pid, name, price, stock, ptype in _rows(catalog):
+            tokens = tokenize(f"{name} {pid}")
+            self._tokens_of[pid] = tokens
+            token_rows.extend((t, pid) for t in tokens)
+            self._price_of[pid] = price
+            price_rows.append((price, pid))
+            self._types[ptype].add(pid)
+            if stock > 0:
+                self._in_stock.add(pid)
+        token_rows.sort()
+        price_rows.sort()
+        self._token_keys: List[str] = [t for t, _ in token_rows]
+        self._token_pids: List[str] = [pid for _, pid in token_rows]
+        self._price_keys: List[float] = [price for price, _ in price_rows]
+        self._price_pids: List[str] = [pid for _, pid in price_rows]
+
+    def __len__(self) -> int:
+        return len(self._price_of)
+
+    #--------------------------- INCREMENTAL UPDATES ---------------------------#
+    def _drop(self, keys: list, pids: list, key, pid: str) -> None:
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i] == key:
+            if pids[i] == pid:
+                del keys[i], pids[i]
+                return
+            i += 1
+
+    def _put(self, keys: list, pids: list, key, pid: str) -> None:
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        pids.insert(i, pid)
+
+    def update_stock(self, pid: str) -> None:
+        if pid not in self._price_of:
+            return
+        if self.catalog[pid]._quantity_available > 0:
+            self._in_stock.add(pid)
+        else:
+            self._in_stock.discard(pid)
+
+    def update(self, pid: str) -> None:
+        if pid not in self.catalog:
+            self.remove(pid)
+            return
+        if pid not in self._price_of:
+            self.add(pid)
+            return
+        p = self.catalog[pid]
+        if p._price != self._price_of[pid]:
+            self._drop(self._price_keys, self._price_pids, self._price_of[pid], pid)
+            self._put(self._price_keys, self._price_pids, p._price, pid)
+            self._price_of[pid] = p._price
+        tokens = tokenize(f"{p._name} {pid}")
+        if tokens != self._tokens_of[pid]:
+            for t in self._tokens_of[pid]:
+                self._drop(self._token_keys, self._token_pids, t, pid)
+            for t in tokens:
+                self._put(self._token_keys, self._token_pids, t, pid)
+            self._tokens_of[pid] = tokens
+        for members in self._types.values():
+            members.discard(pid)
+        self._types[product_type(p)].add(pid)
+        self.update_stock(pid)
+
+    def add(self, pid: str) -> None:
+        p = self.catalog[pid]
+        self._tokens_of[pid] = tokenize(f"{p._name} {pid}")
+        for t in self._tokens_of[pid]:
+            self._put(self._token_keys, self._token_pids, t, pid)
+        self._price_of[pid] = p._price
+        self._put(self._price_keys, self._price_pids, p._price, pid)
+        self._types[product_type(p)].add(pid)
+        self.update_stock(pid)
+
+    def remove(self, pid: str) -> None:
+        if pid not in self._price_of:
+            return
+        for t in self._tokens_of.pop(pid):
+            self._drop(self._token_keys, self._token_pids, t, pid)
+        self._drop(self._price_keys, self._price_pids, self._price_of.pop(pid), pid)
+        for members in self._types.values():
+            members.discard(pid)
+        self._in_stock.discard(pid)
+
+    #--------------------------- QUERIES ---------------------------#
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self._token_keys, prefix), bisect_left(self._token_keys, prefix + "\U0010ffff")
+
+    def search(self, text: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
+               ptype: Optional[str] = None, in_stock: Optional[bool] = None, limit: Optional[int] = 50) -> List[str]:
+        if ptype is not None and ptype not in self._types:
+            raise ValueError(f"Unknown product type: {ptype!r} (use one of {PRODUCT_TYPES})")
+        words = tokenize(text) if text else ()
+        drivers = []
+        for w in words:
+            lo, hi = self._prefix_range(w)
+            drivers.append((hi - lo, lambda lo=lo, hi=hi: (self._token_pids[i] for i in range(lo, hi))))
+        if min_price is not None or max_price is not None:
+            lo = 0 if min_price is None else bisect_left(self._price_keys, min_price)
+            hi = len(self._price_keys) if max_price is None else bisect_right(self._price_keys, max_price)
+            drivers.append((max(hi - lo, 0), lambda lo=lo, hi=hi: (self._price_pids[i] for i in range(lo, hi))))
+        if ptype is not None:
+            drivers.append((len(self._types[ptype]), lambda: self._types[ptype]))
+        if in_stock:
+            drivers.append((len(self._in_stock), lambda: self._in_stock))
+        if not drivers:
+            drivers.append((len(self._price_pids), lambda: self._price_pids))
+        _, source = min(drivers, key=lambda d: d[0])
+
+        out, seen = [], set()
+        for pid in source():
+            if pid in seen:
+                continue
+            seen.add(pid)
+            tokens = self._tokens_of[pid]
+            if words and not all(any(t.startswith(w) for t in tokens) for w in words):
+                continue
+            price = self._price_of[pid]
+            if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                continue
+            if ptype is not None and pid not in self._types[ptype]:
+                continue
+            if in_stock is not None and (pid in self._in_stock) != in_stock:
+                continue
+            out.append(pid)
+            if limit is not None and len(out) >= limit:
+                break
+        return out
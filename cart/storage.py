@@ -0,0 +1,244 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+import json
+import os
+import tempfile
+import threading
+from cart.binfmt import CATALOG_MAGIC, sniff, write_catalog
+from cart.journal import CartJournal
+from metrics.metrics import METRICS
+
+STORAGE_BACKENDS = ("json", "binary", "sqlite", "memory")
+
+# every backend stores absolute quantities: write_lines([(pid, qty)]) upserts, qty <= 0 deletes the line.
+# stock rows are optional overrides of the catalog file's quantity_available.
+
+class JSONStorage:
+    # the original layout: one <cart_id>.json snapshot plus its append-only journal per cart; stock stays in the catalog file.
+    # binary=True writes the snapshots in the cart/binfmt.py format (same file names, either format is read back)
+    def __init__(self, directory: str = "jsons", catalog_file: Optional[str] = None, compact_every: int = 200, fsync: bool = True,
+                 binary: bool = False):
+        self._directory = Path(directory)
+        self._catalog_file = catalog_file
+        self._compact_every = compact_every
+        self._fsync = fsync
+        self._binary = binary
+        self._paths: Dict[str, str] = {}
+        self._carts: Dict[str, Tuple[CartJournal, Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    def bind(self, cart_id: str, cart_file: str) -> None:
+        # pins a cart to an explicit file instead of <directory>/<cart_id>.json
+        self._paths[cart_id] = cart_file
+
+    def _cart(self, cart_id: str) -> Tuple[CartJournal, Dict[str, int]]:
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is None:
+                path = self._paths.get(cart_id) or str(self._directory / f"{cart_id}.json")
+                entry = self._carts[cart_id] = (CartJournal(path, compact_every=self._compact_every, fsync=self._fsync, binary=self._binary), {})
+            return entry
+
+    def load_cart(self, cart_id: str) -> Dict[str, int]:
+        journal, state = self._cart(cart_id)
+        state.clear()
+        state.update(journal.load())
+        if not journal.exists():
+            journal.compact(state)
+        return dict(state)
+
+    def write_lines(self, cart_id: str, lines: Iterable[Tuple[str, int]]) -> None:
+        journal, state = self._cart(cart_id)
+        lines = list(lines)
+        for pid, qty in lines:
+            if qty > 0:
+                state[pid] = int(qty)
+            else:
+                state.pop(pid, None)
+        if journal.needs_compaction(len(lines)):
+            journal.compact(state)
+        else:
+            journal.append(lines)
+
+    def save_cart(self, cart_id: str, state: Dict[str, int]) -> None:
+        journal, mirror = self._cart(cart_id)
+        mirror.clear()
+        mirror.update(state)
+        journal.compact(mirror)
+
+    def clear_cart(self, cart_id: str) -> None:
+        journal, state = self._cart(cart_id)
+        state.clear()
+        journal.clear()
+
+    def load_stock(self) -> Dict[str, int]:
+        return {}
+
+    def write_stock(self, lines: Iterable[Tuple[str, int]]) -> None:
+        pass  # stock is only written back by save_catalog, as before
+
+    def save_catalog(self, catalog) -> None:
+        if self._catalog_file is None:
+            return
+        if sniff(self._catalog_file) == CATALOG_MAGIC:
+            write_catalog(catalog, self._catalog_file, self._fsync)  # keep the format the catalog was loaded from
+            return
+        # a lazy catalog reads its products from this very file while we iterate it: write a sibling and swap it in
+        target = Path(self._catalog_file)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f"{target.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump([p.to_dict() for p in catalog.values()], f, indent=4, ensure_ascii=False)
+                f.flush()
+                if self._fsync:
+                    os.fsync(f.fileno())
+            if target.exists():
+                os.chmod(tmp, target.stat().st_mode & 0o777)  # mkstemp creates 0600
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def close(self) -> None:
+        pass
+
+class SQLiteStorage:
+    # one database file for any number of carts; a quantity change is a single-row upsert
+    def __init__(self, path: str = "jsons/tungshoop.db"):
+        self._path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS cart_lines (cart_id TEXT NOT NULL, product_id TEXT NOT NULL, "
+            "quantity INTEGER NOT NULL CHECK (quantity > 0), PRIMARY KEY (cart_id, product_id)) WITHOUT ROWID"
+        )
+        # same shape as SQLiteInventoryStore's stock table, so both may share one file
+        db.execute("CREATE TABLE IF NOT EXISTS stock (product_id TEXT PRIMARY KEY, available INTEGER NOT NULL CHECK (available >= 0))")
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            import sqlite3
+            db = self._local.db = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: durable across app crashes, one fsync per checkpoint
+        return db
+
+    def _tx(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def load_cart(self, cart_id: str) -> Dict[str, int]:
+        rows = self._db().execute("SELECT product_id, quantity FROM cart_lines WHERE cart_id = ?", (cart_id,))
+        return dict(rows.fetchall())
+
+    @METRICS.timed("file_write_seconds", target="sqlite_cart")
+    def write_lines(self, cart_id: str, lines: Iterable[Tuple[str, int]]) -> None:
+        upserts, deletes = [], []
+        for pid, qty in lines:
+            if qty > 0:
+                upserts.append((cart_id, pid, int(qty)))
+            else:
+                deletes.append((cart_id, pid))
+        def run(db):
+            if upserts:
+                db.executemany(
+                    "INSERT INTO cart_lines VALUES (?, ?, ?) ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = excluded.quantity",
+                    upserts,
+                )
+            if deletes:
+                db.executemany("DELETE FROM cart_lines WHERE cart_id = ? AND product_id = ?", deletes)
+        self._tx(run)
+
+    def save_cart(self, cart_id: str, state: Dict[str, int]) -> None:
+        rows = [(cart_id, pid, int(qty)) for pid, qty in state.items() if qty > 0]
+        def run(db):
+            db.execute("DELETE FROM cart_lines WHERE cart_id = ?", (cart_id,))
+            db.executemany("INSERT INTO cart_lines VALUES (?, ?, ?)", rows)
+        self._tx(run)
+
+    def clear_cart(self, cart_id: str) -> None:
+        self._tx(lambda db: db.execute("DELETE FROM cart_lines WHERE cart_id = ?", (cart_id,)))
+
+    def load_stock(self) -> Dict[str, int]:
+        return dict(self._db().execute("SELECT product_id, available FROM stock").fetchall())
+
+    @METRICS.timed("file_write_seconds", target="sqlite_stock")
+    def write_stock(self, lines: Iterable[Tuple[str, int]]) -> None:
+        rows = [(pid, max(int(qty), 0)) for pid, qty in lines]
+        self._tx(lambda db: db.executemany(
+            "INSERT INTO stock VALUES (?, ?) ON CONFLICT (product_id) DO UPDATE SET available = excluded.available", rows,
+        ))
+
+    def save_catalog(self, catalog) -> None:
+        self.write_stock((pid, catalog[pid]._quantity_available) for pid in catalog)
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+class MemoryStorage:
+    # nothing touches disk; for tests, benchmarks and throwaway sessions
+    def __init__(self):
+        self._carts: Dict[str, Dict[str, int]] = {}
+        self._stock: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def load_cart(self, cart_id: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._carts.get(cart_id, {}))
+
+    def write_lines(self, cart_id: str, lines: Iterable[Tuple[str, int]]) -> None:
+        with self._lock:
+            state = self._carts.setdefault(cart_id, {})
+            for pid, qty in lines:
+                if qty > 0:
+                    state[pid] = int(qty)
+                else:
+                    state.pop(pid, None)
+
+    def save_cart(self, cart_id: str, state: Dict[str, int]) -> None:
+        with self._lock:
+            self._carts[cart_id] = {pid: int(qty) for pid, qty in state.items() if qty > 0}
+
+    def clear_cart(self, cart_id: str) -> None:
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def load_stock(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stock)
+
+    def write_stock(self, lines: Iterable[Tuple[str, int]]) -> None:
+        with self._lock:
+            self._stock.update((pid, int(qty)) for pid, qty in lines)
+
+    def save_catalog(self, catalog) -> None:
+        self.write_stock((pid, catalog[pid]._quantity_available) for pid in catalog)
+
+    def close(self) -> None:
+        pass
+
+def open_storage(backend: str = "json", path: Optional[str] = None, catalog_file: Optional[str] = None):
+    # path: the directory for "json"/"binary", the database file for "sqlite", ignored for "memory"
+    if backend in ("json", "binary"):
+        return JSONStorage(path or "jsons", catalog_file=catalog_file, binary=backend == "binary")
+    if backend == "sqlite":
+        return SQLiteStorage(path or "jsons/tungshoop.db")
+    if backend == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend!r} (use one of {STORAGE_BACKENDS})")
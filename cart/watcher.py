@@ -0,0 +1,225 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import re
+import threading
+import time
+from cart.binfmt import CATALOG_MAGIC, iter_catalog_rows, sniff
+from cart.catalog import product_from_dict
+from metrics.metrics import METRICS, emit
+
+# json.dump(indent=N) writes every record as "<indent>{ ... }" joined by "},<newline><indent>{"; splitting on that
+# separator is a C-speed pass, and a record whose text is the same as last time is never parsed again.
+# Any other layout (or a split that does not parse) falls back to one json.load of the whole file.
+_HEAD = re.compile(r"\s*\[[ \t]*(\r?\n)([ \t]*)\{")
+_KEEP = ("_product_id", "_quantity_available", "_license_key_value")  # identity, live stock, issued license
+
+def _fields(cls) -> List[str]:
+    return [slot for klass in cls.__mro__ for slot in getattr(klass, "__slots__", ()) if slot not in _KEEP]
+
+def split_records(text: str) -> Optional[List[str]]:
+    # the text between each top-level record's braces, or None when the file is not in the pretty-printed layout
+    m = _HEAD.match(text)
+    if m is None:
+        return None
+    body = text[m.end():].rstrip()
+    if not body.endswith("]"):
+        return None
+    body = body[:-1].rstrip()
+    if not body.endswith("}"):
+        return None
+    return body[:-1].split("}," + m.group(1) + m.group(2) + "{")
+
+def _canonical(text: str) -> List[str]:
+    return [json.dumps(record, sort_keys=True)[1:-1] for record in json.loads(text)]
+
+# catalogs other than a plain dict (LazyCatalog, ColumnarCatalog) say which products are in memory
+def _resident(catalog, pid: str):
+    resident = getattr(catalog, "resident", None)
+    return resident(pid) if resident is not None else catalog.get(pid)
+
+def _store(catalog, product) -> None:
+    store = getattr(catalog, "store", None)
+    if store is not None:
+        store(product)
+    else:
+        catalog[product._product_id] = product
+
+def _install(catalog, product) -> None:
+    install = getattr(catalog, "install", None)
+    if install is not None:
+        install(product)
+    else:
+        catalog[product._product_id] = product
+
+def _discard(catalog, pid: str) -> None:
+    discard = getattr(catalog, "discard", None)
+    if discard is not None:
+        discard(pid)
+    else:
+        catalog.pop(pid, None)
+
+class CatalogWatcher:
+    # polls the catalog file's (mtime_ns, size); on a change only the records whose text changed are parsed, the live
+    # Product objects are updated in place and every subscriber gets the (changed, removed) product ids.
+    # Stock moves through inventory (a ReservationEngine, under its per-product lock) when carts reserve through one,
+    # otherwise under stock_lock: the lock the carts hold while they take stock (the CLI cart's own lock)
+    def __init__(self, catalog_file: str, catalog, reload_stock: bool = True, inventory=None, stock_lock=None):
+        self._path = Path(catalog_file)
+        self.catalog = catalog
+        self._reload_stock = reload_stock
+        self._inventory = inventory
+        self._stock_lock = stock_lock if stock_lock is not None else threading.Lock()
+        self._listeners: Dict[str, Callable[[Set[str], Set[str]], None]] = {}
+        self._lock = threading.Lock()
+        self._blocks: Dict[str, str] = {}  # a record's text -> product id
+        self._file_stock: Dict[str, int] = {}  # quantity_available as last read from the file
+        self._signature = self._failed = None
+        self._poller = None
+        self._stop = threading.Event()
+        with self._lock:
+            self._reload(apply=False)
+
+    def subscribe(self, key: str, on_change: Callable[[Set[str], Set[str]], None]) -> None:
+        self._listeners[key] = on_change
+
+    def unsubscribe(self, key: str) -> None:
+        self._listeners.pop(key, None)
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _reload(self, apply: bool = True) -> Tuple[Set[str], Set[str]]:
+        signature = self._stat()
+        if signature is None:
+            return set(), set()
+        if sniff(str(self._path)) == CATALOG_MAGIC:
+            blocks, fresh = self._diff([json.dumps(row, sort_keys=True)[1:-1] for row in iter_catalog_rows(str(self._path))])
+        else:
+            with open(self._path, "r", encoding="utf-8") as f:
+                text = f.read()
+            split = split_records(text)
+            try:
+                blocks, fresh = self._diff(split if split is not None else _canonical(text))
+            except ValueError:
+                if split is None:
+                    raise
+                blocks, fresh = self._diff(_canonical(text))
+        removed = set(self._blocks.values()) - set(blocks.values())
+        if apply:
+            rebuild = getattr(self.catalog, "rebuild_index", None)
+            if rebuild is not None:
+                rebuild()  # LazyCatalog: record offsets moved; BinaryCatalog: map the new file
+            for record in fresh:
+                self._apply(record)
+            for pid in removed:
+                _discard(self.catalog, pid)
+        else:
+            for record in fresh:
+                self._file_stock[record["product_id"]] = int(record["quantity_available"])
+        for pid in removed:
+            self._file_stock.pop(pid, None)
+        self._blocks = blocks
+        self._signature = signature
+        return {record["product_id"] for record in fresh}, removed
+
+    def _diff(self, texts: List[str]) -> Tuple[Dict[str, str], List[dict]]:
+        # keyed by the text itself: exact (no hash collisions) and about as cheap, the str hash is computed once
+        blocks, fresh = {}, []
+        for text in texts:
+            pid = self._blocks.get(text)
+            if pid is None:
+                record = json.loads("{" + text + "}")
+                pid = record["product_id"]
+                fresh.append(record)
+            blocks[text] = pid
+        return blocks, fresh
+
+    def _apply(self, record: dict) -> None:
+        fresh = product_from_dict(record)
+        pid = fresh._product_id
+        file_qty = fresh._quantity_available
+        old_file_qty = self._file_stock.get(pid)
+        self._file_stock[pid] = file_qty
+        current = _resident(self.catalog, pid)
+        if current is None:
+            _store(self.catalog, fresh)  # nobody holds it yet: the file's values simply become the catalog's
+            return
+        delta = 0
+        if self._reload_stock:
+            qty = current._quantity_available
+            if old_file_qty is None:
+                delta = file_qty - qty
+            elif file_qty != qty:
+                # a restock (or cut) in the file is applied as a delta, so units carts already took stay taken;
+                # file == memory is our own save_catalog() coming back
+                delta = file_qty - old_file_qty
+        if type(current) is type(fresh):
+            for field in _fields(type(fresh)):
+                setattr(current, field, getattr(fresh, field))
+        else:
+            with self._stock_lock:
+                fresh._quantity_available = current._quantity_available
+                _install(self.catalog, fresh)  # the type changed: a new object, carts rebind to it
+        if delta:
+            self._adjust_stock(pid, delta)
+
+    def _adjust_stock(self, pid: str, delta: int) -> None:
+        # read-modify-write under the same lock reserve/release use, so no unit a cart takes meanwhile is lost
+        if self._inventory is not None:
+            self._inventory.adjust(pid, delta)
+            return
+        with self._stock_lock:
+            product = self.catalog[pid]
+            product._quantity_available = max(product._quantity_available + delta, 0)
+
+    def poll(self) -> Optional[Tuple[Set[str], Set[str]]]:
+        # returns (changed, removed) product ids when the file changed, None otherwise; cheap enough to call often
+        signature = self._stat()
+        if signature is None or signature == self._signature or signature == self._failed:
+            return None
+        start = time.perf_counter()
+        with self._lock:
+            try:
+                changed, removed = self._reload()
+            except (ValueError, KeyError, TypeError) as e:
+                # most likely caught mid-write; the next change of the file is tried again
+                self._failed = signature
+                emit("catalog_reload_failed", "⚠️ Catalog file changed but could not be read ({error}), keeping the current catalog.",
+                     logging.WARNING, path=str(self._path), error=str(e))
+                return None
+        METRICS.observe("catalog_reload_seconds", time.perf_counter() - start)
+        if not changed and not removed:
+            return None
+        METRICS.inc("catalog_reloads_total")
+        emit("catalog_reloaded", "🔄 Catalog reloaded: {changed} product(s) changed, {removed} removed.",
+             path=str(self._path), changed=len(changed), removed=len(removed))
+        for listener in list(self._listeners.values()):
+            listener(changed, removed)
+        return changed, removed
+
+    def start(self, interval: float = 0.5) -> None:
+        if self._poller is not None:
+            return
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    emit("catalog_reload_failed", "⚠️ Catalog reload failed: {error}", logging.ERROR, path=str(self._path), error=str(e))
+        self._poller = threading.Thread(target=loop, name="CatalogWatcher-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self) -> None:
+        if self._poller is not None:
+            self._stop.set()
+            self._poller.join()
+            self._poller = None
+            self._stop.clear()
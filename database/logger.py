@@ -1,48 +1,508 @@
 import socket
 import json
-from datetime import datetime
+import logging
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+from cart.audit import rebuild_state
+from database.spill import SpillFile
+from metrics.metrics import METRICS, emit
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "spill")
+TIME_BUCKETS = ("minute", "hour", "day", "week", "month")
+LEGACY_TIMESTAMP = "%d/%m/%Y | %H:%M:%S"
+
+# logged_at (timestamptz) is what every query filters on; the TEXT timestamp column is still written for older readers
+_COLUMNS = "computer_name TEXT, timestamp TEXT, logged_at timestamptz NOT NULL DEFAULT now(), action TEXT, status TEXT, cart_state JSONB"
+_INDEXES = {
+    "logs_logged_at_brin": "ON logs USING brin (logged_at)",  # tiny, and rows arrive in time order
+    "logs_action_logged_at": "ON logs (action, logged_at)",
+    "logs_failures": "ON logs (logged_at) WHERE status <> 'success'",
+    "logs_cart_logged_at": "ON logs (computer_name, (cart_state->>'cart_id'), logged_at)",  # rebuild_cart_state
+}
 
 class DBLogger:
-    def __init__(self, db_config: dict):
-        self.db_config = db_config
+    def __init__(self, db_config: dict, async_mode: bool = False, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_queue: int = 10000, backpressure: str = "spill", spill_file: str = "logs/spill.ndjson",
+                 pool_size: int = 0, retries: int = 3, retry_backoff: float = 0.2, lazy_connect: bool = False,
+                 partition_logs: bool = False, partitions_ahead: int = 2, spill_replay_interval: float = 30.0):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure!r} (use one of {BACKPRESSURE_POLICIES})")
+        self.db_config = {"connect_timeout": 5, **db_config}
         self.conn = None
-        self._connect()
-        print("Database Logger initialized!!!")
-        self._create_table()
+        self._hostname = socket.gethostname()
+        self._retries = max(0, int(retries))
+        self._retry_backoff = float(retry_backoff)
+        self._conn_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "reconnects": 0, "total_latency": 0.0, "max_latency": 0.0}
+        self._pool = None
+        self._pool_slots = None
+        self._pool_size = max(0, int(pool_size))
+        self._partition_logs = partition_logs
+        self._partitions_ahead = max(0, int(partitions_ahead))
+        self._prepared = False
+        self._prepare_lock = threading.Lock()
+        if not lazy_connect:
+            self._prepare()
+        emit("db_ready", "Database Logger initialized!!!", pooled=self._pool_size > 0, lazy=lazy_connect)
+
+        self.async_mode = async_mode
+        self._batch_size = max(1, int(batch_size))
+        self._flush_interval = float(flush_interval)
+        self._max_queue = max(1, int(max_queue))
+        self._backpressure = backpressure
+        # cart operations never wait on the database: a full queue spills to disk by default ("block" is opt-in)
+        self._spill_file = SpillFile(spill_file) if spill_file else None
+        self._spill_lock = threading.Lock()  # dropped/spilled counters; _spill runs with and without _cond held
+        self._spill_replay_interval = float(spill_replay_interval)
+        self._next_replay = 0.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closing = False
+        self._flush_requested = False
+        self.dropped = 0
+        self.spilled = 0
+        self._writer = None
+        if self.async_mode:
+            self._writer = threading.Thread(target=self._run_writer, name="DBLogger-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _prepare(self) -> None:
+        # opens the pool/connection and creates the table; with lazy_connect this runs on the first write
+        # (the writer thread in async mode), so a slow or missing database never blocks startup
+        with self._prepare_lock:
+            if self._prepared:
+                return
+            if self._pool_size > 0:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(1, self._pool_size, **self.db_config)
+                    self._pool_slots = threading.BoundedSemaphore(self._pool_size)
+            else:
+                with self._conn_lock:
+                    self._connect()
+            self._create_table()
+            self._prepared = True
 
     def _connect(self):
         if self.conn is None or self.conn.closed:
+            if self.conn is not None:
+                self._count("reconnects")
             self.conn = psycopg2.connect(**self.db_config)
 
+    @contextmanager
+    def _checkout(self):
+        if self._pool is None:
+            with self._conn_lock:
+                self._connect()
+                try:
+                    yield self.conn
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    if not self.conn.closed:
+                        self.conn.close()
+                    raise
+            return
+        with self._pool_slots:
+            conn = self._pool.getconn()
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                broken = broken or bool(conn.closed)
+                if broken:
+                    self._count("reconnects")
+                self._pool.putconn(conn, close=broken)
+
+    def _run(self, fn):
+        if not self._prepared:
+            self._prepare()
+        return self._attempt(fn)
+
+    def _attempt(self, fn):
+        delay = self._retry_backoff
+        for attempt in range(self._retries + 1):
+            start = time.perf_counter()
+            try:
+                with self._checkout() as conn:
+                    with conn, conn.cursor() as cur:
+                        result = fn(cur)
+                self._record(time.perf_counter() - start)
+                return result
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._count("failures")
+                if attempt == self._retries:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+        METRICS.inc(f"db_{key}_total")
+
+    def _record(self, latency: float) -> None:
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["total_latency"] += latency
+            self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+        METRICS.observe("db_roundtrip_seconds", latency)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["avg_latency"] = s["total_latency"] / s["calls"] if s["calls"] else 0.0
+        s["pooled"] = self._pool_size > 0
+        s["queued"] = len(self._queue) if hasattr(self, "_queue") else 0
+        return s
+
+    def healthy(self) -> bool:
+        try:
+            self._run(lambda cur: cur.execute("SELECT 1"))
+            return True
+        except psycopg2.Error:
+            return False
+
     def _create_table(self):
-        query = """
-        CREATE TABLE IF NOT EXISTS logs (
-            id SERIAL PRIMARY KEY,
-            computer_name TEXT,
-            timestamp TEXT,
-            action TEXT,
-            status TEXT,
-            cart_state JSONB
-        );
-        """
-        with self.conn, self.conn.cursor() as cur:
-            cur.execute(query)
+        # a new table gets the full schema at once; an existing one only gets the cheap, metadata-only column add
+        # here, the backfill and index builds are left to migrate() because they scan the whole table
+        def run(cur):
+            cur.execute("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass('logs')")
+            row = cur.fetchone()
+            if row is None:
+                if self._partition_logs:
+                    cur.execute(f"CREATE TABLE logs (id BIGSERIAL, {_COLUMNS}, PRIMARY KEY (id, logged_at)) PARTITION BY RANGE (logged_at)")
+                    cur.execute("CREATE TABLE logs_default PARTITION OF logs DEFAULT")
+                else:
+                    cur.execute(f"CREATE TABLE logs (id BIGSERIAL PRIMARY KEY, {_COLUMNS})")
+                for name, spec in _INDEXES.items():
+                    cur.execute(f"CREATE INDEX {name} {spec}")
+                partitioned = self._partition_logs
+            else:
+                partitioned = row[0] == "p"
+                cur.execute("SELECT 1 FROM pg_attribute WHERE attrelid = 'logs'::regclass AND attname = 'logged_at' AND NOT attisdropped")
+                if cur.fetchone() is None:
+                    cur.execute("ALTER TABLE logs ADD COLUMN logged_at timestamptz")
+                    cur.execute("ALTER TABLE logs ALTER COLUMN logged_at SET DEFAULT now()")
+            if partitioned:
+                self._ensure_partitions(cur)
+            # the same 'logs' that to_regclass() found on the search_path, not any schema's table of that name
+            cur.execute(
+                "SELECT count(*) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid = 'logs'::regclass AND c.relname = ANY(%s)", (list(_INDEXES),))
+            return cur.fetchone()[0] < len(_INDEXES)
+        if self._attempt(run):
+            emit("db_migration_pending", "⚠️ Audit log table predates logged_at/indexes, run: python shppngCrt.py --migrate-logs",
+                 logging.WARNING)
+
+    def _ensure_partitions(self, cur) -> None:
+        # one partition per month, created ahead so rows never land in logs_default
+        month = date.today().replace(day=1)
+        for _ in range(self._partitions_ahead + 1):
+            following = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+            cur.execute("SAVEPOINT partition")
+            try:
+                cur.execute(
+                    f"CREATE TABLE IF NOT EXISTS logs_y{month:%Y}m{month:%m} PARTITION OF logs "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                )
+            except psycopg2.Error as e:
+                # rows for this month already sit in logs_default; keep logging there rather than failing startup
+                cur.execute("ROLLBACK TO SAVEPOINT partition")
+                emit("db_partition_skipped", "⚠️ Could not create audit log partition for {month}: {error}",
+                     logging.WARNING, month=f"{month:%Y-%m}", error=str(e).strip())
+            month = following
+
+    def migrate(self, batch_size: int = 50_000) -> dict:
+        # online upgrade of a pre-logged_at table: batched backfill (short transactions, no long row locks),
+        # then CREATE INDEX CONCURRENTLY so writers are never blocked; safe to re-run after an interruption
+        if not self._prepared:
+            self._prepare()
+        def pending(cur):
+            cur.execute("SELECT min(id), max(id) FROM logs")  # primary-key lookups; each batch skips filled rows itself
+            return cur.fetchone()
+        lo, hi = self._run(pending)
+        backfilled = 0
+        if lo is not None:
+            for start in range(lo, hi + 1, batch_size):
+                def fill(cur, start=start):
+                    cur.execute(
+                        """
+                        UPDATE logs SET logged_at = to_timestamp(timestamp, 'DD/MM/YYYY | HH24:MI:SS')
+                        WHERE id >= %s AND id < %s AND logged_at IS NULL
+                          AND timestamp ~ '^[0-9]{2}/[0-9]{2}/[0-9]{4} [|] [0-9]{2}:[0-9]{2}:[0-9]{2}$'
+                        """,
+                        (start, start + batch_size),
+                    )
+                    return cur.rowcount
+                backfilled += self._run(fill)
+        built = []
+        with self._checkout() as conn:
+            autocommit = conn.autocommit
+            conn.autocommit = True  # CONCURRENTLY cannot run inside a transaction block
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass('logs')")
+                    concurrently = "" if cur.fetchone()[0] == "p" else "CONCURRENTLY "
+                    cur.execute(
+                        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                        "WHERE i.indrelid = 'logs'::regclass AND i.indisvalid"
+                    )
+                    valid = {r[0] for r in cur.fetchall()}
+                    for name, spec in _INDEXES.items():
+                        if name not in valid:
+                            # an interrupted CONCURRENTLY build leaves an invalid index behind; rebuild it
+                            cur.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
+                            cur.execute(f"CREATE INDEX {concurrently}{name} {spec}")
+                            built.append(name)
+                    cur.execute("ANALYZE logs")
+            finally:
+                conn.autocommit = autocommit
+        emit("db_migrated", "✅ Audit log migrated: {backfilled} row(s) backfilled, {indexes} index(es) built.",
+             backfilled=backfilled, indexes=len(built))
+        return {"backfilled": backfilled, "indexes_built": built}
+
+    def _make_row(self, action: str, status: str, cart_state: dict) -> tuple:
+        now = datetime.now().astimezone()
+        return (
+            self._hostname,
+            now.strftime(LEGACY_TIMESTAMP),
+            now.isoformat(),
+            action,
+            status,
+            json.dumps(cart_state, ensure_ascii=False),
+        )
 
     def log_action(self, action: str, status: str, cart_state: dict):
-        payload = json.dumps(cart_state, ensure_ascii=False)
-        with self.conn, self.conn.cursor() as cur:
+        row = self._make_row(action, status, cart_state)
+        METRICS.inc("db_rows_logged_total", action=action)
+        if self.async_mode:
+            self._enqueue(row)
+        else:
+            self._write_rows([row])
+
+    def _write_rows(self, rows: list) -> None:
+        self._run(lambda cur: psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO logs (computer_name, timestamp, logged_at, action, status, cart_state) VALUES %s",
+            rows,
+            page_size=len(rows),
+        ))
+
+    def rebuild_cart_state(self, log_id: int) -> dict:
+        # rows replayed from the spill are inserted late and get later ids, so a cart's history is ordered by the
+        # client's logged_at and per-cart seq (id only breaks ties between legacy rows without a seq)
+        def fetch(cur):
+            cur.execute(
+                "SELECT computer_name, cart_state->>'cart_id', logged_at, COALESCE((cart_state->>'seq')::bigint, 0) "
+                "FROM logs WHERE id = %s", (log_id,))
+            row = cur.fetchone()
+            if row is None:
+                return []
+            host, cart_id, logged_at, seq = row
+            cur.execute(
+                """
+                WITH history AS (
+                    SELECT id, logged_at, COALESCE((cart_state->>'seq')::bigint, 0) AS seq, cart_state FROM logs
+                    WHERE computer_name = %(host)s AND cart_state->>'cart_id' IS NOT DISTINCT FROM %(cart)s
+                      AND logged_at <= %(at)s
+                ), upto AS (
+                    SELECT * FROM history WHERE (logged_at, seq, id) <= (%(at)s, %(seq)s::bigint, %(id)s)
+                ), start AS (
+                    SELECT logged_at, seq, id FROM upto
+                    WHERE cart_state ? 'checkpoint' OR NOT cart_state ? 'changes'
+                    ORDER BY logged_at DESC, seq DESC, id DESC LIMIT 1
+                )
+                SELECT cart_state FROM upto
+                WHERE NOT EXISTS (SELECT 1 FROM start) OR (logged_at, seq, id) >= (SELECT logged_at, seq, id FROM start)
+                ORDER BY logged_at, seq, id
+                """,
+                {"host": host, "cart": cart_id, "at": logged_at, "seq": seq, "id": log_id},
+            )
+            return [r[0] for r in cur.fetchall()]
+        return rebuild_state(self._run(fetch))
+
+    #--------------------------- REPORTING ---------------------------#
+    # every query is a range on logged_at, so the BRIN index / partitions confine it to that window's blocks
+
+    def events_between(self, start: datetime, end: datetime, action: str = None, status: str = None,
+                       computer_name: str = None, limit: int = 1000) -> list:
+        def fetch(cur):
+            cur.execute(
+                """
+                SELECT id, computer_name, logged_at, action, status, cart_state FROM logs
+                WHERE logged_at >= %(start)s AND logged_at < %(end)s
+                  AND (%(action)s::text IS NULL OR action = %(action)s)
+                  AND (%(status)s::text IS NULL OR status = %(status)s)
+                  AND (%(host)s::text IS NULL OR computer_name = %(host)s)
+                ORDER BY logged_at, id
+                LIMIT %(limit)s
+                """,
+                {"start": start, "end": end, "action": action, "status": status, "host": computer_name, "limit": int(limit)},
+            )
+            cols = ("id", "computer_name", "logged_at", "action", "status", "cart_state")
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+        return self._run(fetch)
+
+    def action_counts(self, start: datetime, end: datetime, bucket: str = None) -> list:
+        # [{"action", "status", "count"}], plus "bucket" (the truncated time) when a bucket is given
+        if bucket is not None and bucket not in TIME_BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket!r} (use one of {TIME_BUCKETS})")
+        def fetch(cur):
+            if bucket is None:
+                cur.execute(
+                    "SELECT action, status, count(*) FROM logs WHERE logged_at >= %s AND logged_at < %s "
+                    "GROUP BY action, status ORDER BY action, status",
+                    (start, end),
+                )
+                return [{"action": a, "status": st, "count": n} for a, st, n in cur.fetchall()]
+            cur.execute(
+                "SELECT date_trunc(%s, logged_at) AS b, action, status, count(*) FROM logs "
+                "WHERE logged_at >= %s AND logged_at < %s GROUP BY b, action, status ORDER BY b, action, status",
+                (bucket, start, end),
+            )
+            return [{"bucket": b, "action": a, "status": st, "count": n} for b, a, st, n in cur.fetchall()]
+        return self._run(fetch)
+
+    def failure_rate(self, start: datetime, end: datetime, action: str = None) -> dict:
+        # {action: {"total", "failed", "rate"}}; "failed" is every status other than "success"
+        def fetch(cur):
             cur.execute(
                 """
-                INSERT INTO logs (computer_name, timestamp, action, status, cart_state)
-                VALUES (%s, %s, %s, %s, %s)
+                SELECT action, count(*), count(*) FILTER (WHERE status <> 'success') FROM logs
+                WHERE logged_at >= %(start)s AND logged_at < %(end)s AND (%(action)s::text IS NULL OR action = %(action)s)
+                GROUP BY action ORDER BY action
                 """,
-                (
-                    socket.gethostname(),
-                    datetime.now().strftime("%d/%m/%Y | %H:%M:%S"),
-                    action,
-                    status,
-                    payload,
-                ),
-            )
\ No newline at end of file
+                {"start": start, "end": end, "action": action},
+            )
+            return {a: {"total": total, "failed": failed, "rate": failed / total if total else 0.0}
+                    for a, total, failed in cur.fetchall()}
+        return self._run(fetch)
+
+    #--------------------------- BACKGROUND WRITER ---------------------------#
+    def _enqueue(self, row: tuple) -> None:
+        with self._cond:
+            if self._closing:
+                self._spill([row])
+                return
+            if len(self._queue) >= self._max_queue:
+                if self._backpressure == "block":
+                    self._cond.wait_for(lambda: len(self._queue) < self._max_queue or self._closing)
+                elif self._backpressure == "drop_oldest":
+                    self._queue.popleft()
+                    with self._spill_lock:
+                        self.dropped += 1
+                    METRICS.inc("db_rows_dropped_total")
+                else:
+                    self._spill([row])
+                    return
+            self._queue.append(row)
+            if len(self._queue) >= self._batch_size:
+                self._cond.notify_all()
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            self._cond.wait_for(
+                lambda: len(self._queue) >= self._batch_size or self._closing or self._flush_requested,
+                timeout=self._flush_interval,
+            )
+            n = min(len(self._queue), self._batch_size)
+            batch = [self._queue.popleft() for _ in range(n)]
+            self._in_flight = n
+            METRICS.gauge("db_queue_depth", len(self._queue))
+            if not self._queue:
+                self._flush_requested = False
+            self._cond.notify_all()
+            return batch
+
+    def _run_writer(self) -> None:
+        self._replay_pending()
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._write_rows(batch)
+                except Exception as e:
+                    emit("db_write_failed", "❌ Audit log write failed ({rows} rows spilled): {error}", logging.ERROR,
+                         rows=len(batch), error=str(e))
+                    self._spill(batch)
+                else:
+                    # the database is reachable again: rows spilled during the outage go in now, not at the next start
+                    self._replay_pending()
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+                if self._closing and not self._queue:
+                    return
+
+    def _spill(self, rows: list) -> None:
+        with self._spill_lock:
+            if self._spill_file is None:
+                self.dropped += len(rows)
+                return
+            self._spill_file.append(rows)
+            self.spilled += len(rows)
+        METRICS.inc("db_rows_spilled_total", len(rows))
+
+    def _replay_pending(self) -> None:
+        # at most once per spill_replay_interval, so a spill that keeps growing under load is not reread every batch
+        if self._spill_file is None or time.monotonic() < self._next_replay:
+            return
+        self._next_replay = time.monotonic() + self._spill_replay_interval
+        if self._spill_file.pending():
+            try:
+                self.replay_spill()
+            except Exception as e:
+                emit("db_replay_failed", "⚠️ Could not replay spilled audit rows, keeping them for later: {error}",
+                     logging.WARNING, error=str(e))
+
+    def replay_spill(self) -> int:
+        # rows committed before a failure are never sent twice, unusable rows end up in <spill>.rejected
+        if self._spill_file is None:
+            return 0
+        def write(rows):
+            self._write_rows([_upgrade_row(row) for row in rows])
+        result = self._spill_file.replay(write, self._batch_size, transient=(psycopg2.OperationalError, psycopg2.InterfaceError))
+        if result["rejected"]:
+            emit("db_replay_rejected", "⚠️ {rejected} spilled audit row(s) could not be inserted, moved to {path}.",
+                 logging.WARNING, rejected=result["rejected"], path=str(self._spill_file.rejected))
+        if "error" in result:
+            emit("db_replay_failed", "⚠️ Could not replay spilled audit rows, keeping {rows} for later: {error}",
+                 logging.WARNING, rows=result["requeued"], error=result["error"])
+        return result["written"]
+
+    def flush(self, timeout: float = None) -> bool:
+        if not self.async_mode:
+            return True
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue and self._in_flight == 0, timeout=timeout)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            with self._cond:
+                self._closing = True
+                self._cond.notify_all()
+            self._writer.join()
+            self._writer = None
+            atexit.unregister(self.close)
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+
+def _upgrade_row(row: tuple) -> tuple:
+    if len(row) == 5:  # spilled before logged_at existed
+        return row[:2] + (datetime.strptime(row[1], LEGACY_TIMESTAMP).astimezone().isoformat(),) + row[2:]
+    return row
@@ -0,0 +1,115 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, List, Tuple, Type
+import json
+import os
+import threading
+
+# Audit rows the writer could not deliver, one JSON array per line. replay() moves the file aside to <name>.replay
+# and writes it back in batches, recording the byte offset reached in <name>.replay.offset after every committed
+# batch: a crash or an outage mid-replay resumes after the last committed row instead of inserting it twice.
+# Rows the database rejects for what they are (not a connection problem) go to <name>.rejected for a human to look at.
+
+class SpillFile:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.replaying = self.path.with_name(self.path.name + ".replay")
+        self.rejected = self.path.with_name(self.path.name + ".rejected")
+        self._offset_file = self.path.with_name(self.path.name + ".replay.offset")
+        self._lock = threading.Lock()  # appends from the enqueue path and the writer thread, and the replay hand-off
+
+    def append(self, rows: List[tuple]) -> None:
+        self._append(self.path, [json.dumps(row, ensure_ascii=False) + "\n" for row in rows])
+
+    def _append(self, path: Path, lines: List[str]) -> None:
+        if not lines:
+            return
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def pending(self) -> bool:
+        return any(p.exists() and p.stat().st_size > 0 for p in (self.path, self.replaying))
+
+    def _read_offset(self) -> int:
+        try:
+            return int(self._offset_file.read_text(encoding="ascii") or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _commit_offset(self, offset: int) -> None:
+        tmp = self._offset_file.with_name(self._offset_file.name + ".tmp")
+        tmp.write_text(str(offset), encoding="ascii")
+        os.replace(tmp, self._offset_file)
+
+    def _finish(self) -> None:
+        self.replaying.unlink()
+        try:
+            self._offset_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def replay(self, write: Callable[[List[tuple]], None], batch_size: int = 100,
+               transient: Tuple[Type[BaseException], ...] = (ConnectionError,)) -> dict:
+        # write(rows) inserts one batch atomically; an exception in transient (the database is unreachable) stops the
+        # replay and puts the unwritten rows back in the spill ("error" set), anything else is narrowed down to the
+        # offending rows
+        result = {"written": 0, "requeued": 0, "rejected": 0}
+        with self._lock:
+            if not self.replaying.exists():
+                if not self.path.exists() or self.path.stat().st_size == 0:
+                    return result
+                self.path.replace(self.replaying)
+                offset = 0
+            else:
+                offset = self._read_offset()  # a replay that did not finish last time
+        with open(self.replaying, "rb") as f:
+            f.seek(offset)
+            raw = f.read()
+        entries, bad, pos = [], [], offset
+        for line in raw.splitlines(keepends=True):
+            pos += len(line)
+            try:
+                entries.append((pos, tuple(json.loads(line))))
+            except (json.JSONDecodeError, UnicodeDecodeError, TypeError):
+                if line.strip():
+                    bad.append(line.decode("utf-8", "replace").rstrip("\n") + "\n")
+        self._append(self.rejected, bad)
+        result["rejected"] += len(bad)
+        size = max(1, int(batch_size))
+        i = 0
+        try:
+            while i < len(entries):
+                chunk = entries[i:i + size]
+                try:
+                    write([row for _, row in chunk])
+                except transient:
+                    raise
+                except Exception:
+                    # one bad row fails the whole batch: retry row by row, quarantine what the database refuses
+                    for k, (end, row) in enumerate(chunk):
+                        try:
+                            write([row])
+                        except transient:
+                            i += k
+                            raise
+                        except Exception:
+                            self._append(self.rejected, [json.dumps(row, ensure_ascii=False) + "\n"])
+                            result["rejected"] += 1
+                        else:
+                            result["written"] += 1
+                        self._commit_offset(end)
+                else:
+                    result["written"] += len(chunk)
+                    self._commit_offset(chunk[-1][0])
+                i += len(chunk)
+        except transient as e:
+            # only the rows after the last committed one go back; they are appended behind anything spilled meanwhile
+            rest = [json.dumps(row, ensure_ascii=False) + "\n" for _, row in entries[i:]]
+            self._append(self.path, rest)
+            result["requeued"] = len(rest)
+            result["error"] = str(e)
+        with self._lock:
+            self._finish()
+        return result
@@ -5,20 +5,40 @@ from tkinter import Toplevel
 from ttkbootstrap import Style
 from uis.themes import ThemeState
 from uis import save
+from uis.cache import ExportCache
+from uis.exporter import ExportQueue, describe
+from cart.product import PhysicalProduct, DigitalProduct
+from cart.search import PRODUCT_TYPES
+from metrics.metrics import METRICS
 import json
 
+PAGE_SIZE = 200
+WATCH_MS = 500
+
 class GUI:
-    def __init__(self, root, cart, theme_state: ThemeState):
+    def __init__(self, root, cart, theme_state: ThemeState, watcher=None):
         self.root = root
         self.cart = cart
         self.theme = theme_state
         self.style = Style(theme=self.theme.name)
+        self.exports = ExportQueue(max_workers=4, use_processes=True, cache=ExportCache())
+        self._export_batch = None
+        self._prod_rows = {}
+        self._cart_rows = {}
+        self._page = 0
+        self._filter_job = None
+        self._visible_ids = list(self.cart.catalog)
         self.root.title(f"Tungshoop {self.theme.emoji} – Shopping Cart")
         self.root.geometry("1640x860")
 
         self._build_widgets()
         self._refresh_products()
         self._refresh_cart()
+        # polled from the Tk loop, so catalog updates and row refreshes happen on this thread
+        self.watcher = watcher
+        if watcher is not None:
+            watcher.subscribe("gui", self._on_catalog_changed)
+            self.root.after(WATCH_MS, self._poll_catalog)
 
     def _build_widgets(self):
         container = ttk.Frame(self.root, padding=12)
@@ -33,13 +53,36 @@ class GUI:
         self.save_bttn = ttk.Button(topbar, text="Save…", command=self._open_save_dialog)
         self.save_bttn.pack(side=tk.RIGHT, padx=5)
 
+        self.import_bttn = ttk.Button(topbar, text="Import…", command=self._import_dialog)
+        self.import_bttn.pack(side=tk.RIGHT, padx=5)
+
         self.checkout_bttn = ttk.Button(topbar, text="Checkout", command=self._checkout)
         self.checkout_bttn.pack(side=tk.RIGHT)
 
+        self.stats_bttn = ttk.Button(topbar, text="Stats", command=self._open_stats)
+        self.stats_bttn.pack(side=tk.RIGHT, padx=5)
+
         main = ttk.Panedwindow(container, orient=tk.HORIZONTAL)
         main.pack(fill=tk.BOTH, expand=True)
 
         prod_frame = ttk.Labelframe(main, text="Products")
+        search_bar = ttk.Frame(prod_frame)
+        search_bar.pack(fill=tk.X, padx=6, pady=(6,0))
+        ttk.Label(search_bar, text="Search:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *_: self._schedule_filter())
+        ttk.Entry(search_bar, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=6)
+        self.type_var = tk.StringVar(value="all")
+        type_box = ttk.Combobox(search_bar, textvariable=self.type_var, values=("all",) + PRODUCT_TYPES, width=9, state="readonly")
+        type_box.bind("<<ComboboxSelected>>", lambda _e: self._schedule_filter())
+        type_box.pack(side=tk.LEFT)
+        self.stock_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_bar, text="In stock", variable=self.stock_var, command=self._schedule_filter).pack(side=tk.LEFT, padx=6)
+        ttk.Button(search_bar, text="◀", width=3, command=lambda: self._turn_page(-1)).pack(side=tk.LEFT)
+        self.page_var = tk.StringVar()
+        ttk.Label(search_bar, textvariable=self.page_var, width=14, anchor=tk.CENTER).pack(side=tk.LEFT)
+        ttk.Button(search_bar, text="▶", width=3, command=lambda: self._turn_page(1)).pack(side=tk.LEFT)
+
         self.prod_tree = ttk.Treeview(prod_frame, columns=("id","name","price","stock","ship","weight","type"), show="headings")
         for col, w in zip(["id","name","price","stock","ship","weight","type"],[90,220,90,80,90,80,80]):
             self.prod_tree.heading(col, text=col.title())
@@ -88,72 +131,230 @@ class GUI:
 
         row = ttk.Frame(dlg)
         row.pack(pady=6)
-        ttk.Button(row, text="EXCEL", command=lambda: self._do_save(save.save_excel, snap, dlg)).pack(side=tk.LEFT, padx=6)
-        ttk.Button(row, text="PDF", command=lambda: self._do_save(save.save_pdf, snap, dlg)).pack(side=tk.LEFT, padx=6)
-        ttk.Button(row, text="JSON", command=lambda: self._do_save(save.save_json, snap, dlg)).pack(side=tk.LEFT, padx=6)
-        ttk.Button(row, text="DOCX", command=lambda: self._do_save(save.save_docx, snap, dlg)).pack(side=tk.LEFT, padx=6)
-
-    def _do_save(self, fn, snapshot, dlg):
-        filename = fn(snapshot)
-        messagebox.showinfo("Saved", f"Exported to: {filename}")
+        formats = [("EXCEL", save.save_excel), ("PDF", save.save_pdf), ("JSON", save.save_json), ("DOCX", save.save_docx), ("CSV", save.save_csv)]
+        for label, fn in formats:
+            ttk.Button(row, text=label, command=lambda j=[(label, fn)]: self._do_save(j, snap, dlg)).pack(side=tk.LEFT, padx=6)
+        ttk.Button(row, text="ALL", command=lambda: self._do_save(formats, snap, dlg)).pack(side=tk.LEFT, padx=6)
+
+        dlg.progress = ttk.Progressbar(dlg, mode="determinate", length=360)
+        dlg.progress.pack(pady=(12, 4))
+        dlg.status = tk.StringVar(value="")
+        ttk.Label(dlg, textvariable=dlg.status).pack()
+        ttk.Button(dlg, text="Cancel", command=lambda: self._cancel_save(dlg)).pack(pady=6)
+        dlg.protocol("WM_DELETE_WINDOW", lambda: self._cancel_save(dlg))
+
+    def _open_stats(self):
+        dlg = Toplevel(self.root)
+        dlg.title("Stats")
+        dlg.geometry("760x520")
+        text = tk.Text(dlg, font=("Courier", 10), wrap=tk.NONE)
+        text.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
+
+        def refresh():
+            if not dlg.winfo_exists():
+                return
+            body = METRICS.summary()
+            if self.cart.db is not None:
+                s = self.cart.db.stats()
+                body += (f"\n\nDB: {s['calls']} round trips, avg {s['avg_latency'] * 1000:.2f} ms, "
+                         f"max {s['max_latency'] * 1000:.2f} ms, {s['failures']} failures, {s['queued']} queued")
+            c = self.exports.cache.stats()
+            body += (f"\n\nExport cache: {c['hits']} hits, {c['misses']} misses, {c['entries']} files, "
+                     f"{c['bytes'] / 1048576:.1f}/{c['max_bytes'] / 1048576:.0f} MB, {c['evictions']} evicted")
+            text.configure(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert("1.0", body)
+            text.configure(state=tk.DISABLED)
+            dlg.after(1000, refresh)
+        refresh()
+
+    def _import_dialog(self):
+        path = filedialog.askopenfilename(
+            title="Import cart from …",
+            filetypes=[("Cart files", "*.json *.csv"), ("JSON", "*.json"), ("CSV", "*.csv")],
+            parent=self.root,
+        )
+        if not path:
+            return
+        try:
+            ok = self.cart.import_file(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import", f"Could not import file:\n{e}")
+            return
+        if not ok:
+            messagebox.showwarning("Import", "Import rejected: some lines have an unknown product or not enough stock.")
+            return
+        self._refresh_products()
+        self._refresh_cart()
+
+    def _do_save(self, jobs, snapshot, dlg):
+        if self._export_batch is not None and not self._export_batch.done():
+            messagebox.showinfo("Save", "An export is already running.", parent=dlg)
+            return
+        batch = self._export_batch = self.exports.submit(jobs, snapshot)
+        dlg.progress.configure(maximum=batch.total, value=0)
+        dlg.status.set(f"Exporting {', '.join(batch.labels)} …")
+
+        def progress(done, total):
+            dlg.progress.configure(value=done)
+            dlg.status.set(f"Exported {done}/{total} …")
+
+        def finished(b):
+            self._export_batch = None
+            if b.cancelled:
+                return
+            messagebox.showinfo("Saved", f"Exported to:\n{describe(b.results())}")
+            dlg.destroy()
+
+        self.exports.watch(batch, self.root.after, progress, finished)
+
+    def _cancel_save(self, dlg):
+        if self._export_batch is not None:
+            self._export_batch.cancel()
+            self._export_batch = None
         dlg.destroy()
 
-    def _refresh_products(self):
-        for i in self.prod_tree.get_children():
-            self.prod_tree.delete(i)
-        for p in self.cart.catalog.values():
-            ptype = getattr(p, "_download_link", None)
-            ptype = "digital" if ptype else ("physical" if getattr(p, "_weight", None) is not None else "generic")
-            weight = getattr(p, "_weight", "-")
-            self.prod_tree.insert("", tk.END, values=(p._product_id, p._name, p._price, p._quantity_available, p._shipping_cost, weight, ptype))
-
-    def _refresh_cart(self):
-        for i in self.cart_tree.get_children():
-            self.cart_tree.delete(i)
-        for pid, item in self.cart._items.items():
-            self.cart_tree.insert("", tk.END, values=(pid, item._product._name, item._quantity, item._product._price, item._product._shipping_cost, item.calculate_subtotal()))
-        self.total_var.set(f"Total: ₺{self.cart.get_total()}")
+    def _schedule_filter(self):
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(150, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_job = None
+        text = self.search_var.get().strip() or None
+        ptype = None if self.type_var.get() == "all" else self.type_var.get()
+        in_stock = True if self.stock_var.get() else None
+        if text is None and ptype is None and in_stock is None:
+            self._visible_ids = list(self.cart.catalog)
+        else:
+            self._visible_ids = [p._product_id for p in self.cart.search(text=text, ptype=ptype, in_stock=in_stock, limit=None)]
+        self._page = 0
+        self._refresh_products()
+
+    def _turn_page(self, step):
+        pages = max(1, -(-len(self._visible_ids) // PAGE_SIZE))
+        page = min(max(self._page + step, 0), pages - 1)
+        if page != self._page:
+            self._page = page
+            self._refresh_products()
+
+    def _poll_catalog(self):
+        self.watcher.poll()
+        self.root.after(WATCH_MS, self._poll_catalog)
+
+    def _on_catalog_changed(self, changed, removed):
+        self.cart.apply_catalog_changes(changed, removed)
+        visible = set(self._visible_ids)
+        filtered = self.search_var.get().strip() or self.type_var.get() != "all" or self.stock_var.get()
+        if removed or filtered or any(pid not in visible for pid in changed):
+            page = self._page
+            self._apply_filter()  # the visible id list changed; stay on the same page
+            self._turn_page(page)
+        else:
+            self._refresh_products(changed)
+        self._refresh_cart(changed | removed)
+
+    @staticmethod
+    def _product_values(p):
+        if isinstance(p, DigitalProduct):
+            weight, ptype = "-", "digital"
+        elif isinstance(p, PhysicalProduct):
+            weight, ptype = p._weight, "physical"
+        else:
+            weight, ptype = "-", "generic"
+        return (p._product_id, p._name, p._price, p._quantity_available, p._shipping_cost, weight, ptype)
+
+    def _refresh_products(self, pids=None):
+        # only the current page exists in the Treeview; rows are keyed by product id and updated in place
+        if pids is not None:
+            for pid in pids:
+                if pid in self._prod_rows:
+                    self._set_row(self.prod_tree, self._prod_rows, pid, self._product_values(self.cart.catalog[pid]))
+            return
+        start = self._page * PAGE_SIZE
+        page_ids = self._visible_ids[start:start + PAGE_SIZE]
+        keep = set(page_ids)
+        stale = [pid for pid in self._prod_rows if pid not in keep]
+        if stale:
+            self.prod_tree.delete(*stale)
+            for pid in stale:
+                del self._prod_rows[pid]
+        for index, pid in enumerate(page_ids):
+            self._set_row(self.prod_tree, self._prod_rows, pid, self._product_values(self.cart.catalog[pid]), index)
+        pages = max(1, -(-len(self._visible_ids) // PAGE_SIZE))
+        self.page_var.set(f"{self._page + 1}/{pages} ({len(self._visible_ids)})")
+
+    @staticmethod
+    def _set_row(tree, rows, iid, values, index=None):
+        if iid not in rows:
+            tree.insert("", tk.END if index is None else index, iid=iid, values=values)
+        else:
+            if rows[iid] != values:
+                tree.item(iid, values=values)
+            if index is not None and tree.index(iid) != index:
+                tree.move(iid, "", index)
+        rows[iid] = values
+
+    def _refresh_cart(self, pids=None):
+        items = self.cart._items
+        if pids is None:
+            stale = [pid for pid in self._cart_rows if pid not in items]
+            pids = list(items)
+        else:
+            stale = [pid for pid in pids if pid in self._cart_rows and pid not in items]
+            pids = [pid for pid in pids if pid in items]
+        if stale:
+            self.cart_tree.delete(*stale)
+            for pid in stale:
+                del self._cart_rows[pid]
+        for pid in pids:
+            item = items[pid]
+            values = (pid, item._product._name, item._quantity, item._product._price, item._product._shipping_cost, item.calculate_subtotal())
+            self._set_row(self.cart_tree, self._cart_rows, pid, values)
+        discount = self.cart.get_discount()
+        self.total_var.set(f"Total: ₺{self.cart.get_total()}" + (f"  (discount ₺{discount})" if discount else ""))
 
     def _add_to_cart_dialog(self):
         sel = self.prod_tree.focus()
         if not sel:
             messagebox.showwarning("Add", "Select a product first.")
             return
-        pid = self.prod_tree.item(sel, 'values')[0]
+        pid = sel
         qty = simpledialog.askinteger("Quantity", "Enter quantity:", minvalue=1, parent=self.root)
         if qty:
             ok = self.cart.add_item(pid, qty)
             if ok:
-                self._refresh_products()
-                self._refresh_cart()
+                self._refresh_products([pid])
+                self._refresh_cart([pid])
 
     def _update_quantity_dialog(self):
         sel = self.cart_tree.focus()
         if not sel:
             messagebox.showwarning("Update", "Select a cart item.")
             return
-        pid = self.cart_tree.item(sel, 'values')[0]
+        pid = sel
         qty = simpledialog.askinteger("New Quantity", "Enter new quantity (0 to remove):", minvalue=0, parent=self.root)
         if qty is not None:
             self.cart.update_quantity(pid, qty)
-            self._refresh_products()
-            self._refresh_cart()
+            self._refresh_products([pid])
+            self._refresh_cart([pid])
 
     def _remove_item_dialog(self):
         sel = self.cart_tree.focus()
         if not sel:
             messagebox.showwarning("Remove", "Select a cart item.")
             return
-        pid = self.cart_tree.item(sel, 'values')[0]
+        pid = sel
         self.cart.remove_item(pid)
-        self._refresh_products()
-        self._refresh_cart()
+        self._refresh_products([pid])
+        self._refresh_cart([pid])
 
     def _clear_cart(self):
         if messagebox.askyesno("Clear", "Really, want to clear entire cart?"):
+            pids = list(self.cart._items)
             self.cart.clear_cart()
-            self._refresh_products()
-            self._refresh_cart()
+            self._refresh_products(pids)
+            self._refresh_cart(pids)
 
     def _checkout(self):
         if not self.cart._items:
@@ -161,6 +362,7 @@ class GUI:
             return
         self.cart.display_cart()
         messagebox.showinfo("Checkout", "💳 Checkout complete. Thank you for shopping with us!")
-        self.cart.clear_cart()
-        self._refresh_products()
-        self._refresh_cart()
\ No newline at end of file
+        pids = list(self.cart._items)
+        self.cart.checkout()
+        self._refresh_products(pids)
+        self._refresh_cart(pids)
\ No newline at end of file
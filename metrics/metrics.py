@@ -0,0 +1,232 @@
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Tuple
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# latency buckets in seconds (upper bounds, Prometheus "le"); the last bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+EVENT_MODES = ("text", "json", "off")
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+def _label_text(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket holding the q-th observation; max for the +Inf bucket
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+class Registry:
+    # disabled by default: every hook checks `enabled` first, so an uninstrumented run pays one attribute load
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._gauges: Dict[tuple, float] = {}
+        self._hists: Dict[tuple, Histogram] = {}
+        self._started = time.time()
+
+    def enable(self, on: bool = True) -> None:
+        self.enabled = on
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._hists.clear()
+            self._started = time.time()
+
+    def inc(self, name: str, n: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def gauge(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    #--------------------------- DUMPS ---------------------------#
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())]
+            gauges = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._gauges.items())]
+            hists = [
+                {
+                    "name": n, "labels": dict(l), "count": h.count, "sum": round(h.sum, 6),
+                    "p50_ms": round(h.quantile(0.5) * 1000, 3), "p99_ms": round(h.quantile(0.99) * 1000, 3),
+                    "max_ms": round(h.max * 1000, 3),
+                }
+                for (n, l), h in sorted(self._hists.items())
+            ]
+        return {"enabled": self.enabled, "uptime_s": round(time.time() - self._started, 1),
+                "counters": counters, "gauges": gauges, "histograms": hists}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4, ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        out = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            hists = [(key, list(h.counts), h.count, h.sum) for key, h in sorted(self._hists.items())]
+        typed = set()
+        def head(name, kind):
+            if name not in typed:
+                typed.add(name)
+                out.append(f"# TYPE tungshoop_{name} {kind}")
+        for (name, labels), value in counters:
+            head(name, "counter")
+            out.append(f"tungshoop_{name}{_label_text(labels)} {value}")
+        for (name, labels), value in gauges:
+            head(name, "gauge")
+            out.append(f"tungshoop_{name}{_label_text(labels)} {value}")
+        for (name, labels), counts, count, total in hists:
+            head(name, "histogram")
+            running = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                running += n
+                out.append(f"tungshoop_{name}_bucket{_label_text(labels, (('le', bound),))} {running}")
+            out.append(f"tungshoop_{name}_sum{_label_text(labels)} {total}")
+            out.append(f"tungshoop_{name}_count{_label_text(labels)} {count}")
+        return "\n".join(out) + "\n"
+
+    def summary(self) -> str:
+        # human-readable table for the CLI and GUI stats views
+        snap = self.snapshot()
+        if not snap["enabled"]:
+            return "Metrics are off. Start with --metrics (or TUNGSHOOP_METRICS=1) to collect them."
+        lines = [f"Uptime: {snap['uptime_s']}s", "", f"{'TIMING':<60}{'COUNT':>8}{'P50 ms':>10}{'P99 ms':>10}{'MAX ms':>10}"]
+        for h in snap["histograms"]:
+            label = h["name"] + _label_text(tuple(h["labels"].items()))
+            lines.append(f"{label:<60}{h['count']:>8}{h['p50_ms']:>10}{h['p99_ms']:>10}{h['max_ms']:>10}")
+        lines += ["", f"{'COUNTER / GAUGE':<60}{'VALUE':>8}"]
+        for c in snap["counters"] + snap["gauges"]:
+            label = c["name"] + _label_text(tuple(c["labels"].items()))
+            lines.append(f"{label:<60}{c['value']:>8g}")
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> str:
+        # .json gets the JSON snapshot, anything else the Prometheus text format
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+METRICS = Registry(enabled=os.getenv("TUNGSHOOP_METRICS", "") not in ("", "0"))
+
+#--------------------------- EVENTS (structured replacement for print) ---------------------------#
+_events = logging.getLogger("tungshoop")
+_events.propagate = False
+
+class _StdoutHandler(logging.Handler):
+    # looks sys.stdout up on every record so redirect_stdout() keeps working
+    def __init__(self, as_json: bool):
+        super().__init__()
+        self._as_json = as_json
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._as_json:
+            line = json.dumps({"ts": round(record.created, 3), "level": record.levelname.lower(),
+                               "event": record.event, "message": record.getMessage(), **record.fields}, ensure_ascii=False, default=str)
+        else:
+            line = record.getMessage()
+        sys.stdout.write(line + "\n")
+
+def configure_events(mode: str = "text") -> None:
+    # "text" keeps the classic emoji messages, "json" writes one object per line, "off" skips formatting entirely
+    if mode not in EVENT_MODES:
+        raise ValueError(f"Unknown event mode: {mode!r} (use one of {EVENT_MODES})")
+    for handler in list(_events.handlers):
+        _events.removeHandler(handler)
+    _events.disabled = mode == "off"
+    _events.setLevel(logging.INFO)
+    if mode != "off":
+        _events.addHandler(_StdoutHandler(as_json=mode == "json"))
+
+def emit(event: str, message: str, level: int = logging.INFO, **fields) -> None:
+    # message is a str.format template filled from fields, only when the event is actually written
+    if not _events.isEnabledFor(level):
+        return
+    _events.handle(_events.makeRecord(
+        _events.name, level, "", 0, message.format(**fields) if fields else message, None, None,
+        extra={"event": event, "fields": fields},
+    ))
+
+configure_events(os.getenv("TUNGSHOOP_EVENTS", "text"))
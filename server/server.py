@@ -0,0 +1,327 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Optional
+import asyncio
+import json
+import logging
+import re
+import threading
+from cart.cart import ShoppingCart
+from cart.catalog import load_catalog
+from cart.inventory import ReservationEngine, SQLiteInventoryStore
+from cart.storage import JSONStorage
+from cart.watcher import CatalogWatcher
+from metrics.metrics import METRICS, emit
+from uis.cache import ExportCache
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}
+EXPORT_FORMATS = ("json", "excel", "pdf", "docx", "csv", "ndjson")
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class CartServer:
+    def __init__(self, catalog_file="jsons/infoProducts.json", sessions_dir="jsons/sessions", db_logger=None,
+                 max_sessions: int = 1000, inventory_db: Optional[str] = None, reservation_ttl: float = 900.0,
+                 workers: int = 8, catalog_backend: str = "memory", export_dir: str = "saved/sessions", storage=None,
+                 promotions=None):
+        self._catalog_file = catalog_file
+        self._sessions_dir = Path(sessions_dir)
+        self._sessions_dir.mkdir(parents=True, exist_ok=True)
+        self._export_dir = Path(export_dir)
+        self._export_cache = ExportCache(str(self._export_dir / ".cache"))
+        self._max_sessions = max(1, int(max_sessions))
+        self.db = db_logger
+        # default keeps one <sid>.json (+ journal) per session; a SQLiteStorage puts every session in one file
+        self.storage = storage if storage is not None else JSONStorage(sessions_dir)
+        self.catalog = load_catalog(catalog_file, catalog_backend)
+        store = SQLiteInventoryStore(inventory_db, self.catalog) if inventory_db else None
+        self.promotions = promotions  # one compiled PromotionEngine shared by every session
+        self.engine = ReservationEngine(self.catalog, store=store, ttl=reservation_ttl)
+        # edits to the catalog file go live without a restart; a SQLite inventory store keeps owning the stock
+        self.watcher = CatalogWatcher(catalog_file, self.catalog, reload_stock=store is None, inventory=self.engine)
+        self.watcher.subscribe("server", self._on_catalog_changed)
+        self._sessions: "OrderedDict[str, ShoppingCart]" = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self._busy: Dict[str, int] = {}  # sid -> requests using the cart right now
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cart-worker")
+        self._routes = [
+            ("GET", re.compile(r"^/health$"), self._health),
+            ("GET", re.compile(r"^/metrics$"), self._metrics),
+            ("GET", re.compile(r"^/products$"), self._products),
+            ("GET", re.compile(r"^/carts/(?P<sid>[^/]+)$"), self._view),
+            ("DELETE", re.compile(r"^/carts/(?P<sid>[^/]+)$"), self._clear),
+            ("POST", re.compile(r"^/carts/(?P<sid>[^/]+)/items$"), self._add),
+            ("PUT", re.compile(r"^/carts/(?P<sid>[^/]+)/items/(?P<pid>[^/]+)$"), self._update),
+            ("DELETE", re.compile(r"^/carts/(?P<sid>[^/]+)/items/(?P<pid>[^/]+)$"), self._remove),
+            ("POST", re.compile(r"^/carts/(?P<sid>[^/]+)/batch$"), self._batch),
+            ("POST", re.compile(r"^/carts/(?P<sid>[^/]+)/checkout$"), self._checkout),
+            ("POST", re.compile(r"^/carts/(?P<sid>[^/]+)/export$"), self._export),
+        ]
+
+    #--------------------------- SESSIONS ---------------------------#
+    def _open_cart(self, sid: str, claim: bool = True) -> ShoppingCart:
+        return ShoppingCart(
+            self._catalog_file, str(self._sessions_dir / f"{sid}.json"), db_logger=self.db,
+            cart_id=sid, inventory=self.engine, catalog=self.catalog, storage=self.storage,
+            promotions=self.promotions, claim_stock=claim,
+        )
+
+    @contextmanager
+    def using(self, sid: str):
+        # the cart pinned for the duration: it is never evicted (and reopened as a second object) while in use
+        if not _SESSION_ID.match(sid):
+            raise HTTPError(400, "Session id must be 1-64 letters, digits, '-' or '_'")
+        with self._sessions_lock:
+            cart = self._sessions.get(sid)
+            if cart is None:
+                cart = self._sessions[sid] = self._open_cart(sid)
+            else:
+                self._sessions.move_to_end(sid)
+            self._busy[sid] = self._busy.get(sid, 0) + 1
+            self._evict_idle()
+        try:
+            yield cart
+        finally:
+            with self._sessions_lock:
+                self._busy[sid] -= 1
+                if not self._busy[sid]:
+                    del self._busy[sid]
+                self._evict_idle()
+
+    def session(self, sid: str) -> ShoppingCart:
+        with self.using(sid) as cart:
+            return cart
+
+    def _evict_idle(self) -> None:
+        # least recently used first, skipping carts a worker still holds (the cache may run over until they finish)
+        excess = len(self._sessions) - self._max_sessions
+        if excess <= 0:
+            return
+        for sid in list(self._sessions):
+            if excess <= 0:
+                break
+            if sid not in self._busy:
+                self._spill(self._sessions.pop(sid))
+                excess -= 1
+
+    def _spill(self, cart: ShoppingCart) -> None:
+        # state is already journaled; compact it and let the object go, its reservations stay held
+        self.engine.unsubscribe(cart.cart_id)
+        with cart._lock:
+            cart._save_cart_state()
+
+    def expire_reservations(self) -> int:
+        # under the sessions lock: open carts hear about it through their engine subscription, and a session that was
+        # evicted is opened here, updated and let go again before any request can open its own copy
+        with self._sessions_lock:
+            taken = self.engine.expire()
+            for sid, lines in taken.items():
+                if sid in self._sessions or not _SESSION_ID.match(sid):
+                    continue
+                cart = self._open_cart(sid, claim=False)
+                cart._on_reservations_expired(lines)
+                self._spill(cart)
+        return len(taken)
+
+    def _on_catalog_changed(self, changed, removed) -> None:
+        with self._sessions_lock:
+            carts = list(self._sessions.items())
+            for sid, _ in carts:
+                self._busy[sid] = self._busy.get(sid, 0) + 1
+        try:
+            for _, cart in carts:
+                cart.apply_catalog_changes(changed, removed)
+        finally:
+            with self._sessions_lock:
+                for sid, _ in carts:
+                    self._busy[sid] -= 1
+                    if not self._busy[sid]:
+                        del self._busy[sid]
+                self._evict_idle()
+
+    #--------------------------- HANDLERS (worker threads) ---------------------------#
+    def _reply(self, cart: ShoppingCart, ok: bool = True) -> dict:
+        return {"ok": ok, "session": cart.cart_id, "cart": cart.get_cart_snapshot()}
+
+    def _health(self, body, **_):
+        return {"ok": True, "sessions": len(self._sessions), "products": len(self.catalog)}
+
+    def _metrics(self, body, query=None, **_):
+        # Prometheus text by default (a str payload is sent as text/plain), ?format=json for the JSON snapshot
+        if query.get("format") == "json":
+            return {"ok": True, "metrics": METRICS.snapshot(), "db": self.db.stats() if self.db else None}
+        return METRICS.to_prometheus()
+
+    def _products(self, body, query=None, **_):
+        offset = int(query.get("offset", 0))
+        limit = min(int(query.get("limit", 100)), 1000)
+        if offset < 0 or limit < 0:
+            raise HTTPError(400, "'offset' and 'limit' must not be negative")
+        ids = list(islice(self.catalog, offset, offset + limit))  # one page of ids, not a copy of the whole catalog
+        return {"ok": True, "total": len(self.catalog), "products": [self.catalog[pid].to_dict() for pid in ids]}
+
+    def _view(self, body, sid, **_):
+        with self.using(sid) as cart:
+            return self._reply(cart)
+
+    def _add(self, body, sid, **_):
+        with self.using(sid) as cart:
+            return self._reply(cart, cart.add_item(_field(body, "product_id"), _quantity(body, minimum=1)))
+
+    def _update(self, body, sid, pid, **_):
+        with self.using(sid) as cart:
+            return self._reply(cart, cart.update_quantity(pid, _quantity(body, minimum=0)))
+
+    def _remove(self, body, sid, pid, **_):
+        with self.using(sid) as cart:
+            return self._reply(cart, cart.remove_item(pid))
+
+    def _batch(self, body, sid, **_):
+        with self.using(sid) as cart:
+            return self._reply(cart, cart.apply_batch(_field(body, "lines"), mode=body.get("mode", "add")))
+
+    def _clear(self, body, sid, **_):
+        with self.using(sid) as cart:
+            cart.clear_cart()
+            return self._reply(cart)
+
+    def _checkout(self, body, sid, **_):
+        with self.using(sid) as cart:
+            if not cart._items:
+                raise HTTPError(409, "Cart is empty")
+            return {"ok": True, "session": sid, "receipt": cart.checkout()}
+
+    def _export(self, body, sid, **_):
+        from uis import save
+        fmt = body.get("format", "json")
+        if fmt not in EXPORT_FORMATS:
+            raise HTTPError(400, f"format must be one of {EXPORT_FORMATS}")
+        ext = {"excel": "xlsx"}.get(fmt, fmt)
+        filename = str(self._export_dir / f"{sid}.{ext}")
+        # many sessions export the same cart contents; renders are shared through the content-addressed cache
+        with self.using(sid) as cart:
+            snapshot = cart.get_cart_snapshot()
+        file = self._export_cache.export(getattr(save, f"save_{fmt}"), snapshot, filename, fmt)
+        return {"ok": True, "session": sid, "file": file}
+
+    def dispatch(self, method: str, path: str, body: dict, query: dict):
+        allowed = False
+        for verb, pattern, handler in self._routes:
+            m = pattern.match(path)
+            if m:
+                allowed = True
+                if verb == method:
+                    with METRICS.timer("http_request_seconds", method=method, route=handler.__name__.lstrip("_")):
+                        return handler(body, query=query, **m.groupdict())
+        raise HTTPError(405 if allowed else 404, f"No route for {method} {path}")
+
+    #--------------------------- HTTP (event loop) ---------------------------#
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                path, _, qs = target.partition("?")
+                query = dict(p.split("=", 1) for p in qs.split("&") if "=" in p)
+                try:
+                    body = json.loads(raw) if raw else {}
+                    status, payload = 200, await loop.run_in_executor(self._executor, self.dispatch, method, path, body, query)
+                except HTTPError as e:
+                    status, payload = e.status, {"ok": False, "error": str(e)}
+                except (ValueError, KeyError, TypeError) as e:
+                    status, payload = 400, {"ok": False, "error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"ok": False, "error": str(e)}
+                METRICS.inc("http_responses_total", status=status)
+                if isinstance(payload, str):
+                    content_type, data = "text/plain; version=0.0.4", payload.encode("utf-8")
+                else:
+                    content_type, data = "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _reaper(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(self._executor, self.expire_reservations)
+            except Exception as e:
+                emit("reservation_reap_failed", "❌ Reservation reaper failed: {error}", logging.ERROR, error=str(e))
+
+    async def _watch(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(self._executor, self.watcher.poll)
+            except Exception as e:
+                emit("catalog_reload_failed", "⚠️ Catalog reload failed: {error}", logging.ERROR, path=self._catalog_file, error=str(e))
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, reap_interval: float = 30.0, watch_interval: float = 0.5) -> None:
+        server = await asyncio.start_server(self._handle, host, port)
+        reaper = asyncio.create_task(self._reaper(reap_interval))
+        watcher = asyncio.create_task(self._watch(watch_interval)) if watch_interval > 0 else None
+        print(f"🛒 Tungshoop cart server listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reaper.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            self.close()
+
+    def close(self) -> None:
+        with self._sessions_lock:
+            for cart in self._sessions.values():
+                self._spill(cart)
+            self._sessions.clear()
+        self._executor.shutdown(wait=True)
+        self.storage.close()
+
+def _field(body: dict, name: str):
+    if name not in body:
+        raise HTTPError(400, f"Missing field '{name}'")
+    return body[name]
+
+def _quantity(body: dict, minimum: int) -> int:
+    raw = _field(body, "quantity")
+    try:
+        if isinstance(raw, bool) or not isinstance(raw, (int, str)):
+            raise ValueError
+        qty = int(raw)
+    except ValueError:
+        raise HTTPError(400, f"'quantity' must be an integer, got {raw!r}")
+    if qty < minimum:
+        raise HTTPError(400, f"'quantity' must be at least {minimum}")
+    return qty
@@ -1,14 +1,17 @@
 import argparse
 from cart.cart import ShoppingCart
-from database.logger import DBLogger
-from uis.themes import ThemeState
-import tkinter as tk
-from gui.gui import GUI
-import json
-from dotenv import load_dotenv
+from cart.storage import STORAGE_BACKENDS, open_storage
+from cart.watcher import CatalogWatcher
+from metrics.metrics import METRICS, EVENT_MODES, configure_events
 import os
 
-load_dotenv()
+# tkinter/ttkbootstrap, the exporters and psycopg2 are imported where they are first needed, so the CLI
+# starts without them (see benchmarks/startup.py for the import-time budget)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
 
 TUNGCART_DB = {
     "dbname": os.getenv("DB_NAME", ":) Your DB Name Here :)"),
@@ -17,11 +20,55 @@ TUNGCART_DB = {
     "host": os.getenv("DB_HOST", ":) Your DC Host Here :)"),
     "port": int(os.getenv("DB_PORT", 5432))  #5432 (default, but you can write your db port)
 }
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 0))  #0 = single connection, >0 = pooled connections
+USE_DB = os.getenv("TUNGSHOOP_DB", "on").lower() not in ("off", "0", "no")  #off = run without audit logging
+LOGS_PARTITIONED = os.getenv("LOGS_PARTITIONED", "0") not in ("", "0")  #1 = new logs tables are partitioned by month
+CART_STORAGE = os.getenv("CART_STORAGE", "json")  #json (jsons/*.json files), binary (same files, binary snapshots), sqlite (one WAL database) or memory
+CART_STORAGE_PATH = os.getenv("CART_STORAGE_PATH") or None  #json: directory, sqlite: database file
+CATALOG_FILE = os.getenv("CATALOG_FILE", "jsons/infoProducts.json")  #JSON, or a binary snapshot made with python -m cart.binfmt
+CATALOG_WATCH = float(os.getenv("CATALOG_WATCH", 0.5))  #seconds between catalog file checks, 0 = no hot reload
+PROMOTIONS_FILE = os.getenv("PROMOTIONS_FILE", "jsons/promotions.json")  #discount rules, see cart/promotions.py (no file = no promotions)
+
+def open_db(pool_size: int = DB_POOL_SIZE, lazy: bool = True):
+    # never blocks startup: the connection is opened by the background writer on the first logged action,
+    # and a missing driver just turns audit logging off
+    if not USE_DB:
+        return None
+    try:
+        from database.logger import DBLogger
+    except ImportError as e:
+        print(f"⚠️ Audit logging is off, the database driver is not installed ({e}).")
+        return None
+    return DBLogger(TUNGCART_DB, async_mode=True, pool_size=pool_size, lazy_connect=lazy, partition_logs=LOGS_PARTITIONED)
+
+def close_db(db) -> None:
+    if db is not None:
+        db.close()
+
+def open_promotions():
+    if not os.path.exists(PROMOTIONS_FILE):
+        return None
+    from cart.promotions import load_promotions
+    try:
+        return load_promotions(PROMOTIONS_FILE)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Promotions are off, '{PROMOTIONS_FILE}' could not be loaded ({e}).")
+        return None
 
 #--------------------------- OPTIONAL (CLI-SECTON) ---------------------------#
+def _ask_price(prompt: str):
+    raw = input(prompt).strip()
+    return float(raw) if raw else None
+
 def run_cli():
-    db = DBLogger(TUNGCART_DB)
-    cart = ShoppingCart(db_logger=db)
+    db = open_db()
+    cart = ShoppingCart(catalog_file=CATALOG_FILE, db_logger=db, storage=open_storage(CART_STORAGE, CART_STORAGE_PATH, CATALOG_FILE),
+                        promotions=open_promotions())
+    watcher = None
+    if CATALOG_WATCH > 0:
+        watcher = CatalogWatcher(CATALOG_FILE, cart.catalog, stock_lock=cart._lock)  # the poller thread vs. the prompt
+        watcher.subscribe(cart.cart_id, cart.apply_catalog_changes)
+        watcher.start(CATALOG_WATCH)
     while True:
         print("\n=*=*=*=*=*= Tungshoop SHOPPING CART MENU =*=*=*=*=*=")
         print("1. View Products")
@@ -31,7 +78,10 @@ def run_cli():
         print("5. Remove Item from Cart")
         print("6. Clear Cart")
         print("7. Checkout")
-        print("8. Exit")
+        print("8. Search Products")
+        print("9. Import Cart from File")
+        print("10. Stats")
+        print("11. Exit")
         choice = input("Please, Enter your choice here: ")
         if choice == "1":
             print("💨'View Products' Selected. Let's check the Products!")
@@ -65,11 +115,46 @@ def run_cli():
         elif choice == "7":
             print("💨'Checkout' Selected. Checkout the Cart!")
             cart.display_cart()
-            print("💳 Checkout complete. Thank you for shopping with us!")
-            cart.clear_cart()
+            cart.checkout()
         elif choice == "8":
+            print("💨'Search Products' Selected. Leave a field blank to skip it!")
+            text = input("Name or ID starts with: ").strip() or None
+            ptype = input("Type (physical/digital/generic): ").strip().lower() or None
+            try:
+                min_price = _ask_price("Min Price: ")
+                max_price = _ask_price("Max Price: ")
+                only_stock = input("Only in stock? (y/N): ").strip().lower() == "y"
+                found = cart.search(text=text, min_price=min_price, max_price=max_price, ptype=ptype,
+                                    in_stock=True if only_stock else None)
+            except ValueError as e:
+                print(f"❌ Ooopsss.. {e}")
+                continue
+            if not found:
+                print("🔍 No products matched your search.")
+            for product in found:
+                print(product.display_details())
+        elif choice == "9":
+            print("💨'Import Cart from File' Selected. Load many items at once from a JSON/CSV file!")
+            path = input("Enter file path (.json or .csv): ").strip()
+            try:
+                cart.import_file(path)
+            except (OSError, ValueError) as e:
+                print(f"❌ Ooopsss.. Could not import '{path}': {e}")
+        elif choice == "10":
+            print("💨'Stats' Selected. Here is where the time goes!")
+            print(METRICS.summary())
+            if db is None:
+                print("\nDB: audit logging is off.")
+                continue
+            s = db.stats()
+            print(f"\nDB: {s['calls']} round trips, avg {s['avg_latency'] * 1000:.2f} ms, max {s['max_latency'] * 1000:.2f} ms, "
+                  f"{s['failures']} failures, {s['reconnects']} reconnects, {s['queued']} queued")
+        elif choice == "11":
             print("💨'Exit' Selected. See you later, right?!")
             print("👋 Exiting... Have a great day! Come again!")
+            if watcher is not None:
+                watcher.stop()
+            close_db(db)
             break
         else:
             print("⚠️ Invalid choice, please try again..!")
@@ -77,21 +162,80 @@ def run_cli():
 
 #--------------------------- OPTIONAL (CLI-SECTON) ---------------------------#
 
+def run_server(host: str, port: int):
+    import asyncio
+    from server.server import CartServer
+    db = open_db(pool_size=max(DB_POOL_SIZE, 4))
+    storage = None
+    if CART_STORAGE != "json" or CART_STORAGE_PATH:
+        storage = open_storage(CART_STORAGE, CART_STORAGE_PATH or ("jsons/sessions" if CART_STORAGE == "binary" else None))
+    server = CartServer(catalog_file=CATALOG_FILE, db_logger=db, inventory_db=os.getenv("INVENTORY_DB") or None, storage=storage,
+                        promotions=open_promotions())
+    try:
+        asyncio.run(server.serve(host, port, watch_interval=CATALOG_WATCH))
+    except KeyboardInterrupt:
+        print("👋 Server stopped.")
+    finally:
+        close_db(db)
+
+def run_migrate_logs():
+    # one-off: backfill logged_at and build the reporting indexes without blocking running writers
+    db = open_db(lazy=False)
+    if db is None:
+        return
+    try:
+        result = db.migrate()
+        print(f"Indexes built: {', '.join(result['indexes_built']) or 'none (already up to date)'}")
+    finally:
+        close_db(db)
+
 def run_gui():
-    db = DBLogger(TUNGCART_DB)
-    cart = ShoppingCart(db_logger=db)
+    import tkinter as tk
+    from gui.gui import GUI
+    from uis.themes import ThemeState
+    db = open_db()
+    cart = ShoppingCart(catalog_file=CATALOG_FILE, db_logger=db, storage=open_storage(CART_STORAGE, CART_STORAGE_PATH, CATALOG_FILE),
+                        promotions=open_promotions())
     theme = ThemeState()
     root = tk.Tk()
-    GUI(root, cart, theme)
+    gui = GUI(root, cart, theme, watcher=CatalogWatcher(CATALOG_FILE, cart.catalog, stock_lock=cart._lock) if CATALOG_WATCH > 0 else None)
     root.mainloop()
+    gui.exports.shutdown()
+    close_db(db)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Tungshoop – Shopping Cart")
     parser.add_argument("--cli", action="store_true", help="Run in CLI mode instead of GUI")
+    parser.add_argument("--serve", action="store_true", help="Run the multi-session HTTP cart server")
+    parser.add_argument("--host", default="127.0.0.1", help="Server bind address (with --serve)")
+    parser.add_argument("--port", type=int, default=8080, help="Server port (with --serve)")
+    parser.add_argument("--metrics", action="store_true", help="Collect timings and counters (also TUNGSHOOP_METRICS=1)")
+    parser.add_argument("--metrics-file", help="Write metrics here on exit (.json = JSON, otherwise Prometheus text)")
+    parser.add_argument("--events", choices=EVENT_MODES, help="Cart messages as emoji text, JSON lines, or off")
+    parser.add_argument("--no-db", action="store_true", help="Run without the PostgreSQL audit log (also TUNGSHOOP_DB=off)")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, help="Cart state backend (also CART_STORAGE)")
+    parser.add_argument("--migrate-logs", action="store_true", help="Upgrade the audit log table (logged_at + indexes) and exit")
     args = parser.parse_args()
 
-    if args.cli:
+    if args.no_db:
+        USE_DB = False
+    if args.storage:
+        CART_STORAGE = args.storage
+
+    if args.metrics or args.metrics_file:
+        METRICS.enable()
+    if args.events:
+        configure_events(args.events)
+    if args.metrics_file:
+        import atexit
+        atexit.register(METRICS.dump, args.metrics_file)
+
+    if args.migrate_logs:
+        run_migrate_logs()
+    elif args.serve:
+        run_server(args.host, args.port)
+    elif args.cli:
         run_cli()
     else:
         run_gui()
@@ -0,0 +1,14 @@
+import shutil
+import pytest
+from metrics.metrics import configure_events
+
+@pytest.fixture(autouse=True)
+def quiet_events():
+    configure_events("off")
+    yield
+    configure_events("text")
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    # a private copy of the shipped catalog (P001: 10 in stock), so a test may rewrite it
+    return str(shutil.copy("jsons/infoProducts.json", tmp_path / "infoProducts.json"))
@@ -0,0 +1,49 @@
+from cart.audit import rebuild_state
+from cart.cart import ShoppingCart
+from cart.product import Product
+from cart.promotions import PromotionEngine
+from cart.storage import MemoryStorage
+
+class ListLogger:
+    def __init__(self):
+        self.records = []
+
+    def log_action(self, action, status, cart_state):
+        self.records.append(cart_state)
+
+def test_rebuild_matches_cart_total(catalog_file):
+    db = ListLogger()
+    cart = ShoppingCart(catalog_file, cart_id="a", storage=MemoryStorage(), db_logger=db)
+    cart.add_item("P001", 2)
+    cart.add_item("P002", 1)
+    cart.update_quantity("P001", 1)
+    state = rebuild_state(db.records)
+    assert state["total"] == cart.get_total()
+    assert {it["product_id"]: it["quantity"] for it in state["items"]} == {"P001": 1, "P002": 1}
+    assert [r["seq"] for r in db.records] == list(range(len(db.records)))
+
+def test_checkpoint_uses_cart_shipping_rule(catalog_file):
+    db = ListLogger()
+    cart = ShoppingCart(catalog_file, cart_id="a", storage=MemoryStorage(), db_logger=db)
+    # a plain Product with a shipping cost is not charged shipping by the cart
+    cart.catalog["X1"] = Product("X1", "Gift card", 50.0, 5, shipping_cost=7.5)
+    cart.add_item("X1", 1)  # seq 0 carries the checkpoint
+    cart.add_item("X1", 1)
+    assert "checkpoint" in db.records[0]
+    assert rebuild_state(db.records[:1]) == {"items": [{"product_id": "X1", "name": "Gift card", "quantity": 1,
+                                                        "price": 50.0, "shipping": 0.0, "subtotal": 50.0}], "total": 50.0}
+    assert rebuild_state(db.records)["total"] == cart.get_total() == 100.0
+
+def test_rebuild_applies_recorded_discounts(catalog_file):
+    engine = PromotionEngine([
+        {"id": "LAPTOP10", "type": "percent", "percent": 10, "products": ["P001"]},
+        {"id": "SHIP", "type": "threshold", "min_total": 20000, "free_shipping": True},
+    ])
+    db = ListLogger()
+    cart = ShoppingCart(catalog_file, cart_id="a", storage=MemoryStorage(), db_logger=db, promotions=engine)
+    cart.add_item("P001", 3)
+    cart.add_item("P002", 1)
+    state = rebuild_state(db.records)
+    assert cart.get_discount() > 0
+    assert state["total"] == cart.get_total()
+    assert state["discount"] == cart.get_discount()
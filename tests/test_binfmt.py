@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from cart.binfmt import CART_MAGIC, CATALOG_MAGIC, BinaryCatalog, sniff, to_binary, to_json, write_catalog
+from cart.catalog import load_catalog, product_from_dict
+from cart.inventory import ReservationEngine
+from cart.watcher import CatalogWatcher
+
+def rows_of(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def products(path):
+    # what the catalog loads from the rows (ints become floats, digital products get shipping 0)
+    out = []
+    for row in rows_of(path):
+        d = product_from_dict(row).to_dict()
+        d.pop("license_key", None)
+        out.append(d)
+    return out
+
+def test_catalog_round_trip(catalog_file, tmp_path):
+    binary, back = str(tmp_path / "catalog.bin"), str(tmp_path / "back.json")
+    assert to_binary(catalog_file, binary) == "catalog"
+    assert sniff(binary) == CATALOG_MAGIC == b"TSCAT\x00\x02\x00"
+    assert to_json(binary, back) == "catalog"
+    assert products(back) == products(catalog_file)
+
+def test_cart_round_trip(tmp_path):
+    src, binary, back = tmp_path / "cart.json", str(tmp_path / "cart.bin"), str(tmp_path / "back.json")
+    src.write_text(json.dumps([{"product_id": "P001", "quantity": 2}, {"product_id": "Ürün-9", "quantity": 1}]), encoding="utf-8")
+    assert to_binary(str(src), binary) == "cart"
+    assert sniff(binary) == CART_MAGIC
+    assert to_json(binary, back) == "cart"
+    assert rows_of(back) == rows_of(src)
+
+def test_find_every_id(catalog_file, tmp_path):
+    binary = str(tmp_path / "catalog.bin")
+    to_binary(catalog_file, binary)
+    catalog = BinaryCatalog(binary)
+    try:
+        ids = [row["product_id"] for row in rows_of(catalog_file)]
+        assert list(catalog) == ids
+        for i, pid in enumerate(ids):
+            assert catalog._find(pid) == i
+        assert catalog._find("P000") is None and catalog._find("ZZZ") is None and "nope" not in catalog
+    finally:
+        catalog.close()
+
+def test_watcher_reloads_a_binary_catalog(catalog_file, tmp_path):
+    binary = str(tmp_path / "catalog.bin")
+    to_binary(catalog_file, binary)
+    catalog = load_catalog(binary)
+    engine = ReservationEngine(catalog)
+    watcher = CatalogWatcher(binary, catalog, inventory=engine)
+    held = catalog["P001"]
+    assert engine.reserve("a", "P001", 4)
+    source = load_catalog(catalog_file)
+    source["P001"]._price = 100.0
+    source["P001"]._quantity_available = 15
+    write_catalog(source, binary, fsync=False)
+    assert watcher.poll() == ({"P001"}, set())
+    assert catalog["P001"] is held
+    assert (held._price, held._quantity_available) == (100.0, 11)
+    catalog.close()
+
+def test_threads_share_one_object_per_id(catalog_file, tmp_path, monkeypatch):
+    binary = str(tmp_path / "catalog.bin")
+    to_binary(catalog_file, binary)
+    build = BinaryCatalog._build
+
+    def slow_build(self, i):
+        time.sleep(0.002)  # widens the window between the lookup and the insert
+        return build(self, i)
+
+    monkeypatch.setattr(BinaryCatalog, "_build", slow_build)
+    catalog = BinaryCatalog(binary)
+    ids = list(catalog)
+    seen = [[] for _ in range(8)]
+    barrier = threading.Barrier(8)
+
+    def worker(k):
+        barrier.wait()
+        seen[k] = [catalog[pid] for pid in ids]
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for objects in zip(*seen):
+        assert all(p is objects[0] for p in objects)
+    catalog.close()
+
+def test_cache_is_bounded_and_keeps_modified_products(catalog_file, tmp_path):
+    binary = str(tmp_path / "catalog.bin")
+    to_binary(catalog_file, binary)
+    catalog = BinaryCatalog(binary, cache_size=2)
+    engine = ReservationEngine(catalog)
+    held = catalog["P001"]
+    assert engine.reserve("a", "P001", 3)
+    for pid in catalog:
+        catalog[pid]
+    assert len(catalog._cache) == 2
+    assert catalog["P001"] is held and catalog.stock("P001") == 7
+    catalog.close()
@@ -0,0 +1,50 @@
+import threading
+from uis.cache import ExportCache
+
+def render(tmp_path, name, body="receipt"):
+    path = tmp_path / name
+    path.write_text(body, encoding="utf-8")
+    return str(path)
+
+def test_concurrent_puts_of_one_key(tmp_path):
+    cache = ExportCache(str(tmp_path / "cache"))
+    key = cache.key("digest", "save_pdf")
+    sources = [render(tmp_path, f"s{i}.pdf") for i in range(16)]
+    errors, barrier = [], threading.Barrier(len(sources))
+    def put(src):
+        barrier.wait()
+        try:
+            assert cache.put(key, src) is not None
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=put, args=(src,)) for src in sources]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["bytes"] == len("receipt")
+    assert [p.name for p in (tmp_path / "cache").iterdir()] == [f"{key}.pdf"]
+
+def test_hit_copies_the_cached_render(tmp_path):
+    cache = ExportCache(str(tmp_path / "cache"))
+    calls = []
+    def save_json(snapshot, filename):
+        calls.append(filename)
+        return render(tmp_path, filename, "rendered")
+    snapshot = {"items": [], "total": 0}
+    first = cache.export(save_json, snapshot, str(tmp_path / "a.json"))
+    second = cache.export(save_json, snapshot, str(tmp_path / "b.json"))
+    assert len(calls) == 1
+    assert open(first).read() == open(second).read() == "rendered"
+    assert cache.stats()["hits"] == 1
+
+def test_eviction_keeps_the_byte_budget(tmp_path):
+    cache = ExportCache(str(tmp_path / "cache"), max_bytes=20)
+    for i in range(5):
+        cache.put(cache.key(str(i), "save_csv"), render(tmp_path, f"{i}.csv", "x" * 8))
+    stats = cache.stats()
+    assert stats["bytes"] <= 20 and stats["entries"] == 2 and stats["evictions"] == 3
+    assert cache.get(cache.key("0", "save_csv")) is None
+    assert cache.get(cache.key("4", "save_csv")) is not None
@@ -0,0 +1,21 @@
+import pytest
+from cart.cart import ShoppingCart
+from cart.storage import MemoryStorage
+
+@pytest.fixture(params=["lazy", "columnar"])
+def backend(request):
+    return request.param
+
+def test_restored_line_moves_stock_after_its_product_was_evicted(catalog_file, backend):
+    storage = MemoryStorage()
+    storage.save_cart("a", {"P001": 1})
+    cart = ShoppingCart(catalog_file, cart_id="a", storage=storage, catalog_backend=backend, catalog_cache_size=1)
+    line = cart._items["P001"]._product
+    cart.catalog["P002"], cart.catalog["P003"]  # the clean P001 falls out of the cache
+    assert cart.catalog.resident("P001") is None
+    assert cart.update_quantity("P001", 4)
+    assert cart.catalog["P001"]._quantity_available == 7
+    cart.catalog["P002"], cart.catalog["P003"]
+    assert cart.update_quantity("P001", 2)
+    assert cart.catalog["P001"]._quantity_available == 9
+    assert line._quantity_available == 10  # the evicted object the line held was never the one moved
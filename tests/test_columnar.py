@@ -0,0 +1,32 @@
+from cart.columnar import ColumnarCatalog
+from cart.pricing import PriceBook
+from cart.search import CatalogIndex
+
+def rows(n):
+    return [{"product_id": f"P{i:04d}", "name": f"Item {i}", "price": 10 + i, "quantity_available": 5,
+             "type": "physical" if i % 2 else "digital", "download_link": "https://example.com"} for i in range(n)]
+
+def test_cache_stays_bounded():
+    catalog = ColumnarCatalog(rows(100), cache_size=8)
+    for pid in catalog:
+        catalog[pid]
+    assert len(catalog.resident_ids()) == 8
+
+def test_scans_do_not_build_products():
+    catalog = ColumnarCatalog(rows(100), cache_size=8)
+    index = CatalogIndex(catalog)
+    PriceBook(catalog)
+    list(catalog.values())
+    assert catalog.resident_ids() == []
+    assert index.search("item 42") == ["P0042"]
+    assert len(index.search(ptype="digital", limit=None)) == 50
+
+def test_modified_products_outlive_the_lru():
+    catalog = ColumnarCatalog(rows(100), cache_size=8)
+    held = catalog["P0001"]
+    assert held.decrease_quantity(2)
+    for pid in catalog:
+        catalog[pid]
+    assert catalog["P0001"] is held
+    assert catalog.stock("P0001") == 3
+    assert "P0001" in CatalogIndex(catalog).search("item", in_stock=True, limit=None)
@@ -0,0 +1,354 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+import pytest
+from cart.audit import rebuild_state
+
+psycopg2 = pytest.importorskip("psycopg2")
+from database.logger import DBLogger, _INDEXES  # noqa: E402
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = self.connection = conn
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mogrify(self, template, args):
+        # enough for psycopg2.extras.execute_values, which joins these into one INSERT
+        return repr(tuple(args)).encode()
+
+    def execute(self, sql, params=None):
+        sql = sql.decode() if isinstance(sql, bytes) else sql
+        conn = self.conn
+        if conn.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        if conn.server.fail:
+            # what a restarted server or a dropped socket looks like: the call fails and the connection is dead
+            conn.server.fail -= 1
+            conn.closed = 2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        conn.server.executed.append((sql, params))
+        if conn.autocommit:
+            conn.server.autocommitted.append(sql)
+        if conn.server.latency:
+            time.sleep(conn.server.latency)
+        self._rows = conn.server.answer(sql)
+        self.rowcount = len(self._rows)  # an UPDATE is answered with one placeholder per row it touched
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = 0
+        self.autocommit = False
+        self.encoding = "UTF8"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+class FakeServer:
+    # answers DBLogger's schema checks as an up-to-date database would; tests script failures and extra answers
+    def __init__(self):
+        self.fail = 0
+        self.latency = 0.0
+        self.executed = []
+        self.autocommitted = []
+        self.connections = []
+        self.answers = {}
+
+    def connect(self, **config):
+        conn = FakeConnection(self)
+        self.connections.append(conn)
+        return conn
+
+    def answer(self, sql):
+        for needle, rows in self.answers.items():
+            if needle in sql:
+                return rows
+        if "FROM pg_class" in sql:
+            return [("r",)]
+        if "FROM pg_attribute" in sql:
+            return [(1,)]
+        if "SELECT count(*) FROM pg_index" in sql:
+            return [(len(_INDEXES),)]
+        if "min(id), max(id)" in sql:
+            return [(None, None)]  # an empty table
+        return []
+
+    def statements(self, start=0):
+        # one line per statement, whitespace collapsed, so tests can compare SQL text
+        return [" ".join(sql.split()) for sql, _ in self.executed[start:]]
+
+class FakePool:
+    # psycopg2.pool.ThreadedConnectionPool: connections are reused unless returned with close=True
+    def __init__(self, server, minconn, maxconn, **config):
+        self.server = server
+        self.maxconn = maxconn
+        self.idle = []
+        self.out = set()
+        self.returned = []
+        self.most_out = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        with self._lock:
+            if len(self.out) >= self.maxconn:
+                raise psycopg2.pool.PoolError("connection pool exhausted")
+            conn = self.idle.pop() if self.idle else self.server.connect()
+            self.out.add(conn)
+            self.most_out = max(self.most_out, len(self.out))
+            return conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            self.out.remove(conn)
+            self.returned.append(close)
+            if close:
+                conn.close()
+            else:
+                self.idle.append(conn)
+
+    def closeall(self):
+        self.closed = True
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(psycopg2, "connect", server.connect)
+    return server
+
+@pytest.fixture
+def pools(monkeypatch, server):
+    created = []
+    def make(minconn, maxconn, **config):
+        created.append(FakePool(server, minconn, maxconn, **config))
+        return created[-1]
+    monkeypatch.setattr(psycopg2.pool, "ThreadedConnectionPool", make)
+    return created
+
+class Database:
+    # stands in for DBLogger._write_rows: refuses every batch while down
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    def write(self, rows):
+        if self.down:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.rows.extend(rows)
+
+@pytest.fixture
+def database(monkeypatch):
+    db = Database()
+    monkeypatch.setattr(DBLogger, "_write_rows", db.write)
+    return db
+
+def test_spill_from_an_outage_is_replayed_by_the_running_writer(database, tmp_path):
+    logger = DBLogger({}, async_mode=True, lazy_connect=True, batch_size=10, flush_interval=0.05,
+                      spill_file=str(tmp_path / "spill.ndjson"), spill_replay_interval=0)
+    try:
+        database.down = True
+        for i in range(3):
+            logger.log_action("add_item", "success", {"cart_id": "a", "seq": i})
+        assert logger.flush(timeout=5)
+        assert logger.spilled == 3 and not database.rows
+        database.down = False
+        logger.log_action("add_item", "success", {"cart_id": "a", "seq": 3})
+        assert logger.flush(timeout=5)
+        assert sorted(row[5] for row in database.rows) == sorted(f'{{"cart_id": "a", "seq": {i}}}' for i in range(4))
+        assert not logger._spill_file.pending()
+    finally:
+        logger.close()
+
+def test_transient_error_is_retried_on_a_new_connection(server):
+    logger = DBLogger({}, retries=2, retry_backoff=0)
+    assert len(server.connections) == 1  # opened and checked the schema at startup
+    server.fail = 1
+    assert logger.healthy()
+    assert len(server.connections) == 2 and server.connections[0].closed
+    assert server.executed[-1] == ("SELECT 1", None)
+    stats = logger.stats()
+    assert (stats["failures"], stats["reconnects"], stats["calls"]) == (1, 1, 2)
+
+def test_retries_give_up_after_the_last_attempt(server):
+    logger = DBLogger({}, retries=2, retry_backoff=0)
+    server.fail = 3
+    assert not logger.healthy()
+    assert logger.stats()["failures"] == 3
+    server.fail = 3
+    with pytest.raises(psycopg2.OperationalError):
+        logger.log_action("add_item", "success", {"cart_id": "a"})
+    server.fail = 0
+    assert logger.healthy()
+    assert logger.stats()["failures"] == 6
+
+def test_lazy_connect_waits_for_the_first_write(server):
+    logger = DBLogger({}, lazy_connect=True)
+    assert not server.connections
+    assert logger.healthy()
+    assert len(server.connections) == 1 and any("pg_class" in sql for sql, _ in server.executed)
+
+def test_pool_returns_every_connection(server, pools):
+    logger = DBLogger({}, pool_size=2, retries=1, retry_backoff=0)
+    pool, = pools
+    for _ in range(5):
+        assert logger.healthy()
+    assert not pool.out and set(pool.returned) == {False}
+    assert len(server.connections) == 1  # reused, not reopened
+    with pytest.raises(ZeroDivisionError):
+        logger._run(lambda cur: 1 / 0)  # not a connection problem: the connection goes back as is
+    assert not pool.out and pool.returned[-1] is False
+    assert logger.stats()["reconnects"] == 0
+    logger.close()
+    assert pool.closed
+
+def test_pool_closes_a_broken_connection_and_counts_the_reconnect(server, pools):
+    logger = DBLogger({}, pool_size=2, retries=1, retry_backoff=0)
+    pool, = pools
+    server.fail = 1
+    assert logger.healthy()
+    assert pool.returned[-2:] == [True, False]
+    assert server.connections[0].closed and not server.connections[1].closed
+    assert not pool.out and pool.idle == [server.connections[1]]
+    stats = logger.stats()
+    assert (stats["failures"], stats["reconnects"]) == (1, 1)
+
+def test_pool_checkouts_never_exceed_its_size(server, pools):
+    logger = DBLogger({}, pool_size=2, retries=0)
+    pool, = pools
+    server.latency = 0.01
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(logger.healthy())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [True] * 8  # callers past the pool size wait for a slot instead of hitting PoolError
+    assert pool.most_out == 2 and not pool.out
+
+#--------------------------- SCHEMA, MIGRATION AND REPORTING SQL ---------------------------#
+# what DBLogger sends, statement by statement; tests/test_postgres.py runs the same paths against a real server
+
+@pytest.fixture
+def events(monkeypatch):
+    seen = []
+    monkeypatch.setattr("database.logger.emit", lambda event, *args, **fields: seen.append(event))
+    return seen
+
+def test_new_table_gets_the_full_schema(server, events):
+    server.answers["FROM pg_class"] = []
+    DBLogger({})
+    sql = server.statements()
+    assert sql[1].startswith("CREATE TABLE logs (id BIGSERIAL PRIMARY KEY, computer_name TEXT, timestamp TEXT, logged_at timestamptz")
+    assert sql[2:2 + len(_INDEXES)] == [f"CREATE INDEX {name} {spec}" for name, spec in _INDEXES.items()]
+    assert not any("ALTER TABLE" in s for s in sql)
+    assert "db_migration_pending" not in events
+
+def test_new_partitioned_table_gets_monthly_partitions(server, events):
+    server.answers["FROM pg_class"] = []
+    DBLogger({}, partition_logs=True, partitions_ahead=2)
+    sql = server.statements()
+    assert sql[1].endswith("PRIMARY KEY (id, logged_at)) PARTITION BY RANGE (logged_at)")
+    assert sql[2] == "CREATE TABLE logs_default PARTITION OF logs DEFAULT"
+    partitions = [s for s in sql if s.startswith("CREATE TABLE IF NOT EXISTS logs_y")]
+    assert len(partitions) == 3 == sql.count("SAVEPOINT partition")
+    first = date.today().replace(day=1)
+    assert partitions[0] == (f"CREATE TABLE IF NOT EXISTS logs_y{first:%Y}m{first:%m} PARTITION OF logs "
+                             f"FOR VALUES FROM ('{first.isoformat()}') TO ('{(first + timedelta(days=32)).replace(day=1).isoformat()}')")
+
+def test_legacy_table_only_gets_the_column_and_a_warning(server, events):
+    server.answers["FROM pg_attribute"] = []
+    server.answers["SELECT count(*) FROM pg_index"] = [(0,)]
+    DBLogger({})
+    sql = server.statements()
+    assert "ALTER TABLE logs ADD COLUMN logged_at timestamptz" in sql
+    assert "ALTER TABLE logs ALTER COLUMN logged_at SET DEFAULT now()" in sql
+    assert not any(s.startswith(("CREATE INDEX", "UPDATE")) for s in sql)  # left to migrate()
+    assert events.count("db_migration_pending") == 1
+
+def test_migrate_backfills_in_batches_then_builds_missing_indexes_concurrently(server, events):
+    logger = DBLogger({})
+    start = len(server.executed)
+    server.answers["SELECT min(id), max(id) FROM logs"] = [(1, 5)]
+    server.answers["UPDATE logs SET logged_at"] = [None, None]
+    server.answers["i.indisvalid"] = [("logs_logged_at_brin",), ("logs_failures",)]
+    result = logger.migrate(batch_size=2)
+    updates = [params for sql, params in server.executed[start:] if sql.lstrip().startswith("UPDATE")]
+    assert updates == [(1, 3), (3, 5), (5, 7)]
+    assert result == {"backfilled": 6, "indexes_built": ["logs_action_logged_at", "logs_cart_logged_at"]}
+    built = [s for name in result["indexes_built"] for s in
+             (f"DROP INDEX CONCURRENTLY IF EXISTS {name}", f"CREATE INDEX CONCURRENTLY {name} {_INDEXES[name]}")]
+    assert [s for s in server.statements(start) if "INDEX" in s and "pg_index" not in s] == built
+    assert server.autocommitted[-1] == "ANALYZE logs"
+    assert all(sql in server.autocommitted for sql in built)  # CONCURRENTLY cannot run in a transaction block
+    assert not logger.conn.autocommit  # restored for the writes that follow
+    assert "db_migrated" in events
+
+def test_migrate_on_a_partitioned_table_builds_plain_indexes(server, events):
+    logger = DBLogger({})
+    server.answers["FROM pg_class"] = [("p",)]
+    result = logger.migrate()
+    assert result == {"backfilled": 0, "indexes_built": list(_INDEXES)}
+    assert f"CREATE INDEX logs_failures {_INDEXES['logs_failures']}" in server.statements()
+    assert not any("CONCURRENTLY" in s for s in server.statements())
+
+def test_reporting_queries_filter_on_logged_at(server):
+    logger = DBLogger({})
+    start, end = datetime(2026, 1, 1), datetime(2026, 2, 1)
+    server.answers["SELECT id, computer_name"] = [(7, "host", start, "add_item", "success", {"cart_id": "a"})]
+    assert logger.events_between(start, end, action="add_item") == [
+        {"id": 7, "computer_name": "host", "logged_at": start, "action": "add_item", "status": "success", "cart_state": {"cart_id": "a"}}]
+    sql, params = server.executed[-1]
+    assert "WHERE logged_at >= %(start)s AND logged_at < %(end)s" in sql and "ORDER BY logged_at, id" in sql
+    assert params == {"start": start, "end": end, "action": "add_item", "status": None, "host": None, "limit": 1000}
+
+    server.answers["GROUP BY action, status"] = [("add_item", "success", 3)]
+    assert logger.action_counts(start, end) == [{"action": "add_item", "status": "success", "count": 3}]
+    assert server.executed[-1][1] == (start, end)
+    server.answers["date_trunc"] = [(start, "add_item", "failed", 2)]
+    assert logger.action_counts(start, end, bucket="day") == [{"bucket": start, "action": "add_item", "status": "failed", "count": 2}]
+    assert server.executed[-1][1] == ("day", start, end)
+    sent = len(server.executed)
+    with pytest.raises(ValueError):
+        logger.action_counts(start, end, bucket="fortnight")  # never reaches date_trunc
+    assert len(server.executed) == sent
+
+    server.answers["FILTER (WHERE status <> 'success')"] = [("add_item", 4, 1), ("clear_cart", 0, 0)]
+    assert logger.failure_rate(start, end) == {"add_item": {"total": 4, "failed": 1, "rate": 0.25},
+                                               "clear_cart": {"total": 0, "failed": 0, "rate": 0.0}}
+    assert server.executed[-1][1] == {"start": start, "end": end, "action": None}
+
+def test_rebuild_cart_state_replays_from_the_last_checkpoint(server):
+    logger = DBLogger({})
+    at = datetime(2026, 1, 1, 12)
+    server.answers["FROM logs WHERE id = %s"] = [("host", "a", at, 1)]
+    line = {"product_id": "P001", "name": "Gaming Laptop", "quantity": 1, "price": 25999, "shipping": 999}
+    server.answers["WITH history AS"] = [({"cart_id": "a", "seq": 0, "checkpoint": {"items": [line]}},),
+                                         ({"cart_id": "a", "seq": 1, "changes": [{**line, "old_qty": 1, "new_qty": 2}]},)]
+    assert logger.rebuild_cart_state(42)["total"] == 2 * 25999 + 999
+    sql, params = server.executed[-1]
+    assert params == {"host": "host", "cart": "a", "at": at, "seq": 1, "id": 42}
+    assert "ORDER BY logged_at, seq, id" in " ".join(sql.split())
+    server.answers["FROM logs WHERE id = %s"] = []
+    assert logger.rebuild_cart_state(43) == rebuild_state([])
@@ -0,0 +1,123 @@
+import time
+import pytest
+from cart.cart import ShoppingCart
+from cart.catalog import load_catalog
+from cart.inventory import MemoryInventoryStore, ReservationEngine, SQLiteInventoryStore
+from cart.storage import MemoryStorage
+
+@pytest.fixture(params=["memory", "sqlite"])
+def engine(request, catalog_file, tmp_path):
+    catalog = load_catalog(catalog_file)
+    store = MemoryInventoryStore(catalog) if request.param == "memory" else SQLiteInventoryStore(str(tmp_path / "inv.db"), catalog)
+    return ReservationEngine(catalog, store=store)
+
+def open_cart(catalog_file, engine, storage, cart_id="a"):
+    return ShoppingCart(catalog_file, cart_id=cart_id, catalog=engine.catalog, inventory=engine, storage=storage)
+
+def test_release_is_capped_at_the_reservation(engine):
+    assert engine.reserve("a", "P001", 3)
+    assert engine.release("a", "P001", 5) == 3
+    assert engine.catalog["P001"]._quantity_available == 10
+    assert engine.release("b", "P001", 4) == 0  # never reserved
+    assert engine.catalog["P001"]._quantity_available == 10
+
+def test_remove_after_expiry_does_not_create_stock(engine, catalog_file):
+    cart = open_cart(catalog_file, engine, MemoryStorage())
+    assert cart.add_item("P001", 2)
+    engine.unsubscribe("a")  # the store expires the hold behind the cart's back
+    engine.expire(now=float("inf"))
+    assert engine.catalog["P001"]._quantity_available == 10
+    assert cart.remove_item("P001")
+    assert engine.catalog["P001"]._quantity_available == 10
+
+def test_restored_cart_reserves_its_lines(engine, catalog_file):
+    storage = MemoryStorage()
+    storage.save_cart("a", {"P001": 4})
+    cart = open_cart(catalog_file, engine, storage)
+    assert engine.held("a", "P001") == 4
+    assert engine.catalog["P001"]._quantity_available == 6
+    assert cart.remove_item("P001")
+    assert engine.catalog["P001"]._quantity_available == 10
+
+def test_reopened_cart_keeps_its_existing_hold(engine, catalog_file):
+    storage = MemoryStorage()
+    assert open_cart(catalog_file, engine, storage).add_item("P001", 3)
+    open_cart(catalog_file, engine, storage)
+    assert engine.held("a", "P001") == 3
+    assert engine.catalog["P001"]._quantity_available == 7
+
+def test_restored_line_shrinks_when_the_stock_is_gone(engine, catalog_file):
+    storage = MemoryStorage()
+    storage.save_cart("a", {"P001": 4})
+    assert engine.reserve("other", "P001", 8)
+    cart = open_cart(catalog_file, engine, storage)
+    assert "P001" not in cart._items
+    assert storage.load_cart("a") == {}
+    assert engine.catalog["P001"]._quantity_available == 2
+
+def test_stock_listeners_only_hear_about_real_changes(engine, catalog_file):
+    cart = open_cart(catalog_file, engine, MemoryStorage())
+    seen = []
+    cart._stock_changed = seen.append
+    assert not cart.add_item("P001", 11)
+    assert not cart.update_quantity("P001", 3)
+    assert seen == []
+    assert cart.add_item("P001", 2)
+    assert seen == ["P001"]
+
+def test_removing_a_product_from_the_catalog_drops_its_holds(engine, catalog_file):
+    cart = open_cart(catalog_file, engine, MemoryStorage())
+    assert cart.add_item("P001", 2) and cart.add_item("P002", 1)
+    del engine.catalog["P001"]
+    cart.apply_catalog_changes(removed={"P001"})
+    assert "P001" not in cart._items
+    assert engine.held("a", "P001") == 0
+    engine.expire(now=float("inf"))  # must not trip over the missing product
+    assert engine.held("a", "P002") == 0
+
+def test_expire_skips_products_that_left_the_catalog(catalog_file):
+    catalog = load_catalog(catalog_file)
+    engine = ReservationEngine(catalog)
+    assert engine.reserve("a", "P001", 2) and engine.reserve("a", "P002", 1)
+    stock = catalog["P002"]._quantity_available
+    del catalog["P001"]
+    assert engine.expire(now=float("inf")) == {"a": [("P001", 2), ("P002", 1)]}
+    assert catalog["P002"]._quantity_available == stock + 1
+
+def test_reaper_survives_a_failing_pass(catalog_file):
+    engine = ReservationEngine(load_catalog(catalog_file))
+    calls = []
+    def expire(now=None):
+        calls.append(now)
+        raise RuntimeError("boom")
+    engine.expire = expire
+    engine.start_reaper(interval=0.01)
+    try:
+        deadline = time.monotonic() + 2
+        while len(calls) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        engine.stop_reaper()
+    assert len(calls) >= 3
+
+def test_clear_returns_the_stock_and_checkout_keeps_it_sold(engine, catalog_file):
+    cart = open_cart(catalog_file, engine, MemoryStorage())
+    assert cart.add_item("P001", 2)
+    cart.clear_cart()
+    assert engine.catalog["P001"]._quantity_available == 10
+    assert engine.held("a", "P001") == 0
+    assert cart.add_item("P001", 3)
+    receipt = cart.checkout()
+    assert receipt["items"][0]["quantity"] == 3 and not cart._items
+    assert engine.catalog["P001"]._quantity_available == 7
+    engine.expire(time.time() + 10**6)
+    assert engine.catalog["P001"]._quantity_available == 7  # sold units do not come back on expiry
+
+def test_clear_without_an_engine_returns_the_stock(catalog_file):
+    cart = ShoppingCart(catalog_file, cart_id="a", storage=MemoryStorage())
+    assert cart.add_item("P001", 2)
+    cart.clear_cart()
+    assert cart.catalog["P001"]._quantity_available == 10
+    assert cart.add_item("P001", 4)
+    cart.checkout()
+    assert cart.catalog["P001"]._quantity_available == 6
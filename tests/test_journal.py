@@ -0,0 +1,65 @@
+import json
+import pytest
+from cart.journal import CartJournal
+
+@pytest.fixture(params=[False, True], ids=["json", "binary"])
+def journal(request, tmp_path):
+    return CartJournal(str(tmp_path / "a.json"), compact_every=5, fsync=False, binary=request.param)
+
+def reopen(journal):
+    return CartJournal(str(journal._snapshot), compact_every=journal._compact_every, fsync=False, binary=journal._binary)
+
+def test_replay_applies_entries_in_order(journal):
+    journal.compact({"P1": 1})
+    journal.append([("P2", 2), ("P1", 3)])
+    journal.append([("P2", 0)])
+    journal.clear()
+    journal.append([("P3", 1)])
+    assert reopen(journal).load() == {"P3": 1}
+    assert journal._journal.stat().st_size == 0  # loading folded the journal into the snapshot
+
+def test_torn_tail_does_not_swallow_the_next_entry(journal):
+    journal.compact({"P1": 1})
+    with open(journal._journal, "a", encoding="utf-8") as f:
+        f.write('{"product_id": "P2", "qua')
+    j = reopen(journal)
+    assert j.load() == {"P1": 1}
+    j.append([("P3", 1)])
+    assert reopen(journal).load() == {"P1": 1, "P3": 1}
+
+def test_torn_tail_after_good_entries(journal):
+    journal.compact({})
+    journal.append([("P1", 2)])
+    with open(journal._journal, "ab") as f:
+        f.write('{"product_id": "Ü'.encode("utf-8")[:-1])  # cut inside a character
+    j = reopen(journal)
+    assert j.load() == {"P1": 2}
+    j.append([("P2", 1)])
+    assert reopen(journal).load() == {"P1": 2, "P2": 1}
+
+def test_corrupt_snapshot_is_moved_aside(journal, tmp_path):
+    journal._snapshot.write_bytes(b"[{not json")
+    journal.append([("P1", 4)])
+    assert reopen(journal).load() == {"P1": 4}
+    assert len(list(tmp_path.glob("a.json.corrupt-*"))) == 1
+    assert reopen(journal).load() == {"P1": 4}
+
+def test_compaction_threshold(journal):
+    journal.compact({})
+    journal.append([("P1", 1), ("P2", 1)])
+    assert not journal.needs_compaction(2)
+    assert journal.needs_compaction(3)
+    journal.compact({"P1": 1, "P2": 1})
+    assert not journal.needs_compaction(4)
+    assert journal._journal.stat().st_size == 0
+
+def test_storage_compacts_every_n_lines(tmp_path):
+    from cart.storage import JSONStorage
+    storage = JSONStorage(str(tmp_path), compact_every=3, fsync=False)
+    storage.load_cart("a")
+    for i in range(3):
+        storage.write_lines("a", [(f"P{i}", 1)])
+    assert (tmp_path / "a.json.journal").stat().st_size == 0
+    assert {row["product_id"] for row in json.loads((tmp_path / "a.json").read_text(encoding="utf-8"))} == {"P0", "P1", "P2"}
+    storage.write_lines("a", [("P0", 0)])
+    assert JSONStorage(str(tmp_path), fsync=False).load_cart("a") == {"P1": 1, "P2": 1}
@@ -0,0 +1,146 @@
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+from cart.cart import ShoppingCart  # noqa: E402
+from cart.storage import MemoryStorage  # noqa: E402
+from database.logger import DBLogger, _INDEXES  # noqa: E402
+
+# Runs the schema, --migrate-logs and reporting SQL against a real server. Point TUNGSHOOP_TEST_DSN at a scratch
+# database, e.g. TUNGSHOOP_TEST_DSN=postgresql://postgres@localhost/tungshoop_test; every test works in a schema
+# of its own that is dropped afterwards. Skipped when the variable is unset or the server cannot be reached.
+DSN = os.getenv("TUNGSHOOP_TEST_DSN")
+
+# the table as the first release created it, before logged_at and the indexes
+LEGACY_TABLE = """
+CREATE TABLE logs (
+    id SERIAL PRIMARY KEY,
+    computer_name TEXT,
+    timestamp TEXT,
+    action TEXT,
+    status TEXT,
+    cart_state JSONB
+)
+"""
+
+@pytest.fixture
+def pg():
+    if not DSN:
+        pytest.skip("TUNGSHOOP_TEST_DSN is not set")
+    try:
+        admin = psycopg2.connect(DSN, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not reachable: {e}")
+    admin.autocommit = True
+    schema = f"tungshoop_test_{uuid.uuid4().hex[:12]}"
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+    config = {"dsn": DSN, "options": f"-c search_path={schema}"}
+    try:
+        yield config
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+def _sql(config, query, params=None):
+    with psycopg2.connect(**config) as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall() if cur.description else None
+
+def _valid_indexes(config):
+    return {r[0] for r in _sql(config, "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                                       "WHERE i.indrelid = 'logs'::regclass AND i.indisvalid")}
+
+def _window():
+    now = datetime.now(timezone.utc)
+    return now - timedelta(hours=1), now + timedelta(hours=1)
+
+def test_new_table_logs_and_reports(pg):
+    logger = DBLogger(pg)
+    try:
+        assert set(_INDEXES) <= _valid_indexes(pg)
+        cart = ShoppingCart("jsons/infoProducts.json", cart_id="a", storage=MemoryStorage(), db_logger=logger)
+        cart.add_item("P001", 2)
+        cart.add_item("D001", 1)
+        cart.update_quantity("P001", 1)
+        assert not cart.add_item("P001", 999)
+        start, end = _window()
+        events = logger.events_between(start, end)
+        assert [e["action"] for e in events] == ["add_item", "add_item", "update_quantity", "add_item"]
+        assert [e["cart_state"]["seq"] for e in events] == [0, 1, 2, 3]
+        assert len(logger.events_between(start, end, action="add_item", status="success", limit=1)) == 1
+        assert logger.events_between(end, end + timedelta(hours=1)) == []
+
+        counts = {(c["action"], c["status"]): c["count"] for c in logger.action_counts(start, end)}
+        assert counts[("add_item", "success")] == 2 and counts[("update_quantity", "success")] == 1
+        assert sum(counts.values()) == 4
+        hourly = logger.action_counts(start, end, bucket="hour")
+        assert sum(c["count"] for c in hourly) == 4
+        assert all(c["bucket"].minute == 0 and c["bucket"].second == 0 for c in hourly)
+
+        rates = logger.failure_rate(start, end)
+        assert rates["add_item"] == {"total": 3, "failed": 1, "rate": 1 / 3}
+        assert rates["update_quantity"]["rate"] == 0.0
+        assert logger.failure_rate(start, end, action="update_quantity").keys() == {"update_quantity"}
+
+        state = logger.rebuild_cart_state(events[2]["id"])
+        assert state["total"] == cart.get_total()
+        assert {it["product_id"]: it["quantity"] for it in state["items"]} == {"P001": 1, "D001": 1}
+        assert logger.migrate() == {"backfilled": 0, "indexes_built": []}
+    finally:
+        logger.close()
+
+def test_migrate_upgrades_a_legacy_table(pg):
+    _sql(pg, LEGACY_TABLE)
+    stamps = [datetime(2026, 3, d, 10, 30, 5) for d in range(1, 6)]
+    for i, stamp in enumerate(stamps):
+        _sql(pg, "INSERT INTO logs (computer_name, timestamp, action, status, cart_state) VALUES (%s, %s, %s, %s, %s)",
+             ("host", stamp.strftime("%d/%m/%Y | %H:%M:%S"), "add_item", "success", f'{{"cart_id": "a", "n": {i}}}'))
+    _sql(pg, "INSERT INTO logs (computer_name, timestamp, action, status) VALUES ('host', 'garbled', 'add_item', 'failed')")
+    logger = DBLogger(pg)
+    try:
+        # startup only adds the column; rows written from now on get logged_at by default
+        assert _sql(pg, "SELECT count(*) FROM logs WHERE logged_at IS NULL") == [(6,)]
+        assert not set(_INDEXES) & _valid_indexes(pg)
+        result = logger.migrate(batch_size=2)
+        assert result == {"backfilled": 5, "indexes_built": list(_INDEXES)}
+        assert set(_INDEXES) <= _valid_indexes(pg)
+        assert _sql(pg, "SELECT timestamp FROM logs WHERE logged_at IS NULL") == [("garbled",)]
+        assert logger.migrate(batch_size=2) == {"backfilled": 0, "indexes_built": []}  # safe to re-run
+
+        start = datetime(2026, 3, 2).astimezone()
+        events = logger.events_between(start, start + timedelta(days=3))
+        assert [e["cart_state"]["n"] for e in events] == [1, 2, 3]
+        assert events[0]["logged_at"] == stamps[1].astimezone()
+    finally:
+        logger.close()
+
+def test_migrate_rebuilds_an_invalid_index(pg):
+    logger = DBLogger(pg)
+    try:
+        # what an interrupted CREATE INDEX CONCURRENTLY leaves behind
+        _sql(pg, "UPDATE pg_index SET indisvalid = false WHERE indexrelid = 'logs_failures'::regclass")
+        assert logger.migrate() == {"backfilled": 0, "indexes_built": ["logs_failures"]}
+        assert "logs_failures" in _valid_indexes(pg)
+    finally:
+        logger.close()
+
+def test_partitioned_table_routes_rows_to_the_monthly_partition(pg):
+    logger = DBLogger(pg, partition_logs=True, partitions_ahead=1)
+    try:
+        month = date.today().replace(day=1)
+        following = (month + timedelta(days=32)).replace(day=1)
+        partitions = {r[0] for r in _sql(pg, "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                                             "WHERE i.inhparent = 'logs'::regclass")}
+        assert partitions == {"logs_default", f"logs_y{month:%Y}m{month:%m}", f"logs_y{following:%Y}m{following:%m}"}
+        logger.log_action("add_item", "success", {"cart_id": "a", "seq": 0})
+        assert _sql(pg, "SELECT tableoid::regclass::text FROM logs") == [(f"logs_y{month:%Y}m{month:%m}",)]
+        start, end = _window()
+        assert logger.failure_rate(start, end) == {"add_item": {"total": 1, "failed": 0, "rate": 0.0}}
+        assert logger.migrate() == {"backfilled": 0, "indexes_built": []}
+        DBLogger(pg, partition_logs=True).close()  # a second start finds the partitions in place
+    finally:
+        logger.close()
@@ -0,0 +1,78 @@
+import json
+import pytest
+from cart.cart import ShoppingCart
+from cart.catalog import load_catalog
+from cart.promotions import PromotionEngine
+from cart.storage import MemoryStorage
+
+np = pytest.importorskip("numpy")
+from cart.pricing import CartBatch, PriceBook, price_carts, quote
+
+# the batch path (NumPy arrays) against the per-object path every ShoppingCart takes (no NumPy involved)
+STATES = {
+    "laptop": {"P001": 1},                         # physical: shipping per line
+    "mixed": {"P001": 2, "P002": 3, "D001": 1},    # P002 rounds half up to kuruş
+    "digital": {"D001": 2, "D004": 7},             # no shipping, bxgy on the e-book category
+    "small": {"P005": 1, "D004": 1},               # under every threshold
+}
+
+RULES = [
+    {"id": "LAPTOP10", "type": "percent", "percent": 10, "products": ["P001"]},
+    {"id": "KB50", "type": "fixed", "amount": 50, "products": ["P002"]},
+    {"id": "3FOR2", "type": "bxgy", "buy": 2, "get": 1, "category": "e-books"},
+    {"id": "BIG5", "type": "threshold", "min_total": 5000, "percent": 5},
+    {"id": "SHIP", "type": "threshold", "min_total": 20000, "free_shipping": True},
+]
+
+@pytest.fixture
+def catalog_file(catalog_file):
+    with open(catalog_file, encoding="utf-8") as f:
+        rows = json.load(f)
+    for row in rows:
+        if row["product_id"] == "P002":
+            row["price"] = 2499.995
+        if row["product_id"] == "D004":
+            row["category"] = "e-books"
+    with open(catalog_file, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+    return catalog_file
+
+def _carts(catalog_file, promotions):
+    carts = {}
+    for cart_id, lines in STATES.items():
+        cart = ShoppingCart(catalog_file, cart_id=cart_id, storage=MemoryStorage(), promotions=promotions)
+        for pid, qty in lines.items():
+            assert cart.add_item(pid, qty)
+        carts[cart_id] = cart
+    return carts
+
+@pytest.mark.parametrize("backend", ["memory", "columnar"])
+@pytest.mark.parametrize("with_promotions", [False, True])
+def test_quote_matches_cart_snapshots(catalog_file, backend, with_promotions):
+    promotions = PromotionEngine(RULES) if with_promotions else None
+    carts = _carts(catalog_file, promotions)
+    book = PriceBook(load_catalog(catalog_file, backend))
+    q = quote(book, CartBatch.from_states(book, STATES), promotions)
+    assert dict(zip(q.batch.cart_ids, q.total_minor.tolist())) == {cid: c._net_minor() for cid, c in carts.items()}
+    assert q.snapshots() == {cid: c.get_cart_snapshot() for cid, c in carts.items()}
+    assert price_carts(None, STATES, book, promotions) == {cid: c.get_total() for cid, c in carts.items()}
+
+def test_every_promotion_kind_is_exercised(catalog_file):
+    promotions = PromotionEngine(RULES)
+    book = PriceBook(load_catalog(catalog_file))
+    q = quote(book, CartBatch.from_states(book, STATES), promotions)
+    snapshots = q.snapshots()
+    lines = {it["product_id"]: it.get("discount", 0) for it in snapshots["mixed"]["items"]}
+    assert lines == {"P001": 5199.8, "P002": 150, "D001": 0}
+    assert [it.get("discount", 0) for it in snapshots["digital"]["items"]] == [0, 598]
+    assert snapshots["small"]["discount"] == 0
+    # laptop: 10% off the line, then free shipping and 5% of what is left
+    assert snapshots["laptop"]["discount"] == 4768.86  # 2599.90 + 999 + 1169.96
+
+def test_recompiled_rules_reach_the_next_quote(catalog_file):
+    promotions = PromotionEngine(RULES)
+    book = PriceBook(load_catalog(catalog_file))
+    batch = CartBatch.from_states(book, STATES)
+    before = quote(book, batch, promotions).totals()
+    promotions.compile([])
+    assert quote(book, batch, promotions).totals() == quote(book, batch).totals() != before
@@ -0,0 +1,48 @@
+import csv
+import json
+import pytest
+from cart.cart import ShoppingCart
+from cart.promotions import PromotionEngine
+from cart.storage import MemoryStorage
+from uis.save import save_csv, save_json, save_ndjson
+
+@pytest.fixture
+def engine():
+    return PromotionEngine([
+        {"id": "LAPTOP10", "type": "percent", "percent": 10, "products": ["P001"]},
+        {"id": "SHIP", "type": "threshold", "min_total": 20000, "free_shipping": True},
+    ])
+
+@pytest.fixture
+def cart(catalog_file, engine):
+    c = ShoppingCart(catalog_file, cart_id="a", storage=MemoryStorage(), promotions=engine)
+    assert c.add_item("P001", 1)  # 25999 + 999 shipping
+    return c
+
+def test_line_and_cart_discounts(cart):
+    assert cart.get_discount() == 2599.9 + 999
+    assert cart.get_total() == 25999 + 999 - 2599.9 - 999
+
+def test_recompiled_rules_reach_existing_carts(cart, engine):
+    engine.compile([{"id": "LAPTOP20", "type": "percent", "percent": 20, "products": ["P001"]}])
+    assert cart.get_discount() == 5199.8
+    assert cart.get_cart_snapshot()["items"][0]["discount"] == 5199.8
+    engine.compile([])
+    assert cart.get_total() == 25999 + 999
+    assert "discount" not in cart.get_cart_snapshot()["items"][0]
+
+@pytest.mark.parametrize("export", [save_json, save_ndjson, save_csv])
+def test_exported_receipts_add_up(cart, export, tmp_path):
+    snapshot = cart.get_cart_snapshot()
+    path = export(snapshot, str(tmp_path / f"cart.{export.__name__[5:]}"))
+    if export is save_csv:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        lines, footer = rows[1:-2], {r[4]: float(r[5]) for r in rows[-2:]}
+        gross = sum(float(r[5]) for r in lines)
+    else:
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f) if export is save_json else {**json.loads(f.read().splitlines()[-1]), "items": snapshot["items"]}
+        gross = sum(it["subtotal"] for it in doc["items"])
+        footer = {"DISCOUNT": -doc["discount"], "TOTAL": doc["total"]}
+    assert round(gross + footer["DISCOUNT"], 2) == footer["TOTAL"] == cart.get_total()
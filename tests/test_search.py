@@ -0,0 +1,89 @@
+import pytest
+from cart.cart import ShoppingCart
+from cart.catalog import load_catalog
+from cart.product import DigitalProduct
+from cart.search import CatalogIndex
+from cart.storage import MemoryStorage
+
+QUERIES = [
+    {"text": "gam"},
+    {"text": "GAMING m"},
+    {"text": "soft", "max_price": 1000},
+    {"min_price": 1799, "max_price": 8999},
+    {"ptype": "digital", "in_stock": True},
+    {"ptype": "physical", "in_stock": False},
+    {"text": "p00"},
+]
+
+@pytest.fixture(params=["memory", "columnar"])
+def index(request, catalog_file):
+    return CatalogIndex(load_catalog(catalog_file, request.param))
+
+@pytest.fixture
+def cart(catalog_file):
+    c = ShoppingCart(catalog_file, cart_id="a", storage=MemoryStorage())
+    c.search_index  # built before any change, so every later change goes through the incremental path
+    return c
+
+def _ids(products):
+    return sorted(p._product_id for p in products)
+
+def test_prefix_search(index):
+    assert sorted(index.search("gam")) == ["P001", "P005"]
+    assert index.search("Gaming MOU") == ["P005"]  # every word must prefix some token, case-insensitive
+    assert sorted(index.search("edit")) == ["D002", "D003"]
+    assert index.search("p004") == ["P004"]  # product ids are tokens too
+    assert index.search("gamer") == []
+
+def test_price_range_is_inclusive(index):
+    assert sorted(index.search(min_price=1799, max_price=2499)) == ["D003", "P002", "P003"]
+    assert sorted(index.search(max_price=499)) == ["D001", "D004"]
+    assert index.search(min_price=25999) == ["P001"]
+    assert index.search(min_price=9000, max_price=100) == []
+
+def test_type_and_stock_filters(index):
+    assert sorted(index.search(ptype="digital")) == ["D001", "D002", "D003", "D004", "D005"]
+    assert sorted(index.search("gam", ptype="physical", max_price=1000)) == ["P005"]
+    assert len(index.search(in_stock=True, limit=None)) == 10
+    assert index.search(in_stock=False) == []
+    with pytest.raises(ValueError):
+        index.search(ptype="furniture")
+
+def test_limit(index):
+    assert len(index.search(limit=3)) == 3
+    assert len(index.search(limit=None)) == len(index) == 10
+
+def test_stock_changes_move_products_in_and_out_of_stock(cart):
+    assert cart.add_item("P001", 10)
+    assert "P001" not in _ids(cart.search("laptop", in_stock=True))
+    assert _ids(cart.search(in_stock=False)) == ["P001"]
+    assert cart.update_quantity("P001", 9)
+    assert _ids(cart.search("laptop", in_stock=True)) == ["P001"]
+    cart.add_item("P001", 1)
+    cart.clear_cart()
+    assert _ids(cart.search("laptop", in_stock=True)) == ["P001"]
+    assert cart.search(in_stock=False) == []
+
+def test_catalog_changes_update_the_index(cart):
+    catalog = cart.catalog
+    catalog["P001"]._name, catalog["P001"]._price = "Ultrabook Pro", 19999
+    del catalog["D001"]
+    catalog["D006"] = DigitalProduct("D006", "Font Pack", 199, 0, "https://example.com/fonts")
+    cart.apply_catalog_changes(changed=["P001", "D006"], removed=["D001"])
+    assert cart.search("laptop") == []
+    assert _ids(cart.search("ultra", min_price=19999, max_price=19999)) == ["P001"]
+    assert cart.search(min_price=25999) == []
+    assert cart.search("antivirus") == []
+    assert _ids(cart.search("font", ptype="digital", in_stock=False)) == ["D006"]
+
+def test_incremental_index_matches_a_rebuilt_one(cart):
+    cart.add_item("P002", 30)
+    cart.add_item("D004", 5)
+    catalog = cart.catalog
+    catalog["P003"]._price = 2499
+    catalog["P005"]._name = "Wireless Mouse"
+    del catalog["D002"]
+    cart.apply_catalog_changes(changed=["P003", "P005"], removed=["D002"])
+    fresh = CatalogIndex(catalog)
+    for query in QUERIES:
+        assert sorted(cart.search_index.search(**query, limit=None)) == sorted(fresh.search(**query, limit=None)), query
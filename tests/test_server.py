@@ -0,0 +1,98 @@
+import pytest
+from server.server import CartServer, HTTPError
+
+@pytest.fixture
+def server(catalog_file, tmp_path):
+    srv = CartServer(catalog_file=catalog_file, sessions_dir=str(tmp_path / "sessions"), export_dir=str(tmp_path / "saved"))
+    yield srv
+    srv.close()
+
+def stock(srv, pid="P001"):
+    return srv.catalog[pid]._quantity_available
+
+@pytest.mark.parametrize("method, path, body", [
+    ("POST", "/carts/a/items", {"product_id": "P001", "quantity": 0}),
+    ("POST", "/carts/a/items", {"product_id": "P001", "quantity": -3}),
+    ("PUT", "/carts/a/items/P001", {"quantity": -500}),
+    ("PUT", "/carts/a/items/P001", {"quantity": "lots"}),
+    ("PUT", "/carts/a/items/P001", {"quantity": 2.5}),
+])
+def test_bad_quantities_are_rejected(server, method, path, body):
+    server.dispatch("POST", "/carts/a/items", {"product_id": "P001", "quantity": 2}, {})
+    with pytest.raises(HTTPError) as err:
+        server.dispatch(method, path, body, {})
+    assert err.value.status == 400
+    assert stock(server) == 8
+    assert server.session("a")._items["P001"]._quantity == 2
+
+def test_update_to_zero_removes_the_line(server):
+    server.dispatch("POST", "/carts/a/items", {"product_id": "P001", "quantity": 2}, {})
+    server.dispatch("PUT", "/carts/a/items/P001", {"quantity": 0}, {})
+    assert "P001" not in server.session("a")._items
+    assert stock(server) == 10
+
+def test_cart_refuses_negative_quantities(server):
+    cart = server.session("a")
+    assert cart.add_item("P001", 2)
+    assert not cart.update_quantity("P001", -500)
+    assert not cart.add_item("P001", -5)
+    assert stock(server) == 8
+
+@pytest.mark.parametrize("line", [{"quantity": 1}, {"product_id": "P001", "quantity": None},
+                                  {"product_id": "P001", "quantity": "two"}, ["P001"]])
+def test_malformed_batch_lines_are_value_errors(server, line):
+    cart = server.session("a")
+    with pytest.raises(ValueError, match="Batch line 2"):
+        cart.apply_batch([("P002", 1), line])
+    assert not cart._items
+    with pytest.raises(ValueError):  # the request loop answers ValueError with a 400
+        server.dispatch("POST", "/carts/a/batch", {"lines": [("P002", 1), line]}, {})
+
+def test_deleting_a_cart_releases_its_holds_and_checkout_keeps_them(server):
+    server.dispatch("POST", "/carts/a/items", {"product_id": "P001", "quantity": 3}, {})
+    server.dispatch("DELETE", "/carts/a", {}, {})
+    assert stock(server) == 10
+    server.dispatch("POST", "/carts/a/items", {"product_id": "P001", "quantity": 3}, {})
+    receipt = server.dispatch("POST", "/carts/a/checkout", {}, {})["receipt"]
+    assert receipt["items"][0]["quantity"] == 3
+    assert stock(server) == 7
+    with pytest.raises(HTTPError) as err:
+        server.dispatch("POST", "/carts/a/checkout", {}, {})
+    assert err.value.status == 409
+
+def test_products_are_paged(server):
+    first = server.dispatch("GET", "/products", {}, {"offset": "0", "limit": "3"})
+    second = server.dispatch("GET", "/products", {}, {"offset": "3", "limit": "3"})
+    ids = [p["product_id"] for p in first["products"] + second["products"]]
+    assert ids == list(server.catalog)[:6]
+    assert first["total"] == len(server.catalog)
+    with pytest.raises(HTTPError):
+        server.dispatch("GET", "/products", {}, {"offset": "-1"})
+
+def test_busy_sessions_are_not_evicted(catalog_file, tmp_path):
+    srv = CartServer(catalog_file=catalog_file, sessions_dir=str(tmp_path / "sessions"), export_dir=str(tmp_path / "saved"), max_sessions=1)
+    try:
+        with srv.using("a") as a:
+            with srv.using("b"):
+                pass
+            assert srv.session("a") is a  # b was idle and went, a stayed while in use
+            assert a.add_item("P001", 1)
+        srv.session("c")
+        assert list(srv._sessions) == ["c"]
+    finally:
+        srv.close()
+
+def test_expiry_of_an_evicted_session_updates_its_saved_cart(catalog_file, tmp_path):
+    srv = CartServer(catalog_file=catalog_file, sessions_dir=str(tmp_path / "sessions"), export_dir=str(tmp_path / "saved"), max_sessions=1)
+    try:
+        assert srv.session("a").add_item("P001", 3)
+        srv.session("b")  # evicts a, its hold stays
+        assert stock(srv) == 7
+        srv.engine.touch("a")
+        srv.engine.store._expires["a"] = 0
+        assert srv.expire_reservations() == 1
+        assert stock(srv) == 10
+        assert "P001" not in srv.session("a")._items
+        assert stock(srv) == 10  # reopening does not take the expired units back
+    finally:
+        srv.close()
@@ -0,0 +1,91 @@
+import json
+import threading
+from database.spill import SpillFile
+
+class Outage(ConnectionError):
+    pass
+
+class Database:
+    # accepts batches until `fail_after` rows are in, refuses rows whose action is "poison"
+    def __init__(self, fail_after=None):
+        self.rows = []
+        self.fail_after = fail_after
+
+    def write(self, rows):
+        if self.fail_after is not None and len(self.rows) + len(rows) > self.fail_after:
+            raise Outage("connection lost")
+        if any(row[1] == "poison" for row in rows):
+            raise ValueError("invalid input syntax")
+        self.rows.extend(rows)
+
+def rows(n, start=0):
+    return [(f"h{i}", "add_item", i) for i in range(start, start + n)]
+
+def test_outage_mid_replay_requeues_only_unwritten_rows(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.ndjson"))
+    spill.append(rows(250))
+    db = Database(fail_after=100)
+    result = spill.replay(db.write, batch_size=50)
+    assert (result["written"], result["requeued"]) == (100, 150)
+    assert "error" in result
+    db.fail_after = None
+    assert spill.replay(db.write, batch_size=50)["written"] == 150
+    assert sorted(db.rows, key=lambda r: r[2]) == rows(250)
+    assert not spill.pending()
+
+def test_poison_rows_are_quarantined_once(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.ndjson"))
+    spill.append(rows(30) + [("h", "poison", 0)] + rows(30, start=30))
+    with open(spill.path, "a", encoding="utf-8") as f:
+        f.write("{not json\n")
+    db = Database()
+    result = spill.replay(db.write, batch_size=20)
+    assert (result["written"], result["rejected"]) == (60, 2)
+    assert len(db.rows) == 60
+    assert spill.replay(db.write)["written"] == 0  # nothing left to send again
+    assert len(db.rows) == 60
+    quarantined = spill.rejected.read_text(encoding="utf-8").splitlines()
+    assert json.loads(quarantined[-1]) == ["h", "poison", 0]
+
+def test_interrupted_replay_resumes_after_the_last_committed_batch(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.ndjson"))
+    spill.append(rows(10))
+    spill.path.replace(spill.replaying)
+    lines = spill.replaying.read_bytes().splitlines(keepends=True)
+    spill._commit_offset(sum(len(line) for line in lines[:4]))  # the process died after 4 rows were committed
+    spill.append(rows(2, start=10))  # spilled after the restart
+    db = Database()
+    assert spill.replay(db.write)["written"] == 6
+    assert spill.replay(db.write)["written"] == 2
+    assert db.rows == rows(6, start=4) + rows(2, start=10)
+
+def test_concurrent_appends_keep_every_line_whole(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.ndjson"))
+    def worker(k):
+        for i in range(200):
+            spill.append([(f"t{k}", "x" * 500, i)])
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lines = spill.path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1600
+    assert all(len(json.loads(line)) == 3 for line in lines)
+
+def test_outage_while_narrowing_down_a_poison_batch(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.ndjson"))
+    spill.append(rows(5) + [("h", "poison", 0)] + rows(4, start=5))
+    db = Database()
+
+    def flaky(batch):
+        if len(batch) == 1 and len(db.rows) == 3:
+            raise Outage("connection lost")
+        db.write(batch)
+
+    result = spill.replay(flaky, batch_size=10)
+    assert (result["written"], result["requeued"], result["rejected"]) == (3, 7, 0)
+    result = spill.replay(db.write, batch_size=10)
+    assert (result["written"], result["rejected"]) == (6, 1)
+    assert sorted(db.rows, key=lambda r: r[2]) == rows(9)
+    assert not spill.pending()
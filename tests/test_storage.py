@@ -0,0 +1,27 @@
+import json
+import pytest
+from cart.cart import ShoppingCart
+from cart.catalog import LazyCatalog
+from cart.storage import JSONStorage, open_storage
+
+def test_saving_a_lazy_catalog_over_its_own_file(catalog_file, tmp_path):
+    before = json.loads(open(catalog_file, encoding="utf-8").read())
+    catalog = LazyCatalog(catalog_file, index_file=str(tmp_path / "catalog.idx"), cache_size=2)
+    assert catalog["P001"].decrease_quantity(3)
+    JSONStorage(directory=str(tmp_path / "carts"), catalog_file=catalog_file, fsync=False).save_catalog(catalog)
+    after = json.loads(open(catalog_file, encoding="utf-8").read())
+    assert [row["product_id"] for row in after] == [row["product_id"] for row in before]
+    assert after[0]["quantity_available"] == before[0]["quantity_available"] - 3
+    assert not list(tmp_path.glob("*.tmp"))
+    catalog.close()
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_cleared_stock_survives_a_restart(backend, catalog_file, tmp_path):
+    storage = open_storage(backend, str(tmp_path / "carts.db"))
+    cart = ShoppingCart(catalog_file, cart_id="a", storage=storage)
+    assert cart.add_item("P001", 3)
+    assert ShoppingCart(catalog_file, cart_id="b", storage=storage).catalog["P001"]._quantity_available == 7
+    cart.clear_cart()
+    restarted = ShoppingCart(catalog_file, cart_id="a", storage=storage)
+    assert restarted.catalog["P001"]._quantity_available == 10
+    assert not restarted._items
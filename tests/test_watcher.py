@@ -0,0 +1,48 @@
+import json
+import threading
+from cart.catalog import load_catalog
+from cart.inventory import ReservationEngine
+from cart.watcher import CatalogWatcher
+
+def rewrite(path, **changes):
+    with open(path, encoding="utf-8") as f:
+        rows = json.load(f)
+    for row in rows:
+        row.update(changes.get(row["product_id"], {}))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+
+def test_restock_in_the_file_is_a_delta_on_the_engine(catalog_file):
+    catalog = load_catalog(catalog_file)
+    engine = ReservationEngine(catalog)
+    watcher = CatalogWatcher(catalog_file, catalog, inventory=engine)
+    assert engine.reserve("a", "P001", 4)
+    rewrite(catalog_file, P001={"quantity_available": 15, "price": 100})
+    assert watcher.poll() == ({"P001"}, set())
+    assert catalog["P001"]._quantity_available == 11  # 10 - 4 held + 5 restocked
+    assert catalog["P001"]._price == 100
+    assert engine.held("a", "P001") == 4
+
+def test_stock_changes_do_not_lose_concurrent_reservations(catalog_file):
+    catalog = load_catalog(catalog_file)
+    catalog["P001"]._quantity_available = 100_000
+    engine = ReservationEngine(catalog)
+    watcher = CatalogWatcher(catalog_file, catalog, inventory=engine)
+    def churn():
+        for _ in range(2_000):
+            engine.reserve("a", "P001", 1)
+    threads = [threading.Thread(target=churn) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for _ in range(2_000):
+        watcher._adjust_stock("P001", 1)
+    for t in threads:
+        t.join()
+    assert catalog["P001"]._quantity_available == 100_000 + 2_000 - 8_000
+
+def test_unchanged_records_are_not_reparsed(catalog_file):
+    catalog = load_catalog(catalog_file)
+    watcher = CatalogWatcher(catalog_file, catalog)
+    rewrite(catalog_file, P002={"name": "Renamed"})
+    assert watcher.poll() == ({"P002"}, set())
+    assert catalog["P002"]._name == "Renamed"
@@ -0,0 +1,138 @@
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from metrics.metrics import METRICS
+from uis.save import TEMPLATE_VERSION
+
+# rendered exports keyed by what they show: sha256(snapshot content) + exporter + TEMPLATE_VERSION.
+# Entries are plain files <key><ext> in one directory, least recently used first out once over max_bytes;
+# a hit touches the file, so the order survives restarts.
+
+def content_digest(snapshot: dict) -> str:
+    # "items" must be a list here (get_cart_snapshot()), a one-shot iterator would be consumed
+    body = json.dumps(snapshot, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+class ExportCache:
+    def __init__(self, directory: str = "saved/.cache", max_bytes: int = 256 * 1024 * 1024):
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (path, size), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        found = []
+        for path in self._dir.iterdir():
+            if path.name.endswith(".tmp"):
+                path.unlink()  # left by a writer that died mid-copy
+            elif path.is_file():
+                st = path.stat()
+                found.append((st.st_mtime_ns, path.name.split(".", 1)[0], path, st.st_size))
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self._bytes += size
+
+    @staticmethod
+    def key(digest: str, exporter: str) -> str:
+        return hashlib.sha256(f"{digest}:{exporter}:{TEMPLATE_VERSION}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str, fmt: str = "") -> Optional[Path]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                try:
+                    os.utime(entry[0])
+                except FileNotFoundError:
+                    # removed behind our back
+                    del self._entries[key]
+                    self._bytes -= entry[1]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        METRICS.inc("export_cache_total", format=fmt, result="miss" if entry is None else "hit")
+        return None if entry is None else entry[0]
+
+    def put(self, key: str, rendered: str) -> Optional[Path]:
+        size = os.path.getsize(rendered)
+        if size > self._max_bytes:
+            return None
+        path = self._dir / f"{key}{Path(rendered).suffix}"
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0].exists():
+            return entry[0]  # another export of the same contents got here first: same bytes, keep theirs
+        # a private temp file per writer, so concurrent puts of one key never move each other's file
+        fd, tmp = tempfile.mkstemp(dir=self._dir, prefix=f"{key}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(rendered, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (path, size)
+            self._bytes += size
+            while self._bytes > self._max_bytes and self._entries:
+                _, (victim, victim_size) = self._entries.popitem(last=False)
+                self._bytes -= victim_size
+                self.evictions += 1
+                try:
+                    victim.unlink()
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def fetch(self, key: str, filename: str, fmt: str = "") -> Optional[str]:
+        # a hit is copied to filename and filename returned; None on a miss
+        cached = self.get(key, fmt)
+        if cached is None:
+            return None
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copyfile(cached, filename)
+        except FileNotFoundError:
+            return None
+        return filename
+
+    def export(self, fn: Callable, snapshot: dict, filename: str, fmt: str = "", digest: Optional[str] = None) -> str:
+        key = self.key(digest or content_digest(snapshot), fn.__name__)
+        hit = self.fetch(key, filename, fmt)
+        if hit is not None:
+            return hit
+        result = fn(snapshot, filename)
+        self.put(key, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self._max_bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            for path, _ in self._entries.values():
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._entries.clear()
+            self._bytes = 0
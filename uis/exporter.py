@@ -0,0 +1,121 @@
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, CancelledError
+from typing import Callable, List, Optional
+import inspect
+import multiprocessing
+import time
+from metrics.metrics import METRICS
+from uis.cache import content_digest
+
+class ExportBatch:
+    def __init__(self, futures: List[Future], labels: List[str]):
+        self.futures = futures
+        self.labels = labels
+        self.cancelled = False
+
+    @property
+    def total(self) -> int:
+        return len(self.futures)
+
+    @property
+    def finished(self) -> int:
+        return sum(f.done() for f in self.futures)
+
+    def done(self) -> bool:
+        return self.cancelled or all(f.done() for f in self.futures)
+
+    def cancel(self) -> None:
+        # queued exports never start; running ones finish but their result is ignored
+        self.cancelled = True
+        for f in self.futures:
+            f.cancel()
+
+    def results(self) -> List[tuple]:
+        out = []
+        for label, f in zip(self.labels, self.futures):
+            if f.cancelled():
+                out.append((label, None, CancelledError()))
+            elif f.done():
+                err = f.exception()
+                out.append((label, None if err else f.result(), err))
+        return out
+
+class ExportQueue:
+    def __init__(self, max_workers: int = 4, use_processes: bool = False, cache=None):
+        self._max_workers = max_workers
+        self._use_processes = use_processes
+        self._pool = None
+        self.cache = cache  # an ExportCache: unchanged carts are copied from it instead of re-rendered
+
+    def _executor(self):
+        if self._pool is None:
+            if self._use_processes:
+                # spawn, not fork: the parent holds Tk and DB writer threads
+                self._pool = ProcessPoolExecutor(max_workers=self._max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
+        return self._pool
+
+    def submit(self, jobs: List[tuple], snapshot: dict) -> ExportBatch:
+        # jobs: [(label, export_fn)] or [(label, export_fn, filename)]
+        futures, labels = [], []
+        digest = content_digest(snapshot) if self.cache is not None else None
+        for job in jobs:
+            label, fn, *filename = job
+            future = None
+            if self.cache is not None:
+                key = self.cache.key(digest, fn.__name__)
+                hit = self.cache.fetch(key, filename[0] if filename else _default_filename(fn), label.lower())
+                if hit is not None:
+                    future = Future()
+                    future.set_result(hit)
+            if future is None:
+                future = self._executor().submit(fn, snapshot, *filename)
+                if self.cache is not None:
+                    future.add_done_callback(lambda f, key=key: self._remember(f, key))
+            if METRICS.enabled:
+                # wall time from submit to done, so queueing behind other exports shows up too
+                future.add_done_callback(lambda f, label=label, start=time.perf_counter(): METRICS.observe(
+                    "export_job_seconds", time.perf_counter() - start, format=label.lower(),
+                    outcome="cancelled" if f.cancelled() else "failed" if f.exception() else "ok"))
+            futures.append(future)
+            labels.append(label)
+        return ExportBatch(futures, labels)
+
+    def _remember(self, future: Future, key: str) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            self.cache.put(key, future.result())
+        except OSError:
+            pass  # the export itself succeeded; it just will not be cached
+
+    def watch(self, batch: ExportBatch, schedule: Callable[[int, Callable], object],
+              on_progress: Callable[[int, int], None], on_done: Callable[[ExportBatch], None], interval_ms: int = 100) -> None:
+        # polls from the caller's thread (e.g. Tk's root.after) so callbacks never run on a worker
+        def poll():
+            if batch.done():
+                on_done(batch)
+                return
+            on_progress(batch.finished, batch.total)
+            schedule(interval_ms, poll)
+        schedule(interval_ms, poll)
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+def _default_filename(fn: Callable) -> str:
+    return inspect.signature(fn).parameters["filename"].default
+
+def describe(results: List[tuple]) -> Optional[str]:
+    lines = []
+    for label, filename, err in results:
+        if isinstance(err, CancelledError):
+            lines.append(f"{label}: cancelled")
+        elif err is not None:
+            lines.append(f"{label}: failed ({err})")
+        else:
+            lines.append(f"{label}: {filename}")
+    return "\n".join(lines) if lines else None
@@ -1,37 +1,95 @@
 from pathlib import Path
+from copy import deepcopy
+from itertools import chain, islice
+import csv
 import json
-from openpyxl import Workbook
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from docx import Document
+from metrics.metrics import METRICS
+
+HEADER = ["Product ID", "Name", "Quantity", "Price", "Shipping", "Subtotal"]
+PDF_CHUNK_ROWS = 500
+TEMPLATE_VERSION = 2  # bump whenever an exporter's output changes; it is part of every export cache key (uis/cache.py)
+
+# openpyxl, reportlab and python-docx are imported inside their exporter: they are slow to import and most runs never export
+# every exporter takes a snapshot whose "items" may be a list or any one-shot iterator (see ShoppingCart.stream_snapshot)
 
 def _ensure_dir(path: str):
     Path(Path(path).parent).mkdir(parents=True, exist_ok=True)
 
+def _row(it: dict) -> list:
+    return [it["product_id"], it["name"], it["quantity"], it["price"], it["shipping"], it["subtotal"]]
+
+def _money_row(it: dict) -> list:
+    return [str(it["product_id"]), str(it["name"]), str(it["quantity"]), f"₺{it['price']}", f"₺{it['shipping']}", f"₺{it['subtotal']}"]
+
+def _footer(cart_snapshot: dict, money: bool = False) -> list:
+    # line subtotals are before promotions, so a discounted cart shows what came off above the (net) TOTAL
+    fmt = (lambda v: f"₺{v}") if money else (lambda v: v)
+    rows = []
+    discount = cart_snapshot.get("discount")
+    if discount:
+        rows.append(["", "", "", "", "DISCOUNT", fmt(-discount)])
+    rows.append(["", "", "", "", "TOTAL", fmt(cart_snapshot.get("total", 0))])
+    return rows
+
+def _summary(cart_snapshot: dict) -> dict:
+    out = {"total": cart_snapshot.get("total", 0)}
+    if "discount" in cart_snapshot:
+        out["discount"] = cart_snapshot["discount"]
+    return out
+
+@METRICS.timed("export_seconds", format="json")
 def save_json(cart_snapshot: dict, filename: str = "saved/cart.json"):
     _ensure_dir(filename)
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(cart_snapshot, f, indent=4, ensure_ascii=False)
+        f.write('{\n    "items": [')
+        for n, it in enumerate(cart_snapshot.get("items", [])):
+            f.write(("," if n else "") + "\n        " + json.dumps(it, ensure_ascii=False))
+        f.write("\n    ]")
+        for key, value in _summary(cart_snapshot).items():
+            f.write(f',\n    "{key}": {json.dumps(value)}')
+        f.write("\n}\n")
     return filename
 
+@METRICS.timed("export_seconds", format="ndjson")
+def save_ndjson(cart_snapshot: dict, filename: str = "saved/cart.ndjson"):
+    _ensure_dir(filename)
+    with open(filename, "w", encoding="utf-8") as f:
+        for it in cart_snapshot.get("items", []):
+            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+        f.write(json.dumps(_summary(cart_snapshot)) + "\n")
+    return filename
+
+@METRICS.timed("export_seconds", format="csv")
+def save_csv(cart_snapshot: dict, filename: str = "saved/cart.csv"):
+    _ensure_dir(filename)
+    with open(filename, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(_row(it) for it in cart_snapshot.get("items", []))
+        writer.writerows(_footer(cart_snapshot))
+    return filename
+
+@METRICS.timed("export_seconds", format="excel")
 def save_excel(cart_snapshot: dict, filename: str = "saved/cart.xlsx"):
+    from openpyxl import Workbook
     _ensure_dir(filename)
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Cart"
-    ws.append(["Product ID", "Name", "Quantity", "Price", "Shipping", "Subtotal"])
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Cart")
+    ws.append(HEADER)
     for it in cart_snapshot.get("items", []):
-        ws.append([
-            it["product_id"], it["name"], it["quantity"], it["price"], it["shipping"], it["subtotal"]
-        ])
+        ws.append(_row(it))
     ws.append([])
-    ws.append(["", "", "", "", "TOTAL", cart_snapshot.get("total", 0)])
+    for row in _footer(cart_snapshot):
+        ws.append(row)
     wb.save(filename)
     return filename
 
+@METRICS.timed("export_seconds", format="pdf")
 def save_pdf(cart_snapshot: dict, filename: str = "saved/cart.pdf"):
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
     _ensure_dir(filename)
     doc = SimpleDocTemplate(filename, pagesize=A4)
     styles = getSampleStyleSheet()
@@ -39,37 +97,51 @@ def save_pdf(cart_snapshot: dict, filename: str = "saved/cart.pdf"):
     canSave.append(Paragraph("<b>Tungshoop – Cart Save Section</b>", styles["Title"]))
     canSave.append(Spacer(1, 12))
 
-    data = [["Product ID", "Name", "Quantity", "Price", "Shipping", "Subtotal"]]
-    for it in cart_snapshot.get("items", []):
-        data.append([
-            it["product_id"], it["name"], it["quantity"], f"₺{it['price']}", f"₺{it['shipping']}", f"₺{it['subtotal']}"
-        ])
-    data.append(["", "", "", "", "TOTAL", f"₺{cart_snapshot.get('total', 0)}"])
-
-    table = Table(data, repeatRows=1)
-    table.setStyle(TableStyle([
+    style = TableStyle([
         ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
         ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
         ('ALIGN', (-2,1), (-1,-1), 'RIGHT'),
         ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
         ('BOTTOMPADDING', (0,0), (-1,0), 8),
-    ]))
+    ])
+    # many page-sized tables lay out in linear time; one giant Table is re-split on every page
+    items = iter(cart_snapshot.get("items", []))
+    while True:
+        chunk = [HEADER]
+        chunk.extend(_money_row(it) for it in islice(items, PDF_CHUNK_ROWS))
+        last = len(chunk) - 1 < PDF_CHUNK_ROWS
+        if last:
+            chunk.extend(_footer(cart_snapshot, money=True))
+        table = Table(chunk, repeatRows=1)
+        table.setStyle(style)
+        canSave.append(table)
+        if last:
+            break
 
-    canSave.append(table)
     doc.build(canSave)
     return filename
 
+@METRICS.timed("export_seconds", format="docx")
 def save_docx(cart_snapshot: dict, filename: str = "saved/cart.docx"):
+    from docx import Document
+    from docx.oxml.ns import qn
     _ensure_dir(filename)
     doc = Document()
     doc.add_heading("Tungshoop – Save Section", 0)
     table = doc.add_table(rows=1, cols=6)
     hdr = table.rows[0].cells
     hdr[0].text = "Product ID"; hdr[1].text = "Name"; hdr[2].text = "Quantity"; hdr[3].text = "Price"; hdr[4].text = "Shipping"; hdr[5].text = "Subtotal"
-    for it in cart_snapshot.get("items", []):
-        row = table.add_row().cells
-        row[0].text = str(it["product_id"]) ; row[1].text = str(it["name"]) ; row[2].text = str(it["quantity"]) ; row[3].text = f"₺{it['price']}" ; row[4].text = f"₺{it['shipping']}" ; row[5].text = f"₺{it['subtotal']}"
-    row = table.add_row().cells
-    row[0].text = ""; row[1].text = ""; row[2].text = ""; row[3].text = ""; row[4].text = "TOTAL"; row[5].text = f"₺{cart_snapshot.get('total', 0)}"
+    # python-docx's add_row()/cells re-walk the whole table each call; clone one filled-in <w:tr> instead
+    template = table.add_row()
+    for cell in template.cells:
+        cell.text = " "
+    tr = template._tr
+    tbl = tr.getparent()
+    tbl.remove(tr)
+    for values in chain((_money_row(it) for it in cart_snapshot.get("items", [])), _footer(cart_snapshot, money=True)):
+        row = deepcopy(tr)
+        for t, value in zip(row.iter(qn("w:t")), values):
+            t.text = value
+        tbl.append(row)
     doc.save(filename)
-    return filename
\ No newline at end of file
+    return filename